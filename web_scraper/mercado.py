@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+CLI unificado: scraping e ferramentas do banco (python mercado.py --help)
+"""
+
+import sys
+import os
+
+# Adicionar o diretório src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Junta os bancos SQLite gerados por vários nós de scraping (--shard) em um só
+Atalho para: python mercado.py merge [bancos...] --output destino.db
+"""
+
+import sys
+import os
+
+# Adicionar o diretório src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from cli import main
+
+if __name__ == "__main__":
+    main(['merge', *sys.argv[1:]])
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
 Script de execução do scraper com Selenium (aguarda JavaScript)
+Atalho para: python mercado.py scrape [opções]
 """
 
 import sys
@@ -9,7 +10,7 @@ import os
 # Adicionar o diretório src ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from selenium_scraper import main
+from cli import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(['scrape', *sys.argv[1:]])
@@ -0,0 +1,159 @@
+"""Per-site and per-market timeouts learned from recorded load times.
+
+Every browser page records how long each phase took:
+
+* ``load``: ``driver.get`` until the load event (the page load timeout);
+* ``ready``: ``<body>`` present and ``document.readyState == 'complete'``;
+* ``zipcode``: until the CEP modal appeared, or ``None`` if it did not;
+* ``aside``: until the product details appeared, or ``None`` if they did not.
+
+The last ``MARKET_WINDOW`` samples of each market and the last
+``SITE_WINDOW`` of each URL are kept in ``load_timings``. A phase's timeout
+is the p95 of the site's samples (or of the market's, while the site has
+fewer than ``MIN_SAMPLES``) times ``margin`` plus ``pad`` seconds, clamped
+to ``[FLOORS, CEILINGS]``. Without history the old fixed values apply.
+
+A ``load`` or ``ready`` timeout is recorded as the limit that was hit, so
+repeated timeouts raise the limit by ``margin`` each time until the ceiling.
+``zipcode`` and ``aside`` are optional elements: if they showed up in fewer
+than ``MIN_PRESENCE`` of the recent pages, the site is not waited on beyond
+the floor; otherwise only the pages where they appeared count for the p95.
+The CEP modal is the exception on a driver session's first page of a market
+(``first_in_session``): stores usually show it only there and keep the CEP
+in a cookie afterwards, so its rare presence says nothing about a fresh
+browser, which always waits at least the old fixed value.
+
+Windows are written in batches of ``FLUSH_EVERY`` scopes (and on
+``flush``), not once per page. With several processes each one keeps its
+own windows and the last write of a market wins; samples from the other
+processes are picked up next run.
+"""
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+PHASES = ("load", "ready", "zipcode", "aside")
+# Previous hard-coded values: used until there is history
+DEFAULTS = {"load": 45.0, "ready": 30.0, "zipcode": 10.0, "aside": 10.0}
+FLOORS = {"load": 5.0, "ready": 2.0, "zipcode": 1.0, "aside": 1.0}
+CEILINGS = {"load": 120.0, "ready": 60.0, "zipcode": 20.0, "aside": 20.0}
+OPTIONAL = {"zipcode", "aside"}
+
+MARKET_WINDOW = 50
+SITE_WINDOW = 10
+MIN_SAMPLES = 5
+MIN_PRESENCE = 0.2
+FLUSH_EVERY = 100
+
+
+def p95(values: List[float]) -> float:
+    """Nearest-rank 95th percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+class AdaptiveTimeouts:
+    """Learned timeouts shared by the workers of a scraper; see the module docstring.
+
+    Args:
+        db: ``DatabaseManager`` (or ``QueuedDatabase`` in pool processes).
+        margin: Multiplier applied to the p95.
+        pad: Seconds added after the multiplier.
+        enabled: ``False`` always returns ``DEFAULTS`` (and records nothing).
+    """
+
+    def __init__(self, db, margin: float = 1.5, pad: float = 1.0, enabled: bool = True):
+        self.db = db
+        self.margin = margin
+        self.pad = pad
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.markets: Dict[str, Dict[str, deque]] = {}
+        # Windows of the sites being scraped, loaded by limits() and released by record()
+        self.sites: Dict[str, Dict[str, deque]] = {}
+        self.pending: Dict[str, str] = {}
+
+    @staticmethod
+    def _windows(samples: Dict[str, List[Optional[float]]], size: int) -> Dict[str, deque]:
+        return {phase: deque(samples.get(phase, []), maxlen=size) for phase in PHASES}
+
+    def _market(self, market: str) -> Dict[str, deque]:
+        if market not in self.markets:
+            self.markets[market] = self._windows(self.db.get_load_timings(f"market:{market}"), MARKET_WINDOW)
+        return self.markets[market]
+
+    def _limit(self, phase: str, samples) -> Optional[float]:
+        if len(samples) < MIN_SAMPLES:
+            return None
+        seen = [value for value in samples if value is not None]
+        if phase in OPTIONAL and len(seen) < len(samples) * MIN_PRESENCE:
+            return FLOORS[phase]
+        if not seen:
+            return None
+        value = p95(seen) * self.margin + self.pad
+        return round(min(CEILINGS[phase], max(FLOORS[phase], value)), 1)
+
+    def limits(self, site: Dict[str, Any], first_in_session: bool = False) -> Dict[str, float]:
+        """Timeout (seconds) of each phase for ``site``.
+
+        ``first_in_session``: the driver has not loaded a page of this market
+        yet, so the CEP modal wait is never below ``DEFAULTS``.
+        """
+        if not self.enabled:
+            return dict(DEFAULTS)
+        url = site.get("url")
+        market = site.get("market") or "Desconhecido"
+        own = self._windows(self.db.get_load_timings(f"site:{url}"), SITE_WINDOW)
+        with self.lock:
+            self.sites[url] = own
+            shared = self._market(market)
+            limits = {
+                phase: self._limit(phase, own[phase]) or self._limit(phase, shared[phase]) or DEFAULTS[phase]
+                for phase in PHASES
+            }
+        if first_in_session:
+            limits["zipcode"] = max(limits["zipcode"], DEFAULTS["zipcode"])
+        return limits
+
+    def record(self, site: Dict[str, Any], timings: Dict[str, Optional[float]]) -> None:
+        """Add the durations measured on one page (only the phases present in ``timings``)."""
+        if not self.enabled:
+            return
+        url = site.get("url")
+        market = site.get("market") or "Desconhecido"
+        with self.lock:
+            own = self.sites.pop(url, None)
+            if own is None or not timings:
+                return
+            shared = self._market(market)
+            for phase, value in timings.items():
+                value = None if value is None else round(value, 3)
+                own[phase].append(value)
+                shared[phase].append(value)
+            self.pending[f"site:{url}"] = json.dumps({phase: list(window) for phase, window in own.items()})
+            self.pending[f"market:{market}"] = json.dumps({phase: list(window) for phase, window in shared.items()})
+            if len(self.pending) < FLUSH_EVERY:
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the windows changed since the last flush."""
+        with self.lock:
+            rows, self.pending = list(self.pending.items()), {}
+        if rows:
+            self.db.save_load_timings(rows)
+
+    def describe(self) -> List[str]:
+        """Learned market timeouts, for the final report."""
+        lines = []
+        with self.lock:
+            for market, windows in sorted(self.markets.items()):
+                learned = {phase: self._limit(phase, windows[phase]) for phase in PHASES}
+                if any(learned.values()):
+                    parts = [f"{phase} {value:g}s" for phase, value in learned.items() if value]
+                    lines.append(f"{market}: {', '.join(parts)} ({len(windows['load'])} amostra(s))")
+        return lines
@@ -0,0 +1,145 @@
+"""Price alerts evaluated as prices are inserted.
+
+Rules live in ``alert_rules``: per product or per market (``site_name``),
+with a target price (fires when the price crosses to or below it) and/or a
+percent change against the previous price of the same product and CEP.
+
+``AlertEngine`` is loaded once per ``DatabaseManager``, on the first insert:
+the rules, indexed by product and by market, and the latest price of every
+(product, CEP) the rules cover, in one query. Each new price is then checked
+with dictionary lookups only, inside the transaction that inserts it, and
+fired alerts go to ``alert_outbox``. Delivery is separate (``mercado.py
+alerts send``): pending alerts are appended to a JSONL file or POSTed to a
+webhook and marked sent.
+
+The previous prices are not read from ``price_index.LatestPriceIndex``: that
+index keeps one price per product (the newest of any CEP), while a change
+alert compares prices of the same CEP. The engine's own cache is limited to
+the products that have a rule, so with a few rules it stays small.
+
+Rules added while a scraper is running apply from its next run.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import format_brl
+
+
+class AlertEngine:
+    """In-memory rules and previous prices; see the module docstring."""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.by_product: Dict[int, List[Dict[str, Any]]] = {}
+        self.by_market: Dict[str, List[Dict[str, Any]]] = {}
+        for rule in rules:
+            if rule["product_id"] is not None:
+                self.by_product.setdefault(rule["product_id"], []).append(rule)
+            else:
+                self.by_market.setdefault(rule["market"], []).append(rule)
+        self.last_prices: Dict[Tuple[int, Optional[str]], float] = {}
+        self.markets: Dict[int, Optional[str]] = {}
+
+    @property
+    def active(self) -> bool:
+        return bool(self.by_product or self.by_market)
+
+    @classmethod
+    def load(cls, cursor) -> "AlertEngine":
+        cursor.execute('''
+            SELECT id, product_id, market, target_price, change_pct
+            FROM alert_rules WHERE enabled = 1
+        ''')
+        columns = [c[0] for c in cursor.description]
+        engine = cls([dict(zip(columns, row)) for row in cursor.fetchall()])
+        if not engine.active:
+            # No rules: nothing to compare, so the price cache is not even built
+            return engine
+
+        cursor.execute('''
+            SELECT ph.product_id, ph.cep, ph.price_numeric
+            FROM price_history ph
+            JOIN (
+                SELECT MAX(id) AS id FROM price_history
+                WHERE price_numeric IS NOT NULL AND product_id IN (
+                    SELECT product_id FROM alert_rules WHERE enabled = 1 AND product_id IS NOT NULL
+                    UNION
+                    SELECT p.id FROM products p JOIN alert_rules r ON r.market = p.site_name
+                    WHERE r.enabled = 1
+                )
+                GROUP BY product_id, cep
+            ) latest ON latest.id = ph.id
+        ''')
+        engine.last_prices = {(product_id, cep): price for product_id, cep, price in cursor.fetchall()}
+        if engine.by_market:
+            cursor.execute("SELECT id, site_name FROM products")
+            engine.markets = dict(cursor.fetchall())
+        return engine
+
+    def _market(self, cursor, product_id: int) -> Optional[str]:
+        if product_id not in self.markets:
+            cursor.execute("SELECT site_name FROM products WHERE id = ?", (product_id,))
+            row = cursor.fetchone()
+            self.markets[product_id] = row[0] if row else None
+        return self.markets[product_id]
+
+    def evaluate(self, cursor, product_id: int, price_id: int, cep: Optional[str], price: float) -> int:
+        """Check a just-inserted price and queue the alerts it fires. Returns how many fired."""
+        if not self.active:
+            return 0
+        rules = self.by_product.get(product_id, [])
+        if self.by_market:
+            rules = rules + self.by_market.get(self._market(cursor, product_id), [])
+        if not rules:
+            # Outside every rule: its price is not cached (see load)
+            return 0
+        previous = self.last_prices.get((product_id, cep))
+        self.last_prices[(product_id, cep)] = price
+
+        fired = []
+        for rule in rules:
+            target = rule["target_price"]
+            # Fires once when the price reaches the target, not on every run below it
+            if target is not None and price <= target and (previous is None or previous > target):
+                fired.append((rule["id"], "target", f"{format_brl(price)} atingiu o alvo de {format_brl(target)}"))
+            change = rule["change_pct"]
+            if change is not None and previous:
+                delta = (price - previous) / previous * 100
+                if abs(delta) >= change:
+                    fired.append((rule["id"], "change", f"{format_brl(previous)} → {format_brl(price)} ({delta:+.1f}%)"))
+
+        if fired:
+            cursor.executemany('''
+                INSERT INTO alert_outbox (rule_id, product_id, price_id, cep, kind, previous_price, price, message)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(rule_id, product_id, price_id, cep, kind, previous, price, message)
+                  for rule_id, kind, message in fired])
+            for _, _, message in fired:
+                print(f"   🔔 Alerta (produto {product_id}): {message}")
+        return len(fired)
+
+
+def send_pending_alerts(db, file: Optional[str] = None, webhook: Optional[str] = None,
+                        limit: int = 500, timeout: float = 10.0) -> int:
+    """Deliver pending outbox alerts to a JSONL file and/or a webhook and mark them sent.
+
+    Raises:
+        ValueError: If neither ``file`` nor ``webhook`` is given.
+        requests.RequestException: If the webhook fails; nothing is marked sent.
+    """
+    if not file and not webhook:
+        raise ValueError("Informe um arquivo ou um webhook para enviar os alertas")
+    alerts = db.get_pending_alerts(limit)
+    if not alerts:
+        return 0
+    if webhook:
+        import requests
+        response = requests.post(webhook, json={"alerts": alerts}, timeout=timeout)
+        response.raise_for_status()
+    if file:
+        with open(file, "a", encoding="utf-8") as out:
+            for alert in alerts:
+                out.write(json.dumps(alert, ensure_ascii=False) + "\n")
+    db.mark_alerts_sent([alert["id"] for alert in alerts])
+    return len(alerts)
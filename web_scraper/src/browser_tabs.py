@@ -0,0 +1,160 @@
+"""Several product pages loading at once in one Chrome (``scrape --tabs N``).
+
+Each Chrome costs hundreds of MB, and a scraping worker spends most of its
+time waiting for a page to load. ``SharedBrowser`` lets several workers
+share one driver, each with its own tab (window handle), through a
+``BrowserTab`` proxy:
+
+* WebDriver talks to one tab at a time, so every command goes through the
+  browser lock and switches to the worker's tab first when another one is
+  focused;
+* ``BrowserTab.load`` starts the navigation with a script instead of
+  ``driver.get`` (which would block the whole browser until the load
+  event) and then polls the tab, releasing the lock between polls. Chrome
+  keeps loading background tabs, so while one worker holds the browser in
+  ``wait_for_complete_loading`` or extracting, the next pages are already
+  downloading and rendering in the other tabs;
+* the scraper holds ``BrowserTab.focus`` across the waits and extraction of
+  a page (elements found there belong to that tab), and the first tab whose
+  page finished loading is the next to take the browser.
+
+The shared Chrome is started with ``pageLoadStrategy`` ``none`` (see
+``driver_utils.setup_driver``): with ``normal``, ChromeDriver holds every
+command, including the polls and window switches of the other tabs,
+until pending navigations finish, and the tabs would load one at a time.
+``BrowserTab.get`` therefore waits for the page itself, through ``load``.
+Background throttling is disabled as well, so timers and rendering in
+unfocused tabs run at full speed.
+
+``SyntheticDriver`` does not model ChromeDriver's blocking, so ``simulate
+--tabs`` shows the overlap this design allows, not what a given Chrome
+version delivers.
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from selenium.common.exceptions import TimeoutException
+
+from page_interactions import PAGE_EXTRACTOR_JS
+
+# The flag disappears with the old document: a tab without it is showing the new page
+NAVIGATE_JS = "window.__mercadoNavigating = true; window.location.href = arguments[0];"
+STATE_JS = """
+if (window.__mercadoNavigating) { return null; }
+var nav = performance.getEntriesByType ? performance.getEntriesByType('navigation')[0] : null;
+return {state: document.readyState, load: nav && nav.loadEventEnd ? nav.loadEventEnd / 1000 : null};
+"""
+
+POLL_INTERVAL = 0.1
+# Same default as driver_utils.setup_driver; the driver's own timeout does not cover script navigations
+PAGE_LOAD_TIMEOUT = 45.0
+
+
+class SharedBrowser:
+    """One driver whose tabs are handed to several scraper workers.
+
+    Args:
+        create: Creates the driver, on the first ``open_tab`` (so the browser
+            only starts when some site needs it).
+        quit: Closes the driver (``close``).
+    """
+
+    def __init__(self, create: Callable[[], Any], quit: Callable[[Any], None]):
+        self.create = create
+        self.quit = quit
+        self.driver = None
+        self.lock = threading.RLock()
+        self.focused: Optional[str] = None
+        self.tabs = 0
+
+    def open_tab(self) -> "BrowserTab":
+        """A new tab (the browser's first window for the first worker)."""
+        with self.lock:
+            if self.driver is None:
+                self.driver = self.create()
+            elif self.tabs:
+                self.driver.switch_to.new_window("tab")
+                # Page.addScriptToEvaluateOnNewDocument only applies to the tab it was sent to
+                try:
+                    self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": PAGE_EXTRACTOR_JS})
+                except Exception:
+                    pass
+            self.focused = self.driver.current_window_handle
+            self.tabs += 1
+            return BrowserTab(self, self.focused)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.driver is not None:
+                self.quit(self.driver)
+            self.driver = None
+            self.focused = None
+            self.tabs = 0
+
+
+class BrowserTab:
+    """The WebDriver of one tab of a ``SharedBrowser``: every call focuses the tab first."""
+
+    def __init__(self, browser: SharedBrowser, handle: str):
+        self.browser = browser
+        self.handle = handle
+        self.page_load_timeout = PAGE_LOAD_TIMEOUT
+
+    @contextlib.contextmanager
+    def focus(self):
+        """Hold the browser on this tab (reentrant: the proxied calls inside do not switch again)."""
+        with self.browser.lock:
+            if self.browser.focused != self.handle:
+                self.browser.driver.switch_to.window(self.handle)
+                self.browser.focused = self.handle
+            yield self.browser.driver
+
+    def __getattr__(self, name: str):
+        # Properties such as current_url are read from the tab too
+        with self.focus() as driver:
+            value = getattr(driver, name)
+        if not callable(value):
+            return value
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            with self.focus():
+                return value(*args, **kwargs)
+        return call
+
+    def set_page_load_timeout(self, seconds: float) -> None:
+        """Timeout of ``get`` in this tab (the other tabs keep theirs)."""
+        self.page_load_timeout = seconds
+
+    def get(self, url: str) -> None:
+        """``driver.get`` for a tab: returns once the page is loaded, without blocking the other tabs."""
+        self.load(url, self.page_load_timeout)
+
+    def load(self, url: str, timeout: float) -> float:
+        """
+        Navigate to ``url`` without blocking the other tabs; returns seconds until the load event.
+
+        Raises ``TimeoutException`` (after stopping the tab) if the page is
+        not loaded within ``timeout`` seconds.
+        """
+        started = time.monotonic()
+        with self.focus() as driver:
+            driver.execute_script(NAVIGATE_JS, url)
+        while True:
+            time.sleep(POLL_INTERVAL)
+            with self.focus() as driver:
+                state = driver.execute_script(STATE_JS)
+                if state and state.get("state") == "complete":
+                    # Navigation Timing, when present, is not rounded up to the polls
+                    return state.get("load") or time.monotonic() - started
+                if time.monotonic() - started >= timeout:
+                    try:
+                        driver.execute_script("window.stop();")
+                    except Exception:
+                        pass
+                    raise TimeoutException(f"Page load timeout in tab after {timeout:g}s")
@@ -0,0 +1,164 @@
+"""Per-market circuit breaker so a store that is down fails fast.
+
+After ``threshold`` consecutive failures the market's circuit opens and its
+remaining products are rejected immediately instead of each one waiting out
+the page load timeouts. Once ``cooldown`` seconds have passed a single probe
+is let through (half-open): success closes the circuit, failure reopens it.
+State is persisted in the database so the next run remembers a broken store.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Verdicts returned by CircuitBreakerRegistry.admit besides a rejection reason
+ALLOW = "allow"
+HOLD = "hold"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        market: str,
+        threshold: int = 3,
+        cooldown: float = 900.0,
+        state: str = CLOSED,
+        failures: int = 0,
+        opened_at: Optional[datetime] = None,
+    ):
+        self.market = market
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = state
+        self.failures = failures
+        self.opened_at = opened_at
+        self.probing = False
+
+    def retry_at(self) -> Optional[datetime]:
+        if self.opened_at is None:
+            return None
+        return self.opened_at + timedelta(seconds=self.cooldown)
+
+    def admit(self, now: datetime) -> str:
+        """Decide whether a request to this market may go out.
+
+        Returns:
+            ``ALLOW``, ``HOLD`` (a probe is in flight, try again later) or a
+            rejection reason.
+        """
+        if self.state == CLOSED:
+            return ALLOW
+        if self.probing:
+            return HOLD
+        if self.state == OPEN and now < self.retry_at():
+            return (
+                f"Circuito aberto para '{self.market}' após {self.failures} falha(s) consecutiva(s); "
+                f"nova tentativa a partir de {self.retry_at():%d/%m %H:%M}"
+            )
+        # Cooldown elapsed (or already half-open): let a single probe through
+        self.state = HALF_OPEN
+        self.probing = True
+        return ALLOW
+
+    def record(self, ok: bool, now: datetime) -> None:
+        self.probing = False
+        if ok:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            self.state = OPEN
+            self.opened_at = now
+
+
+class CircuitBreakerRegistry:
+    """Thread-safe collection of breakers, one per market, backed by the database.
+
+    Args:
+        db: DatabaseManager used to load and persist breaker state.
+        threshold: Consecutive failures (K) that open a market's circuit.
+        cooldown: Seconds before an open circuit lets a probe through.
+        is_success: Classifies a scrape result as success or failure.
+    """
+
+    def __init__(
+        self,
+        db,
+        threshold: int = 3,
+        cooldown: float = 900.0,
+        is_success: Callable[[Any], bool] = lambda result: result is not None,
+    ):
+        self.db = db
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.is_success = is_success
+        self.lock = threading.Lock()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        for market, state in db.load_circuit_breakers().items():
+            self.breakers[market] = CircuitBreaker(
+                market,
+                threshold=threshold,
+                cooldown=cooldown,
+                state=state["state"],
+                failures=state["consecutive_failures"],
+                opened_at=state["opened_at"],
+            )
+
+    def _breaker(self, market: str) -> CircuitBreaker:
+        if market not in self.breakers:
+            self.breakers[market] = CircuitBreaker(market, self.threshold, self.cooldown)
+        return self.breakers[market]
+
+    def admit(self, market: str) -> str:
+        with self.lock:
+            return self._breaker(market).admit(datetime.now())
+
+    def record(self, market: str, result: Any) -> None:
+        ok = self.is_success(result)
+        with self.lock:
+            breaker = self._breaker(market)
+            previous = (breaker.state, breaker.failures)
+            breaker.record(ok, datetime.now())
+            if (breaker.state, breaker.failures) == previous:
+                return
+            if breaker.state == OPEN and previous[0] != OPEN:
+                print(f"   🔌 Circuito aberto para '{market}' ({breaker.failures} falha(s) consecutiva(s))")
+            elif breaker.state == CLOSED and previous[0] != CLOSED:
+                print(f"   🔌 Circuito fechado novamente para '{market}'")
+            self.db.save_circuit_breaker(market, breaker.state, breaker.failures, breaker.opened_at)
+
+    @staticmethod
+    def rejected_result(site: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Result for a product skipped by an open circuit, shaped like ``scrape_site`` output."""
+        return {
+            "site_name": site.get("name", "Site Desconhecido"),
+            "url": site.get("url"),
+            "title": "",
+            "scraped_at": datetime.now().isoformat(),
+            "circuit_open": True,
+            "aside_data": {
+                "aside_found": False,
+                "p_tags": [],
+                "total_p_tags": 0,
+                "monitoring_history": [],
+                "total_captures": 0,
+                "error": reason,
+            },
+        }
+
+    def describe(self):
+        """Markets whose circuit is not closed, for the final report."""
+        lines = []
+        for market, breaker in sorted(self.breakers.items()):
+            if breaker.state != CLOSED:
+                retry = breaker.retry_at()
+                when = f", nova tentativa a partir de {retry:%d/%m %H:%M}" if retry else ""
+                lines.append(f"{market}: {breaker.state} ({breaker.failures} falha(s){when})")
+        return lines
@@ -0,0 +1,458 @@
+"""Unified command line for the scraper and the database tools.
+
+Each subcommand imports what it needs only when it runs: ``db`` commands use
+nothing but ``sqlite3``, while ``scrape`` is the only one that loads Selenium
+and webdriver_manager. Use ``--timing`` to print how long the imports and the
+command itself took.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import sys
+import time
+
+from sharding import SHARD_KEYS, parse_shard_spec
+
+_STARTED = time.perf_counter()
+_IMPORT_TIMINGS = []
+
+
+def _lazy_import(module_name):
+    """Import a module on demand, recording how long it took for --timing."""
+    already_loaded = module_name in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if not already_loaded:
+        _IMPORT_TIMINGS.append((module_name, time.perf_counter() - started))
+    return module
+
+
+def positive_float(text):
+    """Tipo do argparse para taxas: número maior que zero."""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"valor inválido '{text}': informe um número")
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"valor inválido '{text}': deve ser maior que zero")
+    return value
+
+
+def add_scrape_arguments(parser):
+    parser.add_argument('--headless', action='store_true', help="Executa o Chrome sem janela")
+    parser.add_argument('--shard', metavar='i/N', help="Processa apenas a fatia i de N do catálogo (ex: 1/4)")
+    parser.add_argument('--shard-key', choices=SHARD_KEYS, default='market',
+                        help="Agrupamento dos shards: por loja (padrão) ou por URL")
+    parser.add_argument('--workers', type=int, default=1, help="Navegadores em paralelo (padrão: 1)")
+    parser.add_argument('--tabs', type=int, default=1, metavar='N',
+                        help="Abas por navegador carregando páginas ao mesmo tempo (padrão: 1)")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Processos de scraping; com mais de 1, um único processo grava no SQLite")
+    parser.add_argument('--writer-batch', type=int, default=100, metavar='N',
+                        help="Registros por transação do processo gravador (padrão: 100)")
+    parser.add_argument('--writer-queue', type=int, default=256, metavar='N',
+                        help="Registros pendentes antes de os processos aguardarem o gravador (padrão: 256)")
+    parser.add_argument('--market-rate', type=positive_float, metavar='REQ/S',
+                        help="Limite de requisições por segundo em cada mercado")
+    parser.add_argument('--market-burst', type=float, default=1.0,
+                        help="Rajada máxima de requisições por mercado (padrão: 1)")
+    parser.add_argument('--latency-target', type=float, default=20.0, metavar='S',
+                        help="Latência acima da qual a concorrência do mercado diminui (padrão: 20s)")
+    parser.add_argument('--breaker-threshold', type=int, default=3, metavar='K',
+                        help="Falhas consecutivas que abrem o circuito de um mercado (padrão: 3)")
+    parser.add_argument('--breaker-cooldown', type=float, default=900, metavar='S',
+                        help="Segundos até testar novamente um mercado com circuito aberto (padrão: 900)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Retoma a última execução interrompida, processando só os sites pendentes")
+    parser.add_argument('--fixed-timeouts', action='store_true',
+                        help="Usa os timeouts fixos (45s/30s/10s) em vez dos aprendidos por site e mercado")
+    parser.add_argument('--timeout-margin', type=float, default=1.5, metavar='X',
+                        help="Timeout = p95 das durações registradas × X + 1s (padrão: 1.5)")
+    parser.add_argument('--skip-fresh', type=float, metavar='HORAS',
+                        help="Pula os sites com preço coletado há menos de HORAS (índice em memória)")
+    parser.add_argument('--snapshots', action='store_true',
+                        help="Guarda o HTML comprimido de cada página para reprocessar com 'replay'")
+    parser.add_argument('--profile', action='store_true',
+                        help="Executa sob cProfile e grava o perfil da execução em --profile-dir")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Com --profile, rastreia também as alocações (tracemalloc)")
+    parser.add_argument('--profile-top', type=int, default=25, metavar='N',
+                        help="Funções e locais de alocação listados no relatório (padrão: 25)")
+    parser.add_argument('--profile-dir', default='data/profiles',
+                        help="Pasta dos artefatos de perfil (padrão: data/profiles)")
+
+
+def cmd_scrape(args):
+    selenium_scraper = _lazy_import('selenium_scraper')
+    if not args.profile:
+        selenium_scraper.run_scraper(args)
+        return
+    profiling = _lazy_import('profiling')
+    with profiling.ProfileSession(args.profile_dir, memory=args.profile_memory, top=args.profile_top,
+                                   processes=args.processes):
+        selenium_scraper.run_scraper(args)
+
+
+def cmd_merge(args):
+    db_merge = _lazy_import('db_merge')
+    totals = db_merge.merge_databases(args.output, args.sources)
+    print(f"✅ {totals['sources']} banco(s) incorporado(s) em {args.output}: "
+          f"{totals['products']} produto(s), {totals['prices']} preço(s)")
+
+
+def cmd_runs(args):
+    database = _lazy_import('database')
+    runs = database.DatabaseManager(args.db).get_recent_runs(args.limit)
+    if not runs:
+        print("Nenhuma execução registrada.")
+        return
+    print(f"{'#':>5}  {'início':19}  {'status':11}  {'shard':5}  {'feitos':>9}  {'ok':>5}  {'falha':>5}  {'duração':>9}  {'sites/min':>9}")
+    for run in runs:
+        duration = run['duration_seconds'] or 0
+        rate = run['processed'] / (duration / 60) if duration else 0
+        print(f"{run['id']:>5}  {run['started_at']:19}  {run['status']:11}  {run['shard'] or '-':5}  "
+              f"{run['processed']:>4}/{run['total_sites']:<4}  {run['successes']:>5}  {run['failures']:>5}  "
+              f"{duration:>8.0f}s  {rate:>9.1f}")
+
+
+def cmd_rollup(args):
+    rollups = _lazy_import('rollups')
+    if args.keep_days:
+        totals = rollups.prune_price_history(args.db, args.keep_days, batch_size=args.batch_size, vacuum=args.vacuum)
+        print(f"📦 Rollup diário: {totals['rows']} preço(s) agregado(s) em {totals['days']} dia(s)/produto")
+        print(f"🧹 {totals['deleted']} preço(s) com mais de {args.keep_days} dia(s) removido(s) do histórico bruto")
+    else:
+        totals = rollups.update_daily_rollups(args.db, batch_size=args.batch_size)
+        print(f"📦 Rollup diário: {totals['rows']} preço(s) agregado(s) em {totals['days']} dia(s)/produto")
+
+
+def cmd_replay(args):
+    snapshots = _lazy_import('snapshots')
+    totals = snapshots.replay_snapshots(args.db, args.config, since=args.since, market=args.market,
+                                        workers=args.workers, dry_run=args.dry_run)
+    print(f"🔁 Replay: {totals['rows']} preço(s) com snapshot, {totals['snapshots']} página(s) reprocessada(s)")
+    if totals['skipped']:
+        print(f"   ⏭️  {totals['skipped']} preço(s) ignorado(s) (listagens ou snapshot ausente)")
+    if args.dry_run:
+        print(f"   📝 {totals['changed']} preço(s) mudariam (--dry-run: nada foi gravado)")
+    else:
+        print(f"   💾 {totals['updated']} preço(s) reescrito(s) no price_history")
+
+
+def cmd_match(args):
+    database = _lazy_import('database')
+    product_matching = _lazy_import('product_matching')
+    totals = product_matching.match_products(database.DatabaseManager(args.db), threshold=args.threshold,
+                                             rebuild=args.rebuild, candidates=args.candidates)
+    print(f"🔗 {totals['pending']} de {totals['products']} produto(s) sem grupo analisado(s)")
+    print(f"   {totals['links']} equivalência(s) entre mercados, {totals['groups']} grupo(s) com mais de um produto, "
+          f"{totals['canonical']} produto(s) canônico(s) novo(s)")
+
+
+def cmd_compare(args):
+    database = _lazy_import('database')
+    product_matching = _lazy_import('product_matching')
+    groups = product_matching.compare_prices(database.DatabaseManager(args.db), args.query, limit=args.limit)
+    if not groups:
+        print(f"Nenhum produto encontrado para '{args.query}' (rode 'mercado.py match' após novos produtos).")
+        return
+    for group in groups:
+        label = f"#{group['canonical_id']}" if group['canonical_id'] else "sem grupo"
+        print(f"\n🛒 {group['name']} ({label})")
+        for index, product in enumerate(group['products']):
+            price = database.format_brl(product['price']) if product['price'] is not None else "sem preço"
+            marker = "🏆" if index == 0 and product['price'] is not None and len(group['products']) > 1 else "  "
+            print(f"   {marker} {price:>12}  {product['market'] or '-':25}  {product['name']}  "
+                  f"({product['scraped_at'] or '-'})")
+
+
+def cmd_price_index(args):
+    if args.benchmark:
+        price_index = _lazy_import('price_index')
+        print(f"⏱️  Benchmark do índice de preços com {args.benchmark} produto(s)...")
+        result = price_index.benchmark(products=args.benchmark)
+        print(f"   Banco de teste populado em {result['populate_seconds']:.1f}s")
+        print(f"   Índice montado em {result['build_seconds']:.2f}s: {result['index_bytes'] / 1024 / 1024:.1f} MiB "
+              f"({result['bytes_per_product']:.1f} bytes/produto), pico de {result['build_peak_bytes'] / 1024 / 1024:.1f} MiB "
+              f"durante a montagem")
+        print(f"   Os mesmos dados num dict de tuplas por URL: {result['dict_bytes'] / 1024 / 1024:.1f} MiB")
+        print(f"   Consulta por URL: {result['lookup_ns']} ns (URL desconhecida: {result['miss_ns']} ns), "
+              f"por ID: {result['product_lookup_ns']} ns")
+        print(f"   Mesma consulta em SQL: {result['sql_lookup_ns']} ns "
+              f"({result['sql_lookup_ns'] / max(1, result['lookup_ns']):.0f}x mais lenta)")
+        return
+    database = _lazy_import('database')
+    db = database.DatabaseManager(args.db)
+    started = time.perf_counter()
+    index = db.latest_prices()
+    print(f"🗂️  {len(index)} produto(s) no índice, {index.memory_bytes() / 1024 / 1024:.1f} MiB, "
+          f"montado em {time.perf_counter() - started:.2f}s")
+    for url in args.url or []:
+        entry = index.get(url)
+        if entry is None:
+            print(f"   ❓ {url}: produto desconhecido")
+            continue
+        price = database.format_brl(entry.price) if entry.price is not None else "sem preço"
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(entry.scraped_at)) if entry.scraped_at else "-"
+        print(f"   💰 {url}: {price} (produto {entry.product_id}, coletado em {when} UTC)")
+
+
+def cmd_alerts(args):
+    database = _lazy_import('database')
+    db = database.DatabaseManager(args.db)
+    if args.alerts_command == 'add':
+        try:
+            rule_id = db.add_alert_rule(product_id=args.product, market=args.market,
+                                        target_price=args.below, change_pct=args.change)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        print(f"✅ Regra de alerta #{rule_id} criada")
+    elif args.alerts_command == 'list':
+        rules = db.get_alert_rules()
+        if not rules:
+            print("Nenhuma regra de alerta.")
+        for rule in rules:
+            scope = f"produto {rule['product_id']} ({rule['product_name']})" if rule['product_id'] else f"mercado {rule['market']}"
+            conditions = []
+            if rule['target_price'] is not None:
+                conditions.append(f"preço ≤ {database.format_brl(rule['target_price'])}")
+            if rule['change_pct'] is not None:
+                conditions.append(f"variação ≥ {rule['change_pct']:g}%")
+            print(f"#{rule['id']:<4} {scope}: {' ou '.join(conditions)}")
+    elif args.alerts_command == 'remove':
+        if db.disable_alert_rule(args.rule_id):
+            print(f"🗑️  Regra #{args.rule_id} desativada")
+        else:
+            print(f"❌ Regra #{args.rule_id} não encontrada")
+    elif args.alerts_command == 'pending':
+        alerts = db.get_pending_alerts(args.limit)
+        if not alerts:
+            print("Nenhum alerta pendente.")
+        for alert in alerts:
+            print(f"🔔 {alert['created_at']}  {alert['product_name']} ({alert['market']}): {alert['message']}")
+    elif args.alerts_command == 'send':
+        alerts = _lazy_import('alerts')
+        try:
+            sent = alerts.send_pending_alerts(db, file=args.file, webhook=args.webhook, limit=args.limit)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        print(f"📤 {sent} alerta(s) enviado(s)")
+
+
+def cmd_simulate(args):
+    simulation = _lazy_import('simulation')
+    print(f"🧪 Simulando {args.products} produto(s) em {args.markets} mercado(s), "
+          f"{args.runs} execução(ões), latência média {args.latency * 1000:.0f} ms...")
+    metrics = simulation.run_simulation(
+        products=args.products, markets=args.markets, runs=args.runs,
+        workers=args.workers, processes=args.processes, tabs=args.tabs,
+        latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+        missing_rate=args.missing_rate, change_rate=args.change_rate, seed=args.seed,
+        db_path=args.sim_db, verbose=args.verbose,
+        scraper_options={'market_rate': args.market_rate, 'breaker_threshold': args.breaker_threshold},
+    )
+    for index, run in enumerate(metrics['runs'], 1):
+        print(f"▶️  Execução {index}: {run['seconds']:.1f}s, {run['sites_per_second']:.0f} sites/s, "
+              f"{run['price_rows']} preço(s) gravado(s) ({run['rows_per_second']:.0f}/s)")
+        print(f"   🧠 Memória (RSS): {run['rss_start_mib']:.0f} → pico {run['rss_peak_mib']:.0f} → "
+              f"{run['rss_end_mib']:.0f} MiB" + (f"; processos filhos: pico {run['children_peak_mib']:.0f} MiB"
+                                                 if args.processes > 1 else ""))
+    print(f"📊 Relatórios sobre o banco final ({metrics['db_size_mib']:.1f} MiB):")
+    for name, seconds in metrics['reports'].items():
+        print(f"   {name:16} {seconds * 1000:9.1f} ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as out:
+            json.dump(metrics, out, indent=2)
+        print(f"📁 Métricas salvas em {args.json}")
+
+
+def cmd_db(args):
+    db_tools = _lazy_import('db_tools')
+    tools = db_tools.DatabaseTools(args.db, live=getattr(args, 'live', False))
+    if args.db_command == 'count':
+        tools.count_summary()
+    elif args.db_command == 'list':
+        tools.show_recent_prices(args.limit)
+    elif args.db_command == 'view':
+        tools.view_prices()
+    elif args.db_command == 'daily':
+        tools.show_daily_prices(args.days, args.product)
+    elif args.db_command == 'tables':
+        tools.show_tables()
+        tools.show_table_structure('products')
+        tools.show_table_structure('price_history')
+    elif args.db_command == 'clear':
+        tools.clear_all_prices()
+    elif args.db_command == 'reset':
+        tools.clear_all_data()
+    elif args.db_command == 'sql':
+        tools.execute_custom_sql(args.query, write=args.write)
+
+
+def cmd_snapshot(args):
+    db_snapshot = _lazy_import('db_snapshot')
+    stats = db_snapshot.create_snapshot(args.db, args.output, pages=args.pages, pause=args.pause)
+    restarts = f", {stats['restarts']} reinício(s) por escritas concorrentes" if stats['restarts'] else ""
+    print(f"📸 Snapshot criado em {stats['path']}: {stats['pages']} página(s) em {stats['steps']} etapa(s), "
+          f"{stats['seconds']:.2f}s{restarts}")
+
+
+def cmd_manage(args):
+    db_tools = _lazy_import('db_tools')
+    db_tools.interactive_menu(args.db)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='mercado', description="Web scraper de preços e ferramentas do banco")
+    parser.add_argument('--db', default='data/scraped_prices.db', help="Caminho do banco SQLite")
+    parser.add_argument('--timing', action='store_true', help="Mostra o tempo de importação e de execução do comando")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scrape = subparsers.add_parser('scrape', help="Executa o scraping dos sites habilitados")
+    add_scrape_arguments(scrape)
+    scrape.set_defaults(func=cmd_scrape)
+
+    merge = subparsers.add_parser('merge', help="Junta bancos de vários nós de scraping (--shard)")
+    merge.add_argument('sources', nargs='+', help="Bancos SQLite de cada nó")
+    merge.add_argument('--output', default='data/scraped_prices.db', help="Banco de destino")
+    merge.set_defaults(func=cmd_merge)
+
+    runs = subparsers.add_parser('runs', help="Histórico de execuções (duração, sucessos, falhas)")
+    runs.add_argument('--limit', type=int, default=10)
+    runs.set_defaults(func=cmd_runs)
+
+    rollup = subparsers.add_parser('rollup', help="Atualiza o resumo diário (price_daily) e aplica a retenção")
+    rollup.add_argument('--keep-days', type=int, metavar='N',
+                        help="Remove do price_history os preços com mais de N dias (já agregados)")
+    rollup.add_argument('--batch-size', type=int, default=5000, help="Linhas por transação (padrão: 5000)")
+    rollup.add_argument('--vacuum', action='store_true', help="Compacta o arquivo do banco após a remoção")
+    rollup.set_defaults(func=cmd_rollup)
+
+    replay = subparsers.add_parser('replay', help="Reextrai os preços dos snapshots guardados (sem navegador)")
+    replay.add_argument('--config', default='data/sites.json', help="Configuração dos sites (seletores)")
+    replay.add_argument('--since', metavar='DATA', help="Apenas preços coletados a partir de DATA (AAAA-MM-DD)")
+    replay.add_argument('--market', help="Apenas um mercado")
+    replay.add_argument('--workers', type=int, metavar='N', help="Processos de extração (padrão: núcleos da CPU)")
+    replay.add_argument('--dry-run', action='store_true', help="Só conta o que mudaria, sem gravar")
+    replay.set_defaults(func=cmd_replay)
+
+    match = subparsers.add_parser('match', help="Agrupa produtos equivalentes de mercados diferentes (IDs canônicos)")
+    match.add_argument('--threshold', type=float, default=0.6,
+                       help="Semelhança mínima entre os nomes, de 0 a 1 (padrão: 0.6)")
+    match.add_argument('--candidates', type=int, default=50, metavar='N',
+                       help="Candidatos do índice FTS examinados por produto (padrão: 50)")
+    match.add_argument('--rebuild', action='store_true', help="Refaz o índice e todos os grupos do zero")
+    match.set_defaults(func=cmd_match)
+
+    compare = subparsers.add_parser('compare', help="Compara o último preço de um produto entre mercados")
+    compare.add_argument('query', help="Nome do produto (ex: 'creme de leite piracanjuba')")
+    compare.add_argument('--limit', type=int, default=10, help="Máximo de grupos (padrão: 10)")
+    compare.set_defaults(func=cmd_compare)
+
+    price_index = subparsers.add_parser('price-index', help="Índice em memória do último preço de cada produto")
+    price_index.add_argument('--url', action='append', metavar='URL', help="Consulta o último preço de uma URL")
+    price_index.add_argument('--benchmark', type=int, metavar='N',
+                             help="Mede montagem, memória e consultas com N produtos num banco temporário")
+    price_index.set_defaults(func=cmd_price_index)
+
+    alerts = subparsers.add_parser('alerts', help="Regras de alerta de preço e alertas disparados")
+    alerts_sub = alerts.add_subparsers(dest='alerts_command', required=True)
+    alerts_add = alerts_sub.add_parser('add', help="Cria uma regra (por produto ou por mercado)")
+    alerts_add.add_argument('--product', type=int, metavar='ID', help="ID do produto")
+    alerts_add.add_argument('--market', help="Todos os produtos de um mercado")
+    alerts_add.add_argument('--below', type=float, metavar='PREÇO', help="Alerta quando o preço chegar a este valor")
+    alerts_add.add_argument('--change', type=float, metavar='PCT', help="Alerta quando o preço variar PCT%% ou mais")
+    alerts_sub.add_parser('list', help="Lista as regras ativas")
+    alerts_remove = alerts_sub.add_parser('remove', help="Desativa uma regra")
+    alerts_remove.add_argument('rule_id', type=int)
+    alerts_pending = alerts_sub.add_parser('pending', help="Alertas disparados ainda não enviados")
+    alerts_pending.add_argument('--limit', type=int, default=50)
+    alerts_send = alerts_sub.add_parser('send', help="Envia os alertas pendentes e os marca como enviados")
+    alerts_send.add_argument('--file', help="Acrescenta os alertas (JSON por linha) a este arquivo")
+    alerts_send.add_argument('--webhook', metavar='URL', help="POST com {'alerts': [...]} para esta URL")
+    alerts_send.add_argument('--limit', type=int, default=500)
+    alerts.set_defaults(func=cmd_alerts)
+
+    simulate = subparsers.add_parser('simulate', help="Teste de carga com navegador sintético (sem Chrome nem rede)")
+    simulate.add_argument('--products', type=int, default=100_000, help="Produtos no catálogo simulado (padrão: 100000)")
+    simulate.add_argument('--markets', type=int, default=20, help="Mercados (padrão: 20)")
+    simulate.add_argument('--runs', type=int, default=1, help="Execuções seguidas sobre o mesmo banco (padrão: 1)")
+    simulate.add_argument('--workers', type=int, default=8, help="Navegadores sintéticos em paralelo (padrão: 8)")
+    simulate.add_argument('--processes', type=int, default=1, help="Processos de scraping (padrão: 1)")
+    simulate.add_argument('--tabs', type=int, default=1, metavar='N', help="Abas por navegador sintético (padrão: 1)")
+    simulate.add_argument('--latency', type=float, default=0.05, metavar='S', help="Carregamento médio de página (padrão: 0.05s)")
+    simulate.add_argument('--jitter', type=float, default=0.5, help="Variação relativa da latência (padrão: 0.5)")
+    simulate.add_argument('--failure-rate', type=float, default=0.01, help="Fração de páginas com timeout (padrão: 0.01)")
+    simulate.add_argument('--missing-rate', type=float, default=0.01, help="Fração de páginas sem preço (padrão: 0.01)")
+    simulate.add_argument('--change-rate', type=float, default=0.1, help="Fração de preços alterados a cada visita (padrão: 0.1)")
+    simulate.add_argument('--market-rate', type=positive_float, metavar='REQ/S', help="Limite de requisições por segundo por mercado")
+    simulate.add_argument('--breaker-threshold', type=int, default=3, metavar='K',
+                          help="Falhas consecutivas que abrem o circuito de um mercado (padrão: 3)")
+    simulate.add_argument('--seed', type=int, default=42, help="Semente dos dados sintéticos (padrão: 42)")
+    simulate.add_argument('--sim-db', metavar='ARQUIVO', help="Banco da simulação (padrão: temporário, apagado ao final)")
+    simulate.add_argument('--json', metavar='ARQUIVO', help="Salva as métricas em JSON (para comparar versões)")
+    simulate.add_argument('--verbose', action='store_true', help="Mostra a saída do scraper para cada produto")
+    simulate.set_defaults(func=cmd_simulate)
+
+    snapshot = subparsers.add_parser('snapshot', help="Cria a cópia somente leitura usada pelos relatórios")
+    snapshot.add_argument('--output', help="Arquivo do snapshot (padrão: <banco>.snapshot.db)")
+    snapshot.add_argument('--pages', type=int, default=256, help="Páginas copiadas por etapa (padrão: 256)")
+    snapshot.add_argument('--pause', type=float, default=0.01, metavar='S', help="Pausa entre etapas (padrão: 0.01s)")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    # Consultas leem o snapshot (somente leitura, imutável); --live lê o banco em uso
+    read_options = argparse.ArgumentParser(add_help=False)
+    read_options.add_argument('--live', action='store_true', help="Lê o banco em uso em vez do snapshot")
+
+    db = subparsers.add_parser('db', help="Consultas e manutenção rápidas do banco")
+    db_sub = db.add_subparsers(dest='db_command', required=True)
+    db_sub.add_parser('count', parents=[read_options], help="Conta produtos e preços")
+    db_list = db_sub.add_parser('list', parents=[read_options], help="Lista os últimos preços")
+    db_list.add_argument('--limit', type=int, default=10)
+    db_sub.add_parser('view', parents=[read_options], help="Lista todos os preços (Preço - Produto - Data)")
+    db_daily = db_sub.add_parser('daily', parents=[read_options],
+                                 help="Resumo diário de preços (abertura/fechamento/mín/máx)")
+    db_daily.add_argument('--days', type=int, default=7)
+    db_daily.add_argument('--product', type=int, metavar='ID', help="Apenas um produto")
+    db_sub.add_parser('tables', parents=[read_options], help="Mostra tabelas e estrutura")
+    db_sub.add_parser('clear', help="Apaga todos os preços (mantém produtos)")
+    db_sub.add_parser('reset', help="Apaga produtos e preços")
+    db_sql = db_sub.add_parser('sql', parents=[read_options], help="Executa SQL personalizado (somente leitura)")
+    db_sql.add_argument('query')
+    db_sql.add_argument('--write', action='store_true', help="Executa no banco em uso, permitindo alterações")
+    db.set_defaults(func=cmd_db)
+
+    manage = subparsers.add_parser('manage', help="Menu interativo de manipulação do banco")
+    manage.set_defaults(func=cmd_manage)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'scrape' and args.shard:
+        try:
+            args.shard = parse_shard_spec(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+    command_started = time.perf_counter()
+    try:
+        args.func(args)
+    finally:
+        if args.timing:
+            finished = time.perf_counter()
+            imports = sum(elapsed for _, elapsed in _IMPORT_TIMINGS)
+            print(f"\n⏱️  Comando '{args.command}': {(finished - _STARTED) * 1000:.1f} ms desde o carregamento do CLI")
+            for module_name, elapsed in _IMPORT_TIMINGS:
+                print(f"   import {module_name}: {elapsed * 1000:.1f} ms")
+            print(f"   execução (sem imports): {(finished - command_started - imports) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 
 def load_sites_config(config_file: str) -> List[Dict[str, Any]]:
@@ -43,3 +43,14 @@ def load_sites_config(config_file: str) -> List[Dict[str, Any]]:
         return []
 
     return sites
+
+
+def site_ceps(site_config: Dict[str, Any]) -> List[Optional[str]]:
+    """CEPs to scrape for a site: the ``ceps`` list (matrix mode) or the single ``cep``/``zipcode``.
+
+    Always returns at least one entry (``None`` when the site has no CEP).
+    """
+    ceps = [str(c) for c in site_config.get("ceps") or [] if c]
+    if ceps:
+        return ceps
+    return [site_config.get("cep") or site_config.get("zipcode") or None]
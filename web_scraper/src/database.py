@@ -1,19 +1,99 @@
+import contextlib
 import sqlite3
 import json
 import re
 from datetime import datetime
 from pathlib import Path
 
+from product_matching import normalize_name
+
+DEFAULT_DB_PATH = 'data/scraped_prices.db'
+
+# Incrementar sempre que o DDL de init_database mudar; bancos com
+# PRAGMA user_version igual a este valor pulam a criação de tabelas.
+SCHEMA_VERSION = 9
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """Abre uma conexão SQLite com as configurações padrão do projeto."""
+    return sqlite3.connect(db_path, timeout=30)
+
+
+def connect_readonly(db_path, immutable=False):
+    """
+    Conexão somente leitura (URI mode=ro). Com immutable=True o SQLite não usa locks
+    nem lê o WAL: apenas para arquivos que não mudam mais, como os snapshots de relatório.
+    """
+    uri = Path(db_path).resolve().as_uri() + '?mode=ro' + ('&immutable=1' if immutable else '')
+    return sqlite3.connect(uri, uri=True, timeout=30)
+
+
+def parse_price_numeric(price_text):
+    """Converte 'R$ 1.234,56' em 1234.56; None se o texto não tiver um preço em reais."""
+    if not price_text or 'R$' not in price_text:
+        return None
+    price_match = re.search(r'R\$\s*([\d.]*\d(?:,\d+)?)', price_text)
+    if not price_match:
+        return None
+    try:
+        return float(price_match.group(1).replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def format_brl(value):
+    """1234.5 -> 'R$ 1.234,50'."""
+    return "R$ " + f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
 class DatabaseManager:
-    def __init__(self, db_path='data/scraped_prices.db'):
+    def __init__(self, db_path=DEFAULT_DB_PATH):
         self.db_path = db_path
+        self.alerts = None  # AlertEngine, carregado no primeiro preço inserido
+        self.price_index = None  # LatestPriceIndex, carregado em latest_prices()
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self.init_database()
+    
+    def connect(self):
+        return connect(self.db_path)
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Cursor de escrita e lista de mudanças para o índice de últimos preços, com commit ao final.
+        
+        O índice só recebe as mudanças depois do commit; se a transação falhar, o cache
+        de alertas (que já viu os preços novos) é descartado e remontado no próximo uso.
+        """
+        index_updates = []
+        conn = self.connect()
+        try:
+            yield conn.cursor(), index_updates
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            self.alerts = None
+            raise
+        finally:
+            conn.close()
+        if self.price_index is not None:
+            for product_id, url, price in index_updates:
+                if url is not None:
+                    self.price_index.add_product(product_id, url)
+                else:
+                    self.price_index.update(product_id, price)
         
     def init_database(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                return
+            
+            # WAL permite leituras (relatórios) concorrentes com a escrita do scraper
+            cursor.execute('PRAGMA journal_mode=WAL')
+            
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS products (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,89 +122,974 @@ class DatabaseManager:
                 )
             ''')
             
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS circuit_breakers (
+                    market TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+                    opened_at DATETIME,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS selector_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    market TEXT NOT NULL,
+                    page_template TEXT NOT NULL,
+                    selector TEXT NOT NULL,
+                    source TEXT DEFAULT 'config',
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    last_hit_at DATETIME,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (market, page_template, selector)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scrape_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    shard TEXT,
+                    total_sites INTEGER DEFAULT 0,
+                    successes INTEGER DEFAULT 0,
+                    failures INTEGER DEFAULT 0,
+                    duration_seconds REAL DEFAULT 0,
+                    sessions INTEGER DEFAULT 1
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scrape_run_items (
+                    run_id INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    site_name TEXT,
+                    market TEXT,
+                    status TEXT NOT NULL,
+                    reason TEXT,
+                    duration_seconds REAL,
+                    finished_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, url),
+                    FOREIGN KEY (run_id) REFERENCES scrape_runs (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fetch_cache (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    status_code INTEGER,
+                    last_checked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # productId VTEX de cada URL, para buscar os produtos da loja em lote (vtex_catalog)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS vtex_products (
+                    url TEXT PRIMARY KEY,
+                    host TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # HTML comprimido das páginas coletadas (deduplicado pelo hash), para replay offline
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS dom_snapshots (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_snapshots (
+                    price_id INTEGER PRIMARY KEY,
+                    snapshot_hash TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    FOREIGN KEY (price_id) REFERENCES price_history (id),
+                    FOREIGN KEY (snapshot_hash) REFERENCES dom_snapshots (hash)
+                )
+            ''')
+            
+            # Janelas de durações de carregamento por site/mercado (adaptive_timeouts), em JSON
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS load_timings (
+                    scope TEXT PRIMARY KEY,
+                    samples TEXT NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Regras de alerta por produto ou por mercado e alertas disparados (a enviar)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alert_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_id INTEGER,
+                    market TEXT,
+                    target_price REAL,
+                    change_pct REAL,
+                    enabled INTEGER NOT NULL DEFAULT 1,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (product_id) REFERENCES products (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alert_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    rule_id INTEGER NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    price_id INTEGER NOT NULL,
+                    cep TEXT,
+                    kind TEXT NOT NULL,
+                    previous_price REAL,
+                    price REAL NOT NULL,
+                    message TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    sent_at DATETIME,
+                    FOREIGN KEY (rule_id) REFERENCES alert_rules (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_alert_outbox_pending
+                ON alert_outbox (id) WHERE sent_at IS NULL
+            ''')
+            
+            # Nome normalizado de cada produto (product_matching) e grupo canônico entre mercados
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS canonical_products (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    brand TEXT,
+                    size TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS product_keys (
+                    product_id INTEGER PRIMARY KEY,
+                    source_name TEXT NOT NULL,
+                    market TEXT,
+                    name TEXT NOT NULL,
+                    brand TEXT,
+                    size TEXT,
+                    match_key TEXT NOT NULL,
+                    canonical_id INTEGER,
+                    FOREIGN KEY (product_id) REFERENCES products (id),
+                    FOREIGN KEY (canonical_id) REFERENCES canonical_products (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_product_keys_match
+                ON product_keys (match_key)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_product_keys_canonical
+                ON product_keys (canonical_id)
+            ''')
+            
+            # Índice FTS5 sobre product_keys (external content), sincronizado pelos triggers abaixo
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+                    name, brand, size,
+                    content='product_keys', content_rowid='product_id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS product_keys_ai AFTER INSERT ON product_keys BEGIN
+                    INSERT INTO product_search (rowid, name, brand, size)
+                    VALUES (new.product_id, new.name, new.brand, new.size);
+                END
+            ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS product_keys_ad AFTER DELETE ON product_keys BEGIN
+                    INSERT INTO product_search (product_search, rowid, name, brand, size)
+                    VALUES ('delete', old.product_id, old.name, old.brand, old.size);
+                END
+            ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS product_keys_au AFTER UPDATE OF name, brand, size ON product_keys BEGIN
+                    INSERT INTO product_search (product_search, rowid, name, brand, size)
+                    VALUES ('delete', old.product_id, old.name, old.brand, old.size);
+                    INSERT INTO product_search (rowid, name, brand, size)
+                    VALUES (new.product_id, new.name, new.brand, new.size);
+                END
+            ''')
+            
+            # Resumo diário por produto, mantido por rollups.update_daily_rollups
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_daily (
+                    product_id INTEGER NOT NULL,
+                    day DATE NOT NULL,
+                    open_price REAL,
+                    close_price REAL,
+                    min_price REAL,
+                    max_price REAL,
+                    samples INTEGER NOT NULL DEFAULT 0,
+                    open_at DATETIME,
+                    close_at DATETIME,
+                    PRIMARY KEY (product_id, day),
+                    FOREIGN KEY (product_id) REFERENCES products (id)
+                )
+            ''')
+            
+            # Marca d'água (último price_history.id já agregado) de cada rollup
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    name TEXT PRIMARY KEY,
+                    last_price_id INTEGER NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_price_history_product
+                ON price_history (product_id, scraped_at)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_price_history_scraped_at
+                ON price_history (scraped_at)
+            ''')
+            
+            # Bancos anteriores ao índice de nomes: indexa os produtos existentes
+            self._index_missing_products(cursor)
+            
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             conn.commit()
             print("✅ Banco de dados inicializado!")
     
-    def save_product(self, name, url, site_name):
-        with sqlite3.connect(self.db_path) as conn:
+    def _upsert_product(self, cursor, name, url, site_name, index_updates):
+        cursor.execute('SELECT id FROM products WHERE url = ?', (url,))
+        result = cursor.fetchone()
+        
+        if result:
+            product_id = result[0]
+            cursor.execute('''
+                UPDATE products 
+                SET name = ?, site_name = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (name, site_name, product_id))
+        else:
+            cursor.execute('''
+                INSERT INTO products (name, url, site_name)
+                VALUES (?, ?, ?)
+            ''', (name, url, site_name))
+            product_id = cursor.lastrowid
+            index_updates.append((product_id, url, None))
+        self._index_product(cursor, product_id, name, site_name)
+        return product_id
+    
+    def _index_product(self, cursor, product_id, name, site_name):
+        """Atualiza o nome normalizado do produto (e o índice FTS, pelos triggers) se o nome mudou."""
+        cursor.execute('''
+            SELECT source_name, market, match_key, canonical_id FROM product_keys WHERE product_id = ?
+        ''', (product_id,))
+        row = cursor.fetchone()
+        if row and row[0] == name and row[1] == site_name:
+            return
+        
+        normalized = normalize_name(name, site_name)
+        canonical_id = row[3] if row and row[2] == normalized['key'] else None
+        if canonical_id is None:
+            # Mesmo nome normalizado de um produto já agrupado: entra no grupo sem esperar o 'match'
+            cursor.execute('''
+                SELECT canonical_id FROM product_keys
+                WHERE match_key = ? AND canonical_id IS NOT NULL AND product_id != ?
+                LIMIT 1
+            ''', (normalized['key'], product_id))
+            found = cursor.fetchone()
+            canonical_id = found[0] if found else None
+        
+        cursor.execute('''
+            INSERT INTO product_keys (product_id, source_name, market, name, brand, size, match_key, canonical_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(product_id) DO UPDATE SET
+                source_name = excluded.source_name,
+                market = excluded.market,
+                name = excluded.name,
+                brand = excluded.brand,
+                size = excluded.size,
+                match_key = excluded.match_key,
+                canonical_id = excluded.canonical_id
+        ''', (product_id, name, site_name, normalized['name'], normalized['brand'], normalized['size'],
+              normalized['key'], canonical_id))
+    
+    def _index_missing_products(self, cursor):
+        """Indexa produtos gravados sem passar por _upsert_product (merge, SQL manual) e remove os apagados."""
+        cursor.execute('DELETE FROM product_keys WHERE product_id NOT IN (SELECT id FROM products)')
+        removed = cursor.rowcount
+        cursor.execute('''
+            SELECT p.id, p.name, p.site_name
+            FROM products p LEFT JOIN product_keys pk ON pk.product_id = p.id
+            WHERE pk.product_id IS NULL OR pk.source_name IS NOT p.name OR pk.market IS NOT p.site_name
+        ''')
+        rows = cursor.fetchall()
+        for product_id, name, site_name in rows:
+            self._index_product(cursor, product_id, name, site_name)
+        return len(rows) + removed
+    
+    def index_products(self, rebuild=False):
+        """
+        Sincroniza o índice de nomes com a tabela products.
+        
+        Args:
+            rebuild (bool): Normaliza todos os nomes de novo e descarta os IDs canônicos
+        
+        Returns:
+            int: Produtos (re)indexados ou removidos do índice
+        """
+        with self.connect() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute('SELECT id FROM products WHERE url = ?', (url,))
-            result = cursor.fetchone()
-            
-            if result:
-                product_id = result[0]
-                cursor.execute('''
-                    UPDATE products 
-                    SET name = ?, site_name = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (name, site_name, product_id))
-            else:
+            if rebuild:
+                cursor.execute('DELETE FROM product_keys')
+                cursor.execute('DELETE FROM canonical_products')
+            changed = self._index_missing_products(cursor)
+            conn.commit()
+            return changed
+    
+    def get_product_keys(self):
+        """{product_id: {'source_name', 'market', 'name', 'brand', 'size', 'canonical_id'}} de todos os produtos."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT product_id, source_name, market, name, brand, size, canonical_id FROM product_keys
+            ''')
+            return {
+                row[0]: {
+                    'source_name': row[1],
+                    'market': row[2],
+                    'name': row[3],
+                    'brand': row[4],
+                    'size': row[5],
+                    'canonical_id': row[6],
+                }
+                for row in cursor.fetchall()
+            }
+    
+    def search_product_keys(self, fts_queries, limit=50):
+        """
+        Busca no índice de nomes, várias consultas na mesma conexão.
+        
+        Args:
+            fts_queries (list): Consultas FTS5 (ver product_matching.fts_query)
+            limit (int): Máximo de produtos por consulta
+        
+        Returns:
+            list: Para cada consulta, os IDs dos produtos encontrados, mais relevantes primeiro
+        """
+        results = []
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for fts_query in fts_queries:
                 cursor.execute('''
-                    INSERT INTO products (name, url, site_name)
-                    VALUES (?, ?, ?)
-                ''', (name, url, site_name))
-                product_id = cursor.lastrowid
-            
+                    SELECT rowid FROM product_search WHERE product_search MATCH ? ORDER BY rank LIMIT ?
+                ''', (fts_query, limit))
+                results.append([row[0] for row in cursor.fetchall()])
+        return results
+    
+    def assign_canonical_ids(self, groups, keys):
+        """
+        Grava o ID canônico de cada grupo de produtos equivalentes.
+        
+        Um grupo que já contém produtos agrupados reaproveita o menor ID canônico
+        entre eles (e absorve os demais); senão, um produto canônico novo é criado.
+        
+        Args:
+            groups (list): [[product_id, ...], ...]
+            keys (dict): Resultado de get_product_keys
+        
+        Returns:
+            int: Produtos canônicos criados
+        """
+        created = 0
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for members in groups:
+                existing = sorted({keys[m]['canonical_id'] for m in members if keys[m]['canonical_id'] is not None})
+                if existing:
+                    canonical_id = existing[0]
+                    if len(existing) > 1:
+                        cursor.executemany('UPDATE product_keys SET canonical_id = ? WHERE canonical_id = ?',
+                                           [(canonical_id, other) for other in existing[1:]])
+                else:
+                    first = keys[members[0]]
+                    cursor.execute('INSERT INTO canonical_products (name, brand, size) VALUES (?, ?, ?)',
+                                   (first['source_name'], first['brand'], first['size']))
+                    canonical_id = cursor.lastrowid
+                    created += 1
+                cursor.executemany('UPDATE product_keys SET canonical_id = ? WHERE product_id = ?',
+                                   [(canonical_id, product_id) for product_id in members])
+            cursor.execute('''
+                DELETE FROM canonical_products
+                WHERE id NOT IN (SELECT canonical_id FROM product_keys WHERE canonical_id IS NOT NULL)
+            ''')
             conn.commit()
-            return product_id
+        return created
     
-    def save_price(self, product_id, price_data, cep='88070150'):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            aside_data = price_data.get('aside_data', {})
-            p_tags = aside_data.get('p_tags', [])
-            
-            if p_tags:
-                price_tag = None
-                for tag in p_tags:
-                    if tag.get('hasPrice'):
-                        price_tag = tag
-                        break
-                
-                if not price_tag and p_tags:
-                    price_tag = p_tags[0]
-                
-                if price_tag:
-                    price_numeric = None
-                    price_text = price_tag.get('textContent', '')
-                    
-                    if 'R$' in price_text:
-                        try:
-                            price_match = re.search(r'R\$\s*([\d,]+)', price_text.replace('.', '').replace(',', '.'))
-                            if price_match:
-                                price_numeric = float(price_match.group(1))
-                        except:
-                            pass
-                    
-                    cursor.execute('''
-                        INSERT INTO price_history (
-                            product_id, price_text, price_html, price_numeric,
-                            price_formatted, css_classes, cep, status, raw_data
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        product_id,
-                        price_tag.get('textContent', ''),
-                        price_tag.get('innerHTML', ''),
-                        price_numeric,
-                        f"R$ {price_numeric:.2f}" if price_numeric else None,
-                        price_tag.get('classes', ''),
-                        cep,
-                        'disponível' if price_tag.get('hasPrice') else 'indisponível',
-                        json.dumps(price_data, ensure_ascii=False, indent=2)
-                    ))
-                    
-                    price_id = cursor.lastrowid
-                    conn.commit()
-                    
-                    print(f"💾 Preço salvo no banco: ID {price_id}")
-                    return price_id
+    def get_canonical_prices(self, product_ids, limit=10):
+        """
+        Último preço de cada produto dos grupos canônicos dos produtos informados.
+        
+        Args:
+            product_ids (list): Produtos encontrados, na ordem de relevância
+            limit (int): Máximo de grupos
+        
+        Returns:
+            list: (canonical_id, nome canônico, product_id, nome, mercado, preço, data), por grupo
+        """
+        if not product_ids:
+            return []
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(product_ids))
+            cursor.execute(f'SELECT product_id, canonical_id FROM product_keys WHERE product_id IN ({placeholders})',
+                           product_ids)
+            canonical_of = dict(cursor.fetchall())
+            ranked = list(dict.fromkeys(
+                ('c', canonical_of[pid]) if canonical_of[pid] is not None else ('p', pid)
+                for pid in product_ids if pid in canonical_of
+            ))[:limit]
+            canonical_ids = [value for kind, value in ranked if kind == 'c']
+            unmatched = [value for kind, value in ranked if kind == 'p']
             
+            cursor.execute(f'''
+                SELECT pk.canonical_id, cp.name, p.id, p.name, p.site_name, ph.price_numeric, ph.scraped_at
+                FROM product_keys pk
+                JOIN products p ON p.id = pk.product_id
+                LEFT JOIN canonical_products cp ON cp.id = pk.canonical_id
+                LEFT JOIN price_history ph ON ph.id = (
+                    SELECT id FROM price_history
+                    WHERE product_id = p.id AND price_numeric IS NOT NULL
+                    ORDER BY scraped_at DESC, id DESC LIMIT 1
+                )
+                WHERE pk.canonical_id IN ({','.join('?' * len(canonical_ids))})
+                   OR pk.product_id IN ({','.join('?' * len(unmatched))})
+            ''', canonical_ids + unmatched)
+            order = {key: index for index, key in enumerate(ranked)}
+            return sorted(cursor.fetchall(),
+                          key=lambda row: order[('c', row[0]) if row[0] is not None else ('p', row[2])])
+    
+    def save_product(self, name, url, site_name):
+        with self._transaction() as (cursor, index_updates):
+            product_id = self._upsert_product(cursor, name, url, site_name, index_updates)
+        return product_id
+    
+    def _price_columns(self, price_data):
+        """Valores das colunas de preço de price_history a partir do aside_data (None se não houver tag)."""
+        aside_data = price_data.get('aside_data', {})
+        p_tags = aside_data.get('p_tags', [])
+        
+        if not p_tags:
             return None
+        
+        price_tag = None
+        for tag in p_tags:
+            if tag.get('hasPrice'):
+                price_tag = tag
+                break
+        
+        if not price_tag and p_tags:
+            price_tag = p_tags[0]
+        
+        if not price_tag:
+            return None
+        
+        price_numeric = parse_price_numeric(price_tag.get('textContent', ''))
+        return {
+            'price_text': price_tag.get('textContent', ''),
+            'price_html': price_tag.get('innerHTML', ''),
+            'price_numeric': price_numeric,
+            'price_formatted': f"R$ {price_numeric:.2f}" if price_numeric else None,
+            'css_classes': price_tag.get('classes', ''),
+            'status': 'disponível' if price_tag.get('hasPrice') else 'indisponível',
+            'raw_data': json.dumps(price_data, ensure_ascii=False, indent=2),
+        }
+    
+    def _insert_price(self, cursor, product_id, price_data, cep, index_updates):
+        columns = self._price_columns(price_data)
+        if not columns:
+            return None
+        # Carregado antes do INSERT: o cache de últimos preços não pode incluir o preço novo
+        alerts = self.alert_engine(cursor)
+        
+        cursor.execute('''
+            INSERT INTO price_history (
+                product_id, price_text, price_html, price_numeric,
+                price_formatted, css_classes, cep, status, raw_data
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            product_id,
+            columns['price_text'],
+            columns['price_html'],
+            columns['price_numeric'],
+            columns['price_formatted'],
+            columns['css_classes'],
+            cep,
+            columns['status'],
+            columns['raw_data'],
+        ))
+        price_id = cursor.lastrowid
+        if columns['price_numeric'] is not None:
+            alerts.evaluate(cursor, product_id, price_id, cep, columns['price_numeric'])
+            index_updates.append((product_id, None, columns['price_numeric']))
+        return price_id
+    
+    def alert_engine(self, cursor):
+        """Regras de alerta e último preço de cada produto em memória (carregados uma vez)."""
+        if self.alerts is None:
+            from alerts import AlertEngine
+            self.alerts = AlertEngine.load(cursor)
+        return self.alerts
+    
+    def latest_prices(self):
+        """
+        Índice em memória do último preço de cada produto (ver price_index.LatestPriceIndex).
+        Montado com uma única consulta na primeira chamada e atualizado a cada preço inserido
+        por este DatabaseManager, depois do commit.
+        """
+        if self.price_index is None:
+            from price_index import LatestPriceIndex
+            with self.connect() as conn:
+                self.price_index = LatestPriceIndex.load(conn.cursor())
+        return self.price_index
+    
+    def save_price(self, product_id, price_data, cep='88070150'):
+        with self._transaction() as (cursor, index_updates):
+            price_id = self._insert_price(cursor, product_id, price_data, cep, index_updates)
+        if price_id:
+            print(f"💾 Preço salvo no banco: ID {price_id}")
+        return price_id
+    
+    def _save_entries(self, cursor, index_updates, entries, site_name, snapshot=None, snapshot_url=None):
+        price_ids = []
+        for name, url, prices in entries:
+            product_id = self._upsert_product(cursor, name, url, site_name, index_updates)
+            for cep, price_data in prices:
+                price_id = self._insert_price(cursor, product_id, price_data, cep, index_updates)
+                if price_id:
+                    price_ids.append(price_id)
+        if snapshot and price_ids:
+            self._save_snapshot(cursor, snapshot, price_ids, snapshot_url)
+        return price_ids
+    
+    def save_price_entries(self, entries, site_name, snapshot=None, snapshot_url=None):
+        """
+        Grava vários produtos e seus preços em uma única transação (ex: itens de uma listagem).
+        
+        Args:
+            entries (list): [(nome, url, [(cep, price_data), ...]), ...] (ver db_writer.price_entries)
+            site_name (str): Mercado dos produtos
+            snapshot (dict): HTML comprimido da página (ver snapshots.compress_snapshot), opcional
+        
+        Returns:
+            list: IDs dos preços inseridos
+        """
+        with self._transaction() as (cursor, index_updates):
+            price_ids = self._save_entries(cursor, index_updates, entries, site_name, snapshot, snapshot_url)
+        return price_ids
+    
+    def save_records(self, records):
+        """
+        Grava um lote de registros compactos (ver db_writer.compact_record) em uma única transação:
+        produto(s) + preço(s) quando o preço foi identificado, validadores HTTP e item do journal.
+        
+        Returns:
+            int: Quantidade de preços inseridos
+        """
+        saved = 0
+        with self._transaction() as (cursor, index_updates):
+            for record in records:
+                fetched = record.get('fetch')
+                if record['success'] and not record.get('unchanged'):
+                    inserted = len(self._save_entries(cursor, index_updates, record['entries'], record['market'],
+                                                      record.get('snapshot'), record['url']))
+                    saved += inserted
+                    if inserted and fetched:
+                        self._save_fetch_metadata(cursor, record['url'], changed=True,
+                                                  status_code=fetched['status_code'], **fetched['metadata'])
+                elif record.get('unchanged') and fetched:
+                    self._save_fetch_metadata(cursor, record['url'], changed=False,
+                                              status_code=fetched['status_code'], **fetched['metadata'])
+                if record.get('run_id'):
+                    self._record_run_item(cursor, record['run_id'], record['site'], record['success'],
+                                          record.get('reason'), record.get('duration_seconds'))
+        return saved
+    
+    def _save_snapshot(self, cursor, snapshot, price_ids, url):
+        cursor.execute('''
+            INSERT OR IGNORE INTO dom_snapshots (hash, codec, size, data) VALUES (?, ?, ?, ?)
+        ''', (snapshot['hash'], snapshot['codec'], snapshot['size'], snapshot['data']))
+        cursor.executemany('''
+            INSERT OR REPLACE INTO price_snapshots (price_id, snapshot_hash, url) VALUES (?, ?, ?)
+        ''', [(price_id, snapshot['hash'], url) for price_id in price_ids])
+    
+    def save_snapshot(self, snapshot, price_ids, url):
+        """
+        Guarda o HTML comprimido de uma página (uma vez por hash) e o associa aos preços extraídos dele.
+        
+        Args:
+            snapshot (dict): Ver snapshots.compress_snapshot
+            price_ids (list): IDs dos preços lidos desse HTML
+            url (str): URL da página
+        """
+        with self.connect() as conn:
+            self._save_snapshot(conn.cursor(), snapshot, price_ids, url)
+            conn.commit()
+    
+    def get_snapshot_tasks(self, since=None, market=None):
+        """Preços com snapshot: [(price_id, url, mercado, hash, price_text)], filtrando por data/mercado."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ps.price_id, ps.url, p.site_name, ps.snapshot_hash, ph.price_text
+                FROM price_snapshots ps
+                JOIN price_history ph ON ph.id = ps.price_id
+                JOIN products p ON p.id = ph.product_id
+                WHERE (? IS NULL OR ph.scraped_at >= ?) AND (? IS NULL OR p.site_name = ?)
+                ORDER BY ps.snapshot_hash
+            ''', (since, since, market, market))
+            return cursor.fetchall()
+    
+    def get_snapshot(self, snapshot_hash):
+        """(codec, dados comprimidos) de um snapshot, ou None."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT codec, data FROM dom_snapshots WHERE hash = ?', (snapshot_hash,))
+            return cursor.fetchone()
+    
+    def update_prices(self, updates):
+        """
+        Reescreve preços já gravados (replay de snapshots) em uma única transação.
+        
+        Args:
+            updates (list): [(price_id, price_data), ...] com o novo aside_data
+        
+        Returns:
+            int: Quantidade de linhas atualizadas
+        """
+        from rollups import refresh_daily_rollups, rolled_up_days
+        
+        updated = 0
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            # Dias já agregados em price_daily são recalculados na mesma transação
+            days = rolled_up_days(cursor, [price_id for price_id, _ in updates])
+            for price_id, price_data in updates:
+                columns = self._price_columns(price_data)
+                if not columns:
+                    continue
+                cursor.execute('''
+                    UPDATE price_history
+                    SET price_text = ?, price_html = ?, price_numeric = ?, price_formatted = ?,
+                        css_classes = ?, status = ?, raw_data = ?
+                    WHERE id = ?
+                ''', (
+                    columns['price_text'], columns['price_html'], columns['price_numeric'],
+                    columns['price_formatted'], columns['css_classes'], columns['status'],
+                    columns['raw_data'], price_id,
+                ))
+                updated += cursor.rowcount
+            refresh_daily_rollups(cursor, days)
+            conn.commit()
+        # Preços reescritos podem ser os últimos de cada produto: o índice e os últimos
+        # preços dos alertas são remontados no próximo uso
+        self.price_index = None
+        self.alerts = None
+        return updated
+    
+    def add_alert_rule(self, product_id=None, market=None, target_price=None, change_pct=None):
+        """
+        Cria uma regra de alerta para um produto ou para todos os produtos de um mercado.
+        
+        Args:
+            target_price (float): Alerta quando o preço chegar a este valor ou abaixo
+            change_pct (float): Alerta quando o preço variar pelo menos este percentual
+        
+        Returns:
+            int: ID da regra
+        """
+        if (product_id is None) == (market is None):
+            raise ValueError("Informe um produto ou um mercado (apenas um)")
+        if target_price is None and change_pct is None:
+            raise ValueError("Informe um preço alvo e/ou uma variação percentual")
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO alert_rules (product_id, market, target_price, change_pct) VALUES (?, ?, ?, ?)
+            ''', (product_id, market, target_price, change_pct))
+            conn.commit()
+            self.alerts = None
+            return cursor.lastrowid
+    
+    def disable_alert_rule(self, rule_id):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE alert_rules SET enabled = 0 WHERE id = ?', (rule_id,))
+            conn.commit()
+            self.alerts = None
+            return cursor.rowcount > 0
+    
+    def get_alert_rules(self):
+        with self.connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT r.*, p.name AS product_name
+                FROM alert_rules r LEFT JOIN products p ON p.id = r.product_id
+                WHERE r.enabled = 1 ORDER BY r.id
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_pending_alerts(self, limit=500):
+        """Alertas ainda não enviados, mais antigos primeiro, com nome/URL/mercado do produto."""
+        with self.connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT a.id, a.rule_id, a.kind, a.product_id, p.name AS product_name, p.url,
+                       p.site_name AS market, a.cep, a.previous_price, a.price, a.message, a.created_at
+                FROM alert_outbox a JOIN products p ON p.id = a.product_id
+                WHERE a.sent_at IS NULL ORDER BY a.id LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def mark_alerts_sent(self, alert_ids):
+        with self.connect() as conn:
+            conn.executemany('UPDATE alert_outbox SET sent_at = CURRENT_TIMESTAMP WHERE id = ?',
+                             [(alert_id,) for alert_id in alert_ids])
+            conn.commit()
+    
+    def load_circuit_breakers(self):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT market, state, consecutive_failures, opened_at FROM circuit_breakers')
+            return {
+                market: {
+                    'state': state,
+                    'consecutive_failures': failures,
+                    'opened_at': datetime.fromisoformat(opened_at) if opened_at else None,
+                }
+                for market, state, failures, opened_at in cursor.fetchall()
+            }
+    
+    def save_circuit_breaker(self, market, state, consecutive_failures, opened_at=None):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO circuit_breakers (market, state, consecutive_failures, opened_at, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(market) DO UPDATE SET
+                    state = excluded.state,
+                    consecutive_failures = excluded.consecutive_failures,
+                    opened_at = excluded.opened_at,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (market, state, consecutive_failures, opened_at.isoformat() if opened_at else None))
+            conn.commit()
+    
+    def get_cached_selectors(self, market, page_template):
+        with self.connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT selector, source, hits, misses
+                FROM selector_cache
+                WHERE market = ? AND page_template = ?
+            ''', (market, page_template))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def record_selector_outcomes(self, market, page_template, outcomes, learned=None):
+        """Acumula acertos/erros de seletores; ``outcomes`` é uma lista de (seletor, acertou)."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO selector_cache (market, page_template, selector, source, hits, misses, last_hit_at)
+                VALUES (?, ?, ?, ?, ?, ?, CASE WHEN ? THEN CURRENT_TIMESTAMP END)
+                ON CONFLICT(market, page_template, selector) DO UPDATE SET
+                    hits = hits + excluded.hits,
+                    misses = misses + excluded.misses,
+                    last_hit_at = COALESCE(excluded.last_hit_at, last_hit_at)
+            ''', [
+                (market, page_template, selector, 'learned' if selector == learned else 'config',
+                 int(hit), int(not hit), hit)
+                for selector, hit in outcomes
+            ])
+            conn.commit()
+    
+    def get_load_timings(self, scope):
+        """Amostras de duração por fase ({'load': [...], ...}) de 'site:<url>' ou 'market:<nome>'."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT samples FROM load_timings WHERE scope = ?', (scope,))
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row else {}
+    
+    def save_load_timings(self, rows):
+        """Grava as janelas de durações [(scope, samples_json), ...] em uma única transação."""
+        with self.connect() as conn:
+            conn.executemany('''
+                INSERT INTO load_timings (scope, samples) VALUES (?, ?)
+                ON CONFLICT(scope) DO UPDATE SET
+                    samples = excluded.samples,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', rows)
+            conn.commit()
+    
+    def get_fetch_metadata(self, url):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT etag, last_modified, content_hash FROM fetch_cache WHERE url = ?', (url,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'etag': row[0], 'last_modified': row[1], 'content_hash': row[2]}
+    
+    def get_vtex_product_ids(self, urls):
+        """Retorna {url: productId} das URLs já resolvidas na API VTEX."""
+        urls = list(urls)
+        if not urls:
+            return {}
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT url, product_id FROM vtex_products WHERE url IN ({', '.join('?' * len(urls))})",
+                urls,
+            )
+            return dict(cursor.fetchall())
+    
+    def save_vtex_product_ids(self, host, product_ids):
+        """Guarda o productId VTEX de cada URL (``product_ids`` = {url: productId})."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO vtex_products (url, host, product_id) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    product_id = excluded.product_id,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', [(url, host, str(product_id)) for url, product_id in product_ids.items()])
+            conn.commit()
+    
+    def _save_fetch_metadata(self, cursor, url, etag=None, last_modified=None, content_hash=None,
+                             status_code=None, changed=True):
+        cursor.execute('''
+            INSERT INTO fetch_cache (url, etag, last_modified, content_hash, status_code)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = excluded.content_hash,
+                status_code = excluded.status_code,
+                last_checked_at = CURRENT_TIMESTAMP,
+                last_changed_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE last_changed_at END
+        ''', (url, etag, last_modified, content_hash, status_code, changed))
+    
+    def save_fetch_metadata(self, url, etag=None, last_modified=None, content_hash=None,
+                            status_code=None, changed=True):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            self._save_fetch_metadata(cursor, url, etag, last_modified, content_hash, status_code, changed)
+            conn.commit()
+    
+    def start_run(self, total_sites, shard=None):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO scrape_runs (status, shard, total_sites) VALUES ('running', ?, ?)
+            ''', (shard, total_sites))
+            conn.commit()
+            return cursor.lastrowid
+    
+    def get_resumable_run(self, shard=None):
+        """
+        Retorna a última execução se ela não terminou (interrompida ou processo morto),
+        junto com as URLs já concluídas nela. Retorna None se a última execução foi concluída.
+        
+        Se ela foi de outra fatia do catálogo ('shard' diferente), é devolvida sem
+        'done_urls' e sem ser marcada como em andamento: não pode ser retomada por esta.
+        """
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, status, shard FROM scrape_runs ORDER BY id DESC LIMIT 1')
+            row = cursor.fetchone()
+            if not row or row[1] == 'completed':
+                return None
+            run_id = row[0]
+            if row[2] != shard:
+                return {'id': run_id, 'shard': row[2], 'done_urls': None}
+            cursor.execute('SELECT url FROM scrape_run_items WHERE run_id = ?', (run_id,))
+            done_urls = {url for (url,) in cursor.fetchall()}
+            cursor.execute('''
+                UPDATE scrape_runs SET status = 'running', sessions = sessions + 1 WHERE id = ?
+            ''', (run_id,))
+            conn.commit()
+            return {'id': run_id, 'shard': row[2], 'done_urls': done_urls}
+    
+    def _record_run_item(self, cursor, run_id, site, success, reason=None, duration_seconds=None):
+        cursor.execute('''
+            INSERT OR REPLACE INTO scrape_run_items (
+                run_id, url, site_name, market, status, reason, duration_seconds
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            run_id,
+            site.get('url'),
+            site.get('name'),
+            site.get('market'),
+            'success' if success else 'failed',
+            reason,
+            duration_seconds,
+        ))
+    
+    def record_run_item(self, run_id, site, success, reason=None, duration_seconds=None):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            self._record_run_item(cursor, run_id, site, success, reason, duration_seconds)
+            conn.commit()
+    
+    def finish_run(self, run_id, status, session_seconds):
+        """Fecha a sessão atual da execução, recalculando os totais a partir do journal."""
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE scrape_runs SET
+                    status = ?,
+                    finished_at = CURRENT_TIMESTAMP,
+                    duration_seconds = duration_seconds + ?,
+                    successes = (SELECT COUNT(*) FROM scrape_run_items WHERE run_id = ? AND status = 'success'),
+                    failures = (SELECT COUNT(*) FROM scrape_run_items WHERE run_id = ? AND status = 'failed')
+                WHERE id = ?
+            ''', (status, session_seconds, run_id, run_id, run_id))
+            conn.commit()
+    
+    def get_recent_runs(self, limit=10):
+        with self.connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT r.*, (SELECT COUNT(*) FROM scrape_run_items i WHERE i.run_id = r.id) AS processed
+                FROM scrape_runs r
+                ORDER BY r.id DESC LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
     
     def get_database_stats(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('SELECT COUNT(*) FROM products')
@@ -0,0 +1,79 @@
+"""Merge the SQLite databases produced by several scraper nodes into one."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterable
+
+from database import DatabaseManager, connect
+
+
+def merge_databases(target_path: str, source_paths: Iterable[str]) -> Dict[str, int]:
+    """Fold every source database into ``target_path``.
+
+    Products are deduplicated by URL (the most recently updated name/market
+    wins) and price rows are copied with their product ids remapped. A price
+    row already present in the target (same product, timestamp, CEP and text)
+    is skipped, so merging the same node twice is harmless.
+
+    Returns:
+        Totals of products and prices inserted into the target.
+    """
+    DatabaseManager(target_path)
+    totals = {"sources": 0, "products": 0, "prices": 0}
+
+    with connect(target_path) as conn:
+        cursor = conn.cursor()
+        for source in source_paths:
+            if Path(source).resolve() == Path(target_path).resolve():
+                print(f"⚠️  Ignorando {source}: é o próprio banco de destino")
+                continue
+            if not Path(source).exists():
+                print(f"❌ Banco não encontrado: {source}")
+                continue
+
+            cursor.execute("ATTACH DATABASE ? AS src", (source,))
+            try:
+                before = conn.total_changes
+                cursor.execute('''
+                    INSERT INTO products (name, url, site_name, created_at, updated_at)
+                    SELECT name, url, site_name, created_at, updated_at
+                    FROM src.products WHERE true
+                    ON CONFLICT(url) DO UPDATE SET
+                        name = excluded.name,
+                        site_name = excluded.site_name,
+                        updated_at = excluded.updated_at
+                    WHERE excluded.updated_at > products.updated_at
+                ''')
+                products = conn.total_changes - before
+
+                cursor.execute('''
+                    INSERT INTO price_history (
+                        product_id, price_text, price_html, price_numeric,
+                        price_formatted, css_classes, cep, scraped_at, status, raw_data
+                    )
+                    SELECT p.id, sph.price_text, sph.price_html, sph.price_numeric,
+                           sph.price_formatted, sph.css_classes, sph.cep, sph.scraped_at,
+                           sph.status, sph.raw_data
+                    FROM src.price_history sph
+                    JOIN src.products sp ON sp.id = sph.product_id
+                    JOIN main.products p ON p.url = sp.url
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM main.price_history ph
+                        WHERE ph.product_id = p.id
+                          AND ph.scraped_at = sph.scraped_at
+                          AND ph.cep IS sph.cep
+                          AND ph.price_text IS sph.price_text
+                    )
+                    ORDER BY sph.id
+                ''')
+                prices = cursor.rowcount
+                conn.commit()
+            finally:
+                cursor.execute("DETACH DATABASE src")
+
+            totals["sources"] += 1
+            totals["products"] += products
+            totals["prices"] += prices
+            print(f"🔀 {source}: {products} produto(s) e {prices} preço(s) incorporados")
+
+    return totals
@@ -0,0 +1,90 @@
+"""Read-only reporting copy of the database (``mercado.py snapshot``).
+
+The copy is made with SQLite's online backup API in steps of ``pages``
+pages with a pause between them, so the scraper's connection is never
+blocked for long. It is written next to the destination and renamed over it
+when complete, so readers always see a whole snapshot. The copy is switched
+to the rollback journal, which lets the report tools open it with
+``mode=ro&immutable=1``: no locks, no WAL, no contention with the scraper.
+
+If another connection writes to the database during a step, SQLite restarts
+the backup from the first page. After ``max_restarts`` restarts, the rest of
+the copy is made in a single step. In WAL mode that step holds only a read
+transaction, and writers keep going.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from database import DEFAULT_DB_PATH, connect
+
+
+def snapshot_path(db_path: str = DEFAULT_DB_PATH) -> str:
+    """``data/scraped_prices.db`` -> ``data/scraped_prices.snapshot.db``."""
+    path = Path(db_path)
+    return str(path.with_name(f"{path.stem}.snapshot{path.suffix or '.db'}"))
+
+
+def snapshot_time(path: str) -> Optional[datetime]:
+    """When the snapshot at ``path`` was completed, or ``None`` if there is none."""
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(path))
+    except OSError:
+        return None
+
+
+class _Restarted(Exception):
+    pass
+
+
+def create_snapshot(db_path: str = DEFAULT_DB_PATH, output: Optional[str] = None, pages: int = 256,
+                    pause: float = 0.01, max_restarts: int = 3) -> Dict[str, float]:
+    """Copy ``db_path`` to ``output`` (default :func:`snapshot_path`) for read-only reporting.
+
+    Returns:
+        ``{'path', 'pages', 'steps', 'restarts', 'seconds'}``
+    """
+    output = output or snapshot_path(db_path)
+    partial = output + ".partial"
+    started = time.perf_counter()
+    stats = {"path": output, "pages": 0, "steps": 0, "restarts": 0}
+
+    def progress(status, remaining, total):
+        stats["steps"] += 1
+        stats["pages"] = total
+        # Remaining pages going up means SQLite restarted the copy from the beginning
+        if stats.get("last_remaining") is not None and remaining > stats["last_remaining"]:
+            stats["restarts"] += 1
+            if stats["restarts"] >= max_restarts:
+                raise _Restarted()
+        stats["last_remaining"] = remaining
+        # backup() only sleeps when a step finds the database busy: the pause between steps is here
+        if remaining and pause > 0:
+            time.sleep(pause)
+
+    if os.path.exists(partial):
+        os.remove(partial)
+    source = connect(db_path)
+    target = sqlite3.connect(partial)
+    try:
+        try:
+            source.backup(target, pages=max(1, pages), progress=progress, sleep=pause)
+        except _Restarted:
+            source.backup(target)
+            stats["steps"] += 1
+        # Rollback journal: an immutable reader must not need a -wal file
+        target.execute("PRAGMA journal_mode=DELETE")
+        target.commit()
+    finally:
+        target.close()
+        source.close()
+    os.replace(partial, output)
+
+    stats.pop("last_remaining", None)
+    stats["seconds"] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,330 @@
+"""Shared database inspection/maintenance commands used by the CLI tools.
+
+Only depends on the standard library, so the DB subcommands start without
+loading Selenium or any scraping module.
+
+Reports read the snapshot made by ``mercado.py snapshot`` (see
+``db_snapshot``), opened read-only and immutable, so they never contend with
+a running scraper; without a snapshot, or with ``live=True``, they read the
+live database, still read-only. Only the maintenance commands write.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+
+from database import DEFAULT_DB_PATH, connect, connect_readonly
+from db_snapshot import snapshot_path, snapshot_time
+
+
+class DatabaseTools:
+    def __init__(self, db_path=DEFAULT_DB_PATH, live=False):
+        self.db_path = db_path
+        self.live = live
+        self.read_source = None  # (caminho, imutável); após uma escrita, o banco em uso
+
+    def read_connect(self):
+        """Conexão somente leitura para relatórios: o snapshot, se existir, ou o banco em uso."""
+        if self.read_source is None:
+            snapshot = snapshot_path(self.db_path)
+            if not self.live and os.path.exists(snapshot):
+                taken = snapshot_time(snapshot)
+                print(f"📸 Snapshot de {taken:%d/%m/%Y %H:%M:%S} (atualize com 'mercado.py snapshot'; --live lê o banco em uso)")
+                self.read_source = (snapshot, True)
+            else:
+                if not self.live:
+                    print("💡 Sem snapshot: lendo o banco em uso. 'mercado.py snapshot' cria uma cópia para relatórios.")
+                self.read_source = (self.db_path, False)
+        return connect_readonly(*self.read_source)
+
+    def show_tables(self):
+        """Mostra todas as tabelas do banco."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            tables = cursor.fetchall()
+            print("📋 Tabelas no banco:")
+            for table in tables:
+                print(f"  - {table[0]}")
+
+    def show_table_structure(self, table_name):
+        """Mostra a estrutura de uma tabela."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            columns = cursor.fetchall()
+            print(f"\n🔧 Estrutura da tabela '{table_name}':")
+            for col in columns:
+                print(f"  {col[1]} ({col[2]}) - {'PRIMARY KEY' if col[5] else ''}")
+
+    def count_records(self, table_name):
+        """Conta registros em uma tabela."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            count = cursor.fetchone()[0]
+            print(f"📊 Total de registros em '{table_name}': {count}")
+            return count
+
+    def count_summary(self):
+        """Conta produtos e preços em uma linha."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM products')
+            products = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM price_history')
+            prices = cursor.fetchone()[0]
+            print(f"Produtos: {products} | Preços: {prices}")
+
+    def show_all_products(self):
+        """Mostra todos os produtos."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM products")
+            products = cursor.fetchall()
+            print("\n🏷️  PRODUTOS:")
+            for p in products:
+                print(f"  ID: {p[0]} | Nome: {p[1]} | Site: {p[3]}")
+
+    def show_all_prices(self):
+        """Mostra todos os preços."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT ph.id, p.name, ph.price_text, ph.scraped_at
+                FROM price_history ph
+                JOIN products p ON ph.product_id = p.id
+                ORDER BY ph.scraped_at DESC
+            """)
+            prices = cursor.fetchall()
+            print("\n💰 PREÇOS:")
+            for pr in prices:
+                print(f"  ID: {pr[0]} | {pr[2]} | {pr[1]} | {pr[3]}")
+
+    def show_recent_prices(self, limit=10):
+        """Lista os últimos preços salvos."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ph.id, p.name, ph.price_text, ph.scraped_at
+                FROM price_history ph
+                JOIN products p ON ph.product_id = p.id
+                ORDER BY ph.id DESC LIMIT ?
+            ''', (limit,))
+            for row in cursor.fetchall():
+                print(f"ID:{row[0]} | {row[2]} | {row[1]} | {row[3]}")
+
+    def view_prices(self):
+        """Visualização simples: 'Preço - Produto - Data'."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM price_history')
+            total = cursor.fetchone()[0]
+            print(f"Total preços: {total}")
+
+            cursor.execute('''
+                SELECT p.name, ph.price_text, ph.scraped_at
+                FROM price_history ph
+                JOIN products p ON ph.product_id = p.id
+                ORDER BY ph.scraped_at DESC
+            ''')
+            for row in cursor.fetchall():
+                print(f"{row[1]} - {row[0]} - {row[2]}")
+
+    def show_daily_prices(self, days=7, product_id=None):
+        """Resumo diário (tabela price_daily), sem ler o histórico bruto."""
+        with self.read_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT d.day, p.name, d.open_price, d.close_price, d.min_price, d.max_price, d.samples
+                FROM price_daily d
+                JOIN products p ON d.product_id = p.id
+                WHERE d.day >= date('now', ?) AND (? IS NULL OR d.product_id = ?)
+                ORDER BY d.day DESC, p.name
+            ''', (f"-{int(days)} days", product_id, product_id))
+            rows = cursor.fetchall()
+            if not rows:
+                print("Nenhum resumo diário no período (rode 'python mercado.py rollup').")
+                return
+            print(f"{'dia':10}  {'abertura':>9}  {'fech.':>9}  {'mín':>9}  {'máx':>9}  {'n':>3}  produto")
+            for day, name, open_price, close_price, min_price, max_price, samples in rows:
+                print(f"{day:10}  {open_price:>9.2f}  {close_price:>9.2f}  {min_price:>9.2f}  "
+                      f"{max_price:>9.2f}  {samples:>3}  {name}")
+
+    def delete_price_by_id(self, price_id):
+        """Deleta um preço específico pelo ID."""
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM price_history WHERE id = ?", (price_id,))
+            affected = cursor.rowcount
+            conn.commit()
+            self.read_source = (self.db_path, False)
+            print(f"🗑️  Deletado {affected} registro(s) de preços")
+
+    def delete_product_by_id(self, product_id):
+        """Deleta um produto e todos os preços relacionados."""
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            # Primeiro deleta os preços
+            cursor.execute("DELETE FROM price_history WHERE product_id = ?", (product_id,))
+            prices_deleted = cursor.rowcount
+            # Depois o nome indexado e o produto
+            cursor.execute("DELETE FROM product_keys WHERE product_id = ?", (product_id,))
+            cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            products_deleted = cursor.rowcount
+            conn.commit()
+            self.read_source = (self.db_path, False)
+            print(f"🗑️  Deletado {products_deleted} produto(s) e {prices_deleted} preço(s)")
+
+    def clear_all_prices(self):
+        """Apaga todos os preços (mantém produtos)."""
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM price_history")
+            affected = cursor.rowcount
+            conn.commit()
+            self.read_source = (self.db_path, False)
+            print(f"🗑️  Deletados {affected} preços")
+
+    def clear_all_data(self):
+        """Apaga todos os dados (produtos e preços)."""
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM price_history")
+            prices_deleted = cursor.rowcount
+            cursor.execute("DELETE FROM product_keys")
+            cursor.execute("DELETE FROM canonical_products")
+            cursor.execute("DELETE FROM products")
+            products_deleted = cursor.rowcount
+            conn.commit()
+            self.read_source = (self.db_path, False)
+            print(f"🗑️  Deletados {products_deleted} produtos e {prices_deleted} preços")
+
+    def add_test_product(self, name, url, site_name="Teste"):
+        """Adiciona um produto de teste."""
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO products (name, url, site_name)
+                VALUES (?, ?, ?)
+            """, (name, url, site_name))
+            product_id = cursor.lastrowid
+            conn.commit()
+            self.read_source = (self.db_path, False)
+            print(f"✅ Produto teste criado - ID: {product_id}")
+            return product_id
+
+    def add_test_price(self, product_id, price_text, price_numeric=None):
+        """Adiciona um preço de teste."""
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO price_history (
+                    product_id, price_text, price_numeric,
+                    cep, status, scraped_at
+                ) VALUES (?, ?, ?, '88070150', 'teste', ?)
+            """, (product_id, price_text, price_numeric, datetime.now()))
+            price_id = cursor.lastrowid
+            conn.commit()
+            self.read_source = (self.db_path, False)
+            print(f"✅ Preço teste criado - ID: {price_id}")
+            return price_id
+
+    def execute_custom_sql(self, sql_query, write=False):
+        """Executa uma query SQL personalizada (somente leitura, a menos que write=True)."""
+        try:
+            with (connect(self.db_path) if write else self.read_connect()) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql_query)
+                if cursor.description is not None:
+                    results = cursor.fetchall()
+                    print("📊 Resultados:")
+                    for row in results:
+                        print(f"  {row}")
+                else:
+                    affected = cursor.rowcount
+                    conn.commit()
+                    print(f"✅ Query executada - {affected} linha(s) afetada(s)")
+                    self.read_source = (self.db_path, False)
+        except Exception as e:
+            print(f"❌ Erro na query: {e}")
+            if not write and 'readonly' in str(e):
+                print("💡 Consultas rodam em modo somente leitura; use --write para alterar o banco em uso.")
+
+
+def interactive_menu(db_path=DEFAULT_DB_PATH):
+    """Menu interativo para manipular o banco."""
+    db = DatabaseTools(db_path)
+
+    while True:
+        print("\n" + "="*50)
+        print("🛠️  FERRAMENTA DE MANIPULAÇÃO DO BANCO")
+        print("="*50)
+        print("1.  Mostrar estrutura do banco")
+        print("2.  Contar registros")
+        print("3.  Ver todos os produtos")
+        print("4.  Ver todos os preços")
+        print("5.  Deletar preço por ID")
+        print("6.  Deletar produto por ID")
+        print("7.  Limpar todos os preços")
+        print("8.  Limpar todos os dados")
+        print("9.  Adicionar produto teste")
+        print("10. Adicionar preço teste")
+        print("11. Executar SQL personalizado")
+        print("0.  Sair")
+        print("-"*50)
+
+        try:
+            choice = input("Escolha uma opção: ").strip()
+
+            if choice == '0':
+                print("👋 Saindo...")
+                break
+            elif choice == '1':
+                db.show_tables()
+                db.show_table_structure('products')
+                db.show_table_structure('price_history')
+            elif choice == '2':
+                db.count_records('products')
+                db.count_records('price_history')
+            elif choice == '3':
+                db.show_all_products()
+            elif choice == '4':
+                db.show_all_prices()
+            elif choice == '5':
+                price_id = input("ID do preço para deletar: ")
+                db.delete_price_by_id(int(price_id))
+            elif choice == '6':
+                product_id = input("ID do produto para deletar: ")
+                db.delete_product_by_id(int(product_id))
+            elif choice == '7':
+                confirm = input("Tem certeza? (s/N): ")
+                if confirm.lower() == 's':
+                    db.clear_all_prices()
+            elif choice == '8':
+                confirm = input("ATENÇÃO: Apagar TUDO? (s/N): ")
+                if confirm.lower() == 's':
+                    db.clear_all_data()
+            elif choice == '9':
+                name = input("Nome do produto teste: ")
+                url = input("URL do produto: ")
+                db.add_test_product(name, url)
+            elif choice == '10':
+                product_id = input("ID do produto: ")
+                price_text = input("Texto do preço (ex: R$ 10,50): ")
+                try:
+                    price_num = float(input("Valor numérico (ex: 10.50): "))
+                except:
+                    price_num = None
+                db.add_test_price(int(product_id), price_text, price_num)
+            elif choice == '11':
+                sql = input("Query SQL: ")
+                db.execute_custom_sql(sql, write=True)
+            else:
+                print("❌ Opção inválida!")
+
+        except KeyboardInterrupt:
+            print("\n👋 Saindo...")
+            break
+        except Exception as e:
+            print(f"❌ Erro: {e}")
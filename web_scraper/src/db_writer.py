@@ -0,0 +1,247 @@
+"""Single-writer process for SQLite, fed by scraping worker processes.
+
+SQLite accepts one writer at a time, so with a ``ProcessPoolExecutor`` each
+worker calling ``DatabaseManager.save_*`` directly ends in ``database is
+locked`` errors. Instead, workers put compact records on a bounded
+``multiprocessing`` queue and one dedicated process owns the connection,
+grouping them into batched transactions.
+
+Messages on the queue:
+    ``('record', dict)``          result of one site (see :func:`compact_record`)
+    ``('call', name, args, kw)``  any small write method of DatabaseManager
+    ``None``                      flush everything and exit
+"""
+from __future__ import annotations
+
+import multiprocessing
+import queue as queue_module
+import signal
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config_loader import site_ceps
+from database import DatabaseManager
+
+# DatabaseManager methods that QueuedDatabase forwards to the writer process
+WRITE_METHODS = frozenset({
+    'save_circuit_breaker',
+    'record_selector_outcomes',
+    'save_fetch_metadata',
+    'record_run_item',
+    'save_vtex_product_ids',
+    'save_load_timings',
+})
+
+
+def _slim_aside(aside: Dict[str, Any] | None) -> Dict[str, Any]:
+    aside = aside or {}
+    p_tags = aside.get('p_tags', [])
+    price_tag = next((p for p in p_tags if p.get('hasPrice')), None) or (p_tags[:1] or [None])[0]
+    return {
+        'aside_found': aside.get('aside_found', False),
+        'p_tags': [price_tag] if price_tag else [],
+        'total_p_tags': aside.get('total_p_tags', 0),
+        'error': aside.get('error'),
+    }
+
+
+def slim_price_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a scrape result keeping only the price tag(s) that will be stored."""
+    slim = {
+        'site_name': result.get('site_name'),
+        'url': result.get('url'),
+        'title': result.get('title'),
+        'scraped_at': result.get('scraped_at'),
+        'unchanged': result.get('unchanged', False),
+        'aside_data': _slim_aside(result.get('aside_data')),
+    }
+    if result.get('product'):
+        slim['product'] = result['product']
+    if result.get('regions'):
+        slim['regions'] = [{'cep': r['cep'], 'aside_data': _slim_aside(r['aside_data'])} for r in result['regions']]
+    if result.get('items') is not None:
+        slim['items'] = result['items']
+    return slim
+
+
+def region_price_data(site: Dict[str, Any], result: Dict[str, Any]) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+    """``(cep, price_data)`` for each price row to insert.
+
+    A single pair for a regular site; in multi-CEP mode one per CEP whose
+    price was found, each with that region's ``aside_data``.
+    """
+    # The compressed snapshot (bytes) is stored apart, never inside raw_data
+    base = {k: v for k, v in result.items() if k not in ('regions', 'snapshot')}
+    regions = result.get('regions')
+    if not regions:
+        return [(site_ceps(site)[0], base)]
+    return [
+        (region['cep'], {**base, 'aside_data': region['aside_data']})
+        for region in regions
+        if any(p.get('hasPrice') for p in (region['aside_data'] or {}).get('p_tags', []))
+    ]
+
+
+def listing_item_price_data(result: Dict[str, Any], item: Dict[str, Any]) -> Dict[str, Any]:
+    """``save_price``-shaped data for one product found on a listing page."""
+    return {
+        'site_name': item['name'],
+        'url': item['url'],
+        'title': item['name'],
+        'scraped_at': result.get('scraped_at'),
+        'listing_url': result.get('url'),
+        'aside_data': {
+            'aside_found': True,
+            'p_tags': [item['price_tag']],
+            'total_p_tags': 1,
+            'error': None,
+        },
+    }
+
+
+def price_entries(site: Dict[str, Any], result: Dict[str, Any]) -> List[Tuple[str, str, list]]:
+    """Products to upsert for a scrape result: ``[(name, url, [(cep, price_data), ...])]``.
+
+    One entry for a product page; one per priced item for a listing page.
+    """
+    if result.get('items') is not None:
+        # The CEP the page was loaded with (scrape_listing fills the modal with the first one)
+        cep = site_ceps(site)[0]
+        return [
+            (item['name'] or 'Produto', item['url'], [(cep, listing_item_price_data(result, item))])
+            for item in result['items']
+            if item['price_tag'].get('hasPrice')
+        ]
+    return [(result.get('site_name', site.get('name', 'Produto')), site.get('url'), region_price_data(site, result))]
+
+
+def compact_record(
+    site: Dict[str, Any],
+    result: Optional[Dict[str, Any]],
+    success: bool,
+    reason: Optional[str],
+    run_id: Optional[int] = None,
+    duration_seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Everything the writer needs to persist one site, without page payloads."""
+    result = result or {}
+    entries = price_entries(site, result) if success and not result.get('unchanged') else []
+    return {
+        'site': {'url': site.get('url'), 'name': site.get('name'), 'market': site.get('market')},
+        'url': site.get('url'),
+        'market': site.get('market') or 'Desconhecido',
+        'success': success,
+        'reason': reason,
+        'unchanged': result.get('unchanged', False),
+        'fetch': result.get('fetch'),
+        'snapshot': result.get('snapshot') if entries else None,
+        'entries': [
+            (name, url, [(cep, slim_price_data(price_data)) for cep, price_data in prices])
+            for name, url, prices in entries
+        ],
+        'run_id': run_id,
+        'duration_seconds': duration_seconds,
+    }
+
+
+def writer_main(db_path: str, messages, batch_size: int, flush_interval: float) -> None:
+    """Body of the writer process: drain the queue into batched transactions."""
+    # Ctrl+C is handled by the parent, which sends the stop sentinel once the
+    # workers are done, so nothing already queued is lost
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    db = DatabaseManager(db_path)
+    batch = []
+    written = 0
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal batch, written, last_flush
+        if batch:
+            try:
+                written += db.save_records(batch)
+            except Exception as e:
+                print(f"❌ Writer: erro ao gravar lote de {len(batch)} registro(s): {e}")
+            batch = []
+        last_flush = time.monotonic()
+
+    while True:
+        try:
+            message = messages.get(timeout=flush_interval)
+        except queue_module.Empty:
+            flush()
+            continue
+
+        if message is None:
+            break
+        if message[0] == 'record':
+            batch.append(message[1])
+        elif message[0] == 'call':
+            # Preserve ordering relative to the records already queued
+            flush()
+            _, name, args, kwargs = message
+            try:
+                getattr(db, name)(*args, **kwargs)
+            except Exception as e:
+                print(f"❌ Writer: erro em {name}: {e}")
+
+        if len(batch) >= batch_size or time.monotonic() - last_flush >= flush_interval:
+            flush()
+
+    flush()
+    print(f"💾 Writer: {written} preço(s) gravado(s)")
+
+
+class DatabaseWriter:
+    """Owns the writer process and its bounded queue.
+
+    Args:
+        max_pending: Queue capacity; producers block when the writer falls
+            this far behind (back-pressure).
+        batch_size: Records per transaction.
+        flush_interval: Max seconds a record waits before being committed.
+    """
+
+    def __init__(self, db_path: str, max_pending: int = 256, batch_size: int = 100,
+                 flush_interval: float = 0.5, context=None):
+        self.context = context or multiprocessing.get_context('spawn')
+        self.queue = self.context.Queue(maxsize=max_pending)
+        self.process = self.context.Process(
+            target=writer_main,
+            args=(db_path, self.queue, batch_size, flush_interval),
+            name='sqlite-writer',
+        )
+
+    def start(self) -> 'DatabaseWriter':
+        self.process.start()
+        return self
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        self.queue.put(('record', record))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Send the stop sentinel and wait until every queued record is committed."""
+        if self.process.is_alive():
+            self.queue.put(None)
+            self.process.join(timeout)
+        self.queue.close()
+        self.queue.join_thread()
+
+
+class QueuedDatabase:
+    """DatabaseManager stand-in for worker processes.
+
+    Reads go to a local connection; the write methods in ``WRITE_METHODS``
+    are sent to the writer process instead of touching the file.
+    """
+
+    def __init__(self, db_path: str, messages):
+        self.db_path = db_path
+        self.messages = messages
+        self.local = DatabaseManager(db_path)
+
+    def __getattr__(self, name):
+        if name in WRITE_METHODS:
+            def forward(*args, **kwargs):
+                self.messages.put(('call', name, args, kwargs))
+            return forward
+        return getattr(self.local, name)
@@ -11,12 +11,17 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+from page_interactions import PAGE_EXTRACTOR_JS
 
-def setup_driver(headless: bool = True) -> webdriver.Chrome:
+
+def setup_driver(headless: bool = True, page_load_strategy: str = "normal") -> webdriver.Chrome:
     """Create and configure a Chrome WebDriver instance.
 
     Args:
         headless: Run Chrome in headless mode.
+        page_load_strategy: ``"none"`` for a browser shared by tabs (see
+            ``browser_tabs``): ChromeDriver then does not hold every command
+            until pending navigations finish loading.
 
     Returns:
         A configured webdriver.Chrome instance.
@@ -39,6 +44,13 @@ def setup_driver(headless: bool = True) -> webdriver.Chrome:
     chrome_options.add_argument("--log-level=3")
     chrome_options.add_argument("--window-size=1920,1080")
 
+    # Background tabs (scrape --tabs) keep loading and rendering at full speed
+    chrome_options.add_argument("--disable-background-timer-throttling")
+    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
+
+    chrome_options.page_load_strategy = page_load_strategy
+
     # Reduce automation fingerprinting
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option("useAutomationExtension", False)
@@ -63,6 +75,13 @@ def setup_driver(headless: bool = True) -> webdriver.Chrome:
     except Exception:
         pass
 
+    # One-call page extractor (page_interactions.extract_page_data), installed in
+    # every document before its own scripts run, so it is not re-sent per page
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": PAGE_EXTRACTOR_JS})
+    except Exception:
+        pass
+
     # Reasonable default timeouts
     try:
         driver.set_page_load_timeout(45)
@@ -0,0 +1,110 @@
+"""Price extraction from raw HTML, for pages fetched without a browser.
+
+Mirrors the browser extractors in ``page_interactions`` and returns the same
+``aside_data`` structure, so ``DatabaseManager.save_price`` and the reporting
+helpers work unchanged.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+ASIDE_SELECTOR = "[data-test='product-details-info'] p, aside p"
+
+_QUERY_SELECTOR = re.compile(r"^\s*document\.querySelector\(\s*(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')\s*\)\s*;?\s*$")
+
+
+def css_from_price_js(price_js: Optional[str]) -> Optional[str]:
+    """Extract the CSS selector from a ``document.querySelector("...")`` expression.
+
+    Returns ``None`` for any other kind of JS expression, which can only be
+    evaluated in a browser.
+    """
+    if not price_js:
+        return None
+    match = _QUERY_SELECTOR.match(price_js)
+    if not match:
+        return None
+    literal = match.group(1)
+    if literal.startswith("'"):
+        literal = '"' + literal[1:-1].replace('"', '\\"').replace("\\'", "'") + '"'
+    try:
+        return json.loads(literal)
+    except json.JSONDecodeError:
+        return None
+
+
+def price_selectors(site_config: Dict[str, Any]) -> List[str]:
+    """CSS selectors to try for a site: ``price_css``, then the one inside ``price_js``."""
+    selectors = []
+    if site_config.get("price_css"):
+        selectors.append(site_config["price_css"])
+    from_js = css_from_price_js(site_config.get("price_js"))
+    if from_js:
+        selectors.append(from_js)
+    return selectors
+
+
+def _p_tag(index: int, el) -> Dict[str, Any]:
+    text = el.get_text().strip()
+    html = el.decode_contents().strip()
+    classes = " ".join(el.get("class") or [])
+    return {
+        "index": index,
+        "textContent": text,
+        "innerHTML": html,
+        "classes": classes,
+        "hasPrice": ("R$" in text) or ("R$" in html),
+    }
+
+
+def extract_title(soup: BeautifulSoup) -> str:
+    if soup.title and soup.title.string:
+        return soup.title.string.strip()
+    h1 = soup.find("h1")
+    return h1.get_text().strip() if h1 else "Título não encontrado"
+
+
+def extract_price_from_soup(soup: BeautifulSoup, selectors: List[str]) -> Dict[str, Any]:
+    """Same contract as ``extract_price_via_js_selectors`` + aside fallback, on parsed HTML."""
+    for index, selector in enumerate(selectors):
+        try:
+            el = soup.select_one(selector)
+        except Exception:
+            el = None
+        if el is None:
+            continue
+        tag = _p_tag(1, el)
+        if tag["hasPrice"]:
+            return {
+                "aside_found": True,
+                "p_tags": [tag],
+                "total_p_tags": 1,
+                "monitoring_history": [],
+                "total_captures": 1,
+                "matched_index": index,
+                "error": None,
+            }
+
+    p_tags = [_p_tag(idx, el) for idx, el in enumerate(soup.select(ASIDE_SELECTOR), 1)]
+    return {
+        "aside_found": True if p_tags else False,
+        "p_tags": p_tags,
+        "total_p_tags": len(p_tags),
+        "monitoring_history": [],
+        "total_captures": 1 if p_tags else 0,
+        "matched_index": None,
+        "error": None if p_tags else "Aside ou conteúdos não encontrados",
+    }
+
+
+def extract_price_from_html(html: str, site_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse ``html`` and return ``{'title': ..., 'aside_data': ...}`` for ``site_config``."""
+    soup = BeautifulSoup(html, "html.parser")
+    return {
+        "title": extract_title(soup),
+        "aside_data": extract_price_from_soup(soup, price_selectors(site_config)),
+    }
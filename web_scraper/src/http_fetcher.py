@@ -0,0 +1,83 @@
+"""Conditional HTTP fetching of product pages that don't need a browser.
+
+Sites with ``"fetch": "http"`` in sites.json are downloaded with
+``requests`` instead of Chrome. The ETag, Last-Modified and a SHA-256 of the
+body from the last successful scrape are kept in the ``fetch_cache`` table;
+the next request is sent with ``If-None-Match``/``If-Modified-Since`` and a
+``304`` (or an identical body) short-circuits to "price unchanged" without
+parsing the page or inserting a new price row.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "pt-BR,pt;q=0.9",
+}
+
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+
+
+class HttpFetcher:
+    """Fetch pages with conditional requests over a pooled ``requests.Session``.
+
+    Args:
+        db: DatabaseManager holding the ``fetch_cache`` table.
+        timeout: Seconds for connect + read.
+    """
+
+    def __init__(self, db, timeout: float = 20.0, pool_size: int = 10):
+        self.db = db
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """Download ``url`` unless it is unchanged since the last successful scrape.
+
+        Returns:
+            ``{'state': 'unchanged'|'changed', 'status_code', 'html', 'metadata'}``.
+            ``metadata`` is only stored (``DatabaseManager.save_fetch_metadata``)
+            once the page has been parsed and saved, so a failed parse is
+            retried with a full download next time.
+
+        Raises:
+            requests.RequestException: On network errors or non-2xx/304 status.
+        """
+        cached = self.db.get_fetch_metadata(url) or {}
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return {"state": UNCHANGED, "status_code": 304, "html": None, "metadata": cached}
+        response.raise_for_status()
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        metadata = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+        }
+        if cached.get("content_hash") == content_hash:
+            return {"state": UNCHANGED, "status_code": response.status_code, "html": None, "metadata": metadata}
+        return {"state": CHANGED, "status_code": response.status_code, "html": response.text, "metadata": metadata}
+
+    def close(self) -> None:
+        self.session.close()
@@ -1,38 +1,50 @@
 """Page interaction and extraction helpers for SeleniumWebScraper."""
 from __future__ import annotations
 
+import json
 import time
-from typing import Any, Dict
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
 
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 
-def handle_zipcode_modal(driver, zipcode: str | None = None, timeout: int = 10) -> None:
+def handle_zipcode_modal(driver, zipcode: str | None = None, timeout: float = 10) -> float | None:
     """Best-effort attempt to fill zipcode modal if it appears.
 
     This is intentionally defensive: if elements aren't found, it just returns.
+
+    Returns:
+        Seconds until the CEP input appeared, or ``None`` if it did not
+        appear within ``timeout`` (or there is no zipcode to fill).
     """
     if not zipcode:
-        return
+        return None
     try:
+        started = time.monotonic()
         wait = WebDriverWait(driver, timeout)
-        # Heuristics: common inputs/buttons for CEP modals on Brazilian e-commerces
+        # Heuristics: common inputs/buttons for CEP modals on Brazilian e-commerces, most specific first
         selectors = [
-            (By.CSS_SELECTOR, "input[name='cep'], input[name='zipcode'], input[aria-label*='CEP']"),
-            (By.CSS_SELECTOR, "input[type='text'][maxlength='8']"),
+            "input[name='cep'], input[name='zipcode'], input[aria-label*='CEP']",
+            "input[type='text'][maxlength='8']",
         ]
+        # One wait for any of them (not ``timeout`` per selector), then pick by priority
+        try:
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ", ".join(selectors))))
+        except Exception:
+            return None
+        appeared = time.monotonic() - started
         input_el = None
-        for by, sel in selectors:
-            try:
-                input_el = wait.until(EC.presence_of_element_located((by, sel)))
-                if input_el:
-                    break
-            except Exception:
-                continue
+        for sel in selectors:
+            found = driver.find_elements(By.CSS_SELECTOR, sel)
+            if found:
+                input_el = found[0]
+                break
         if not input_el:
-            return
+            return appeared
 
         input_el.clear()
         input_el.send_keys(zipcode)
@@ -50,34 +62,57 @@ def handle_zipcode_modal(driver, zipcode: str | None = None, timeout: int = 10)
                 break
             except Exception:
                 continue
+        return appeared
     except Exception:
         # Non-fatal: just proceed
-        return
+        return None
 
 
-def wait_for_complete_loading(driver, timeout: int = 30, zipcode: str | None = None) -> None:
-    """Wait until the page is fully loaded and dynamic content likely present."""
-    print(f"   ⏳ Aguardando carregamento completo da página ({timeout}s)...")
+def wait_for_complete_loading(driver, timeout: float = 30, zipcode: str | None = None,
+                              settle: float = 2.0, zipcode_timeout: float = 10,
+                              aside_timeout: float = 10, timings: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Wait until the page is fully loaded and dynamic content likely present.
 
-    WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+    ``settle`` is a fixed pause at the end for late client-side rendering.
+    How long each wait took is stored in ``timings`` (also returned):
+    ``ready``, ``zipcode`` and ``aside`` (``None`` when the element did not
+    show up), as recorded by ``adaptive_timeouts.AdaptiveTimeouts``. If the
+    page never becomes ready, ``ready`` is set to ``timeout`` before the
+    ``TimeoutException`` propagates.
+    """
+    timings = {} if timings is None else timings
+    print(f"   ⏳ Aguardando carregamento completo da página ({timeout:g}s)...")
 
-    WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+    started = time.monotonic()
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+    except TimeoutException:
+        timings["ready"] = timeout
+        raise
+    timings["ready"] = time.monotonic() - started
 
     print(f"   🌐 URL atual: {driver.current_url}")
 
     # Optional zipcode modal handling
-    handle_zipcode_modal(driver, zipcode=zipcode)
+    if zipcode:
+        timings["zipcode"] = handle_zipcode_modal(driver, zipcode=zipcode, timeout=zipcode_timeout)
 
+    started = time.monotonic()
     try:
-        WebDriverWait(driver, 10).until(
+        WebDriverWait(driver, aside_timeout).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "aside, [data-test='product-details-info']"))
         )
+        timings["aside"] = time.monotonic() - started
     except Exception:
-        print("   ⚠️  Não foi possível confirmar o aside; continuando mesmo assim.")
+        timings["aside"] = None
+        print(f"   ⚠️  Não foi possível confirmar o aside em {aside_timeout:g}s; continuando mesmo assim.")
 
-    print("   ⏳ Aguardando conteúdo dinâmico (2s)...")
-    time.sleep(2)
+    if settle > 0:
+        print(f"   ⏳ Aguardando conteúdo dinâmico ({settle:g}s)...")
+        time.sleep(settle)
     print("   ✅ Página carregada completamente!")
+    return timings
 
 
 def extract_aside_content_with_monitoring(driver) -> Dict[str, Any]:
@@ -134,14 +169,41 @@ def extract_price_via_js_selector(driver, price_js_expr: str) -> Dict[str, Any]:
             "total_captures": 0,
             "error": "price_js inválido ou não informado",
         }
+    return extract_price_via_js_selectors(driver, [price_js_expr])
 
+
+@lru_cache(maxsize=256)
+def _candidates_js(exprs: Tuple[str, ...]) -> str:
+    """JS array literal of functions, one per price expression (built once per selector list)."""
+    return "[" + ",\n".join(f"function() {{ return {expr}; }}" for expr in exprs) + "]"
+
+
+def extract_price_via_js_selectors(driver, price_js_exprs: List[str]) -> Dict[str, Any]:
+    """Try several price JS expressions in a single round trip.
+
+    The first expression whose element contains a price wins; if none does,
+    the first element found at all is returned. ``matched_index`` tells which
+    expression produced the result (``None`` when nothing was found).
+    """
+    exprs = tuple(e for e in price_js_exprs if e and isinstance(e, str))
     js_code = f"""
-var el = (function() {{ try {{ return {price_js_expr}; }} catch (e) {{ return null; }} }})();
-if (!el) {{ return {{ found: false }}; }}
-var text = el.textContent || el.innerText || '';
-var html = el.innerHTML || '';
-var classes = el.className || '';
-return {{ found: true, text: text, html: html, classes: classes }};
+var candidates = {_candidates_js(exprs)};
+var first = null;
+for (var i = 0; i < candidates.length; i++) {{
+    var el = null;
+    try {{ el = candidates[i](); }} catch (e) {{ el = null; }}
+    if (!el) {{ continue; }}
+    var data = {{
+        found: true,
+        index: i,
+        text: el.textContent || el.innerText || '',
+        html: el.innerHTML || '',
+        classes: el.className || ''
+    }};
+    if (data.text.indexOf('R$') !== -1 || data.html.indexOf('R$') !== -1) {{ return data; }}
+    if (!first) {{ first = data; }}
+}}
+return first || {{ found: false }};
 """
 
     try:
@@ -153,6 +215,7 @@ return {{ found: true, text: text, html: html, classes: classes }};
             "total_p_tags": 0,
             "monitoring_history": [],
             "total_captures": 0,
+            "matched_index": None,
             "error": f"Erro executando JS: {e}",
         }
 
@@ -163,6 +226,7 @@ return {{ found: true, text: text, html: html, classes: classes }};
             "total_p_tags": 0,
             "monitoring_history": [],
             "total_captures": 0,
+            "matched_index": None,
             "error": "Elemento de preço não encontrado via JS",
         }
 
@@ -185,5 +249,398 @@ return {{ found: true, text: text, html: html, classes: classes }};
         "total_p_tags": 1,
         "monitoring_history": [],
         "total_captures": 1,
+        "matched_index": result.get("index"),
         "error": None,
     }
+
+
+# Installed once per driver (driver_utils.setup_driver) with CDP
+# Page.addScriptToEvaluateOnNewDocument, so every page already has it and each
+# extraction only sends the short PAGE_EXTRACT_CALL_JS; extract_page_data
+# installs it on the spot on pages where it is missing.
+PAGE_EXTRACTOR_JS = r"""
+window.__mercadoExtract = function (candidates) {
+    function text(el) { return el ? (el.textContent || el.innerText || '').trim() : ''; }
+    // Rendered text only (like Selenium's element.text): hidden nodes and <script> contents left out
+    function visible(el) { return el ? (el.innerText || '').trim() : ''; }
+    function tag(el, read) {
+        return { text: (read || text)(el), html: (el.innerHTML || '').trim(), classes: el.className || '' };
+    }
+    function hasPrice(t) { return t.text.indexOf('R$') !== -1 || t.html.indexOf('R$') !== -1; }
+    function first(css) {
+        try { return document.querySelector(css); } catch (e) { return null; }
+    }
+    function num(v) {
+        if (v === null || v === undefined || v === '') { return null; }
+        var n = parseFloat(String(v).replace(/[^\d.,-]/g, '').replace(/\.(?=\d{3}(\D|$))/g, '').replace(',', '.'));
+        return isNaN(n) ? null : n;
+    }
+
+    var out = { match: null, aside: [], available: null, list_price: null, best_price: null, unit_price: null };
+
+    // Title: <title>, else the first <h1>
+    out.title = document.title ? document.title.trim() : visible(document.querySelector('h1')) || 'Título não encontrado';
+
+    // Price element: first candidate whose element has a price, else the first element found
+    for (var i = 0; i < candidates.length; i++) {
+        var el = null;
+        try { el = candidates[i](); } catch (e) { el = null; }
+        if (!el) { continue; }
+        var data = tag(el);
+        data.index = i;
+        if (hasPrice(data)) { out.match = data; break; }
+        if (!out.match) { out.match = data; }
+    }
+    // Aside fallback, read in the same round trip
+    var nodes = document.querySelectorAll("[data-test='product-details-info'] p, aside p");
+    for (var j = 0; j < nodes.length; j++) { out.aside.push(tag(nodes[j], visible)); }
+
+    // schema.org Product offers (JSON-LD), when the store publishes them
+    var offers = [];
+    function walk(node) {
+        if (!node || typeof node !== 'object') { return; }
+        if (Array.isArray(node)) { node.forEach(walk); return; }
+        if (node.offers) { [].concat(node.offers).forEach(function (o) { offers.push(o); if (o && o.offers) { walk(o); } }); }
+        if (node['@graph']) { walk(node['@graph']); }
+    }
+    document.querySelectorAll('script[type="application/ld+json"]').forEach(function (s) {
+        try { walk(JSON.parse(s.textContent)); } catch (e) {}
+    });
+    offers.forEach(function (o) {
+        if (!o || typeof o !== 'object') { return; }
+        if (o.availability && out.available === null) { out.available = /InStock|LimitedAvailability|PreOrder/i.test(o.availability); }
+        var price = num(o.price !== undefined ? o.price : o.lowPrice);
+        if (price !== null && (out.best_price === null || price < out.best_price)) { out.best_price = price; }
+        var high = num(o.highPrice);
+        if (high !== null && high > (out.list_price || 0)) { out.list_price = high; }
+        if (o.priceSpecification) {
+            [].concat(o.priceSpecification).forEach(function (spec) {
+                if (/ListPrice|StrikethroughPrice/i.test(spec.priceType || '')) { out.list_price = num(spec.price); }
+                if (spec.referenceQuantity && !out.unit_price) {
+                    out.unit_price = 'R$ ' + spec.price + '/' + (spec.referenceQuantity.unitText || spec.referenceQuantity.unitCode || 'un');
+                }
+            });
+        }
+    });
+
+    // Page markup (microdata, VTEX-style class names, "R$ x/kg" texts) fills the rest
+    var area = first("[data-test='product-details-info']") || first('main') || document.body;
+    function within(css) {
+        try { return area.querySelector(css); } catch (e) { return null; }
+    }
+    if (out.available === null) {
+        var av = first('[itemprop="availability"]');
+        if (av) { out.available = /InStock/i.test(av.getAttribute('href') || av.getAttribute('content') || ''); }
+    }
+    if (out.list_price === null) { out.list_price = num(text(within('[class*="listPrice"], [class*="list-price"], [class*="oldPrice"], del, s'))); }
+    if (out.best_price === null) { out.best_price = num(text(within('[class*="sellingPrice"], [class*="bestPrice"], [class*="best-price"]'))); }
+    if (!out.unit_price) {
+        var m = text(area).match(/R\$\s*[\d.]+,\d{2}\s*\/\s*(?:kg|g|l|ml|un|unid\.?|100\s*g|100\s*ml)\b/i);
+        out.unit_price = m ? m[0].replace(/\s+/g, ' ') : null;
+    }
+    if (out.available === null) {
+        var priced = (out.match && hasPrice(out.match)) || out.aside.some(hasPrice);
+        out.available = priced ? true : (/indispon[ií]vel|esgotado|fora de estoque/i.test(text(area)) ? false : null);
+    }
+    return out;
+};
+"""
+
+PAGE_EXTRACT_CALL_JS = """
+if (typeof window.__mercadoExtract !== 'function') { return null; }
+return window.__mercadoExtract(%s);
+"""
+
+
+def _price_aside(tags: List[Dict[str, Any]], matched_index=None, error=None) -> Dict[str, Any]:
+    p_tags = [{
+        "index": idx,
+        "textContent": tag.get("text") or "",
+        "innerHTML": tag.get("html") or "",
+        "classes": tag.get("classes") or "",
+        "hasPrice": "R$" in (tag.get("text") or "") or "R$" in (tag.get("html") or ""),
+    } for idx, tag in enumerate(tags, 1)]
+    return {
+        "aside_found": bool(p_tags),
+        "p_tags": p_tags,
+        "total_p_tags": len(p_tags),
+        "monitoring_history": [],
+        "total_captures": 1 if p_tags else 0,
+        "matched_index": matched_index,
+        "error": error if not p_tags else None,
+    }
+
+
+def extract_page_data(driver, price_js_exprs: List[str]) -> Dict[str, Any]:
+    """Everything ``scrape_site`` reads from a product page, in one round trip.
+
+    Returns:
+        ``{'title', 'selector_data', 'aside_data', 'product'}``: the result of
+        the price expressions and of the aside fallback (both in the
+        ``aside_data`` shape), and ``product`` with ``available``,
+        ``list_price``, ``best_price`` and ``unit_price`` when the page shows them.
+    """
+    exprs = tuple(e for e in price_js_exprs if e and isinstance(e, str))
+    call_js = PAGE_EXTRACT_CALL_JS % _candidates_js(exprs)
+    try:
+        data = driver.execute_script(call_js)
+        if data is None:
+            # Page opened before the driver registered the helper (or without CDP)
+            driver.execute_script(PAGE_EXTRACTOR_JS)
+            data = driver.execute_script(call_js) or {}
+    except Exception as e:
+        error = f"Erro executando JS: {e}"
+        return {
+            "title": "Título não encontrado",
+            "selector_data": _price_aside([], error=error),
+            "aside_data": _price_aside([], error=error),
+            "product": {},
+        }
+    match = data.get("match")
+    return {
+        "title": data.get("title") or "",
+        "selector_data": _price_aside([match] if match else [], match.get("index") if match else None,
+                                      "Elemento de preço não encontrado via JS"),
+        "aside_data": _price_aside(data.get("aside") or [], error="Aside ou conteúdos não encontrados"),
+        "product": {key: data.get(key) for key in ("available", "list_price", "best_price", "unit_price")},
+    }
+
+
+PRICE_TEXT_JS = """
+var candidates = %s;
+for (var i = 0; i < candidates.length; i++) {
+    var el = null;
+    try { el = candidates[i](); } catch (e) { el = null; }
+    if (el) { return (el.textContent || el.innerText || '').trim(); }
+}
+return null;
+"""
+
+
+def switch_region(driver, site_config: Dict[str, Any], zipcode: str, timeout: int = 10) -> bool:
+    """Change the delivery region of the page already loaded, without navigating.
+
+    Strategies, in order of preference (configured per site in sites.json):
+
+    * ``region_js``: script calling the store's own API, run with the CEP as
+      ``arguments[0]``. A returned Promise is awaited by WebDriver.
+    * ``region_cookie``: ``{"name": ..., "value": "...{cep}..."}``; the cookie
+      is set and the page is refreshed (one reload, still no new navigation).
+    * modal: click ``region_trigger_css`` (the "change CEP" button) if given,
+      then fill the CEP modal as on the first load.
+
+    Returns:
+        ``False`` when the switch could not even be attempted, or the modal
+        strategy found no CEP input.
+    """
+    try:
+        if site_config.get("region_js"):
+            driver.execute_script(site_config["region_js"], zipcode)
+            return True
+        cookie = site_config.get("region_cookie")
+        if cookie:
+            driver.add_cookie({
+                "name": cookie["name"],
+                "value": cookie["value"].replace("{cep}", zipcode),
+                "path": cookie.get("path", "/"),
+            })
+            driver.refresh()
+            WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+            return True
+        trigger = site_config.get("region_trigger_css")
+        if trigger:
+            WebDriverWait(driver, timeout).until(EC.element_to_be_clickable((By.CSS_SELECTOR, trigger))).click()
+        if handle_zipcode_modal(driver, zipcode=zipcode, timeout=timeout) is None:
+            # No CEP input: the page still shows the previous region's price
+            print(f"   ⚠️  Campo de CEP não apareceu para trocar para {zipcode}")
+            return False
+        return True
+    except Exception as e:
+        print(f"   ⚠️  Não foi possível trocar para o CEP {zipcode}: {e}")
+        return False
+
+
+def wait_for_price_change(driver, price_js_exprs: List[str], previous_text: str | None,
+                          timeout: float = 5.0) -> bool:
+    """Wait until the price text differs from ``previous_text``.
+
+    Returns ``False`` on timeout, which also happens when both regions simply
+    have the same price; the caller re-reads the price either way.
+    """
+    exprs = tuple(e for e in price_js_exprs if e and isinstance(e, str))
+    if not exprs:
+        time.sleep(timeout)
+        return False
+    js_code = PRICE_TEXT_JS % _candidates_js(exprs)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.25).until(
+            lambda d: (d.execute_script(js_code) or previous_text) != previous_text
+        )
+        return True
+    except Exception:
+        return False
+
+
+LISTING_EXTRACT_JS = """
+var sel = arguments[0];
+function pick(root, css) {
+    if (!css) { return null; }
+    try { return root.querySelector(css); } catch (e) { return null; }
+}
+var nodes = document.querySelectorAll(sel.item);
+var out = [];
+for (var i = 0; i < nodes.length; i++) {
+    var root = nodes[i];
+    var priceEl = pick(root, sel.price);
+    var linkEl = sel.link ? pick(root, sel.link) : (root.tagName === 'A' ? root : root.querySelector('a[href]'));
+    var href = linkEl ? linkEl.getAttribute('href') : null;
+    if (!priceEl || !href) { continue; }
+    var nameEl = pick(root, sel.name);
+    out.push({
+        name: ((nameEl ? nameEl.textContent : linkEl.getAttribute('title')) || '').trim(),
+        url: new URL(href, document.baseURI).href,
+        text: (priceEl.textContent || '').trim(),
+        html: (priceEl.innerHTML || '').trim(),
+        classes: priceEl.className || ''
+    });
+}
+return out;
+"""
+
+NEXT_PAGE_JS = """
+var el = document.querySelector(arguments[0]);
+if (!el || el.disabled || el.getAttribute('aria-disabled') === 'true') { return null; }
+if (el.href) { return el.href; }
+el.click();
+return '';
+"""
+
+
+def wait_for_listing_items(driver, item_selector: str, timeout: int = 30) -> bool:
+    """Wait until at least one listing item is present."""
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, item_selector)))
+        return True
+    except Exception:
+        return False
+
+
+def extract_listing_items(driver, listing: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Read every product card of a listing/search page in one ``execute_script``.
+
+    Args:
+        listing: ``{"item": css, "price": css, "name": css, "link": css}``; selectors
+            other than ``item`` are relative to each item (``link`` defaults to
+            the item itself when it is an ``<a>``, else its first ``a[href]``).
+
+    Returns:
+        ``[{'name', 'url', 'price_tag'}]`` where ``price_tag`` has the same shape
+        as the entries of ``aside_data['p_tags']``.
+    """
+    try:
+        rows = driver.execute_script(LISTING_EXTRACT_JS, listing) or []
+    except Exception as e:
+        print(f"   ⚠️  Erro ao extrair itens da listagem: {e}")
+        return []
+    items = []
+    for row in rows:
+        text, html = row.get("text") or "", row.get("html") or ""
+        items.append({
+            "name": row.get("name") or "",
+            "url": row["url"],
+            "price_tag": {
+                "index": 1,
+                "textContent": text,
+                "innerHTML": html,
+                "classes": row.get("classes") or "",
+                "hasPrice": ("R$" in text) or ("R$" in html),
+            },
+        })
+    return items
+
+
+def scroll_for_more(driver, item_selector: str, timeout: float = 10.0) -> bool:
+    """Infinite scroll: scroll to the bottom and wait for new items. ``False`` if none arrived."""
+    count_js = "return document.querySelectorAll(arguments[0]).length;"
+    before = driver.execute_script(count_js, item_selector)
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.5).until(
+            lambda d: d.execute_script(count_js, item_selector) > before
+        )
+        return True
+    except Exception:
+        return False
+
+
+def go_to_next_page(driver, listing: Dict[str, Any], timeout: int = 30) -> bool:
+    """Follow the listing's "next page" link/button. ``False`` on the last page."""
+    first_url_js = (
+        "var el = document.querySelector(arguments[0]);"
+        "var a = el && (el.tagName === 'A' ? el : el.querySelector('a[href]'));"
+        "return a ? a.href : null;"
+    )
+    try:
+        before = driver.execute_script(first_url_js, listing["item"])
+        href = driver.execute_script(NEXT_PAGE_JS, listing["next"])
+        if href is None:
+            return False
+        if href:
+            driver.get(href)
+            WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+        else:
+            # Client-side pagination: wait until the first card is replaced
+            WebDriverWait(driver, timeout, poll_frequency=0.5).until(
+                lambda d: d.execute_script(first_url_js, listing["item"]) not in (None, before)
+            )
+        return wait_for_listing_items(driver, listing["item"], timeout)
+    except Exception as e:
+        print(f"   ⚠️  Não foi possível avançar a paginação: {e}")
+        return False
+
+
+DERIVE_PRICE_SELECTOR_JS = """
+var nodes = document.querySelectorAll("[data-test='product-details-info'] p, aside p");
+var el = null;
+for (var i = 0; i < nodes.length; i++) {
+    if ((nodes[i].textContent || '').indexOf('R$') !== -1) { el = nodes[i]; break; }
+}
+if (!el) { return null; }
+var parts = [];
+var node = el;
+while (node && node.nodeType === 1 && node !== document.documentElement) {
+    if (node.id && document.querySelectorAll('#' + CSS.escape(node.id)).length === 1) {
+        parts.unshift('#' + CSS.escape(node.id));
+        break;
+    }
+    var testAttr = node.getAttribute('data-test');
+    if (testAttr && document.querySelectorAll('[data-test="' + testAttr + '"]').length === 1) {
+        parts.unshift(node.tagName.toLowerCase() + '[data-test="' + testAttr + '"]');
+        break;
+    }
+    var index = 1;
+    var sibling = node;
+    while ((sibling = sibling.previousElementSibling)) {
+        if (sibling.tagName === node.tagName) { index++; }
+    }
+    parts.unshift(node.tagName.toLowerCase() + ':nth-of-type(' + index + ')');
+    node = node.parentElement;
+}
+var selector = parts.join(' > ');
+return document.querySelector(selector) === el ? selector : null;
+"""
+
+
+def derive_price_selector(driver) -> str | None:
+    """Build a ``document.querySelector(...)`` expression for the price found by the aside fallback.
+
+    The CSS path is anchored on the nearest unique ``id`` or ``data-test``
+    ancestor so it survives unrelated layout changes above it.
+    """
+    try:
+        selector = driver.execute_script(DERIVE_PRICE_SELECTOR_JS)
+    except Exception:
+        return None
+    if not selector:
+        return None
+    return f"document.querySelector({json.dumps(selector)})"
@@ -0,0 +1,262 @@
+"""Compact in-memory index of the latest known price of every product.
+
+``LatestPriceIndex`` answers "what was the last price of this URL, and
+when?" without a query: parallel ``array`` columns hold, per product, a
+64-bit hash of the URL, the product id, the last price in centavos and the
+epoch second it was scraped. Slots loaded at start are sorted by URL hash
+and searched with ``bisect``; products added later go to a small dict, and
+a direct-address array maps product ids to slots. About 24 bytes per
+product: a million products fit in ~24 MiB, against hundreds of MiB for a
+dict of tuples keyed by URL.
+
+``DatabaseManager.latest_prices()`` builds it with one streaming query on
+first use and then keeps it current in place: every price inserted through
+the manager updates its slot. Writes made by other connections (another
+process, ``db sql``) are not seen until the index is rebuilt.
+
+URLs are not stored, only Python's own string hash: the index lives in one
+process and is never persisted, so the per-process hash seed does not
+matter, and the hash a ``str`` caches makes repeated lookups cheap. Two
+URLs with the same 64-bit hash would share a slot (about one chance in
+10^7 with a million products).
+
+``benchmark`` measures build time, memory and lookup cost on a scratch
+database (``mercado.py price-index --benchmark 1000000``).
+"""
+from __future__ import annotations
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+NO_PRICE = -1
+
+
+class LatestPrice(NamedTuple):
+    product_id: int
+    price: Optional[float]
+    scraped_at: Optional[int]
+
+
+def url_hash(url: str) -> int:
+    # Valid within this process only (PYTHONHASHSEED); see the module docstring
+    return hash(url)
+
+
+class LatestPriceIndex:
+    """URL hash -> (product id, last price in centavos, last scraped epoch); see the module docstring."""
+
+    # Latest non-null price per product, through idx_price_history_product
+    QUERY = '''
+        SELECT p.id, p.url, ph.price_numeric, CAST(strftime('%s', ph.scraped_at) AS INTEGER)
+        FROM products p
+        LEFT JOIN price_history ph ON ph.id = (
+            SELECT id FROM price_history
+            WHERE product_id = p.id AND price_numeric IS NOT NULL
+            ORDER BY scraped_at DESC, id DESC LIMIT 1
+        )
+    '''
+
+    def __init__(self):
+        self.hashes = array("q")
+        self.product_ids = array("i")
+        self.prices = array("i")
+        self.scraped = array("I")
+        self.slots = array("i")  # product id -> slot, -1 if unknown
+        self.sorted_count = 0
+        self.extra: Dict[int, int] = {}  # hash -> slot of products added after the build
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, str, Optional[float], Optional[int]]]) -> "LatestPriceIndex":
+        """Index ``(product_id, url, price, scraped_epoch)`` rows."""
+        hashes, product_ids, prices, scraped = array("q"), array("i"), array("i"), array("I")
+        for product_id, url, price, scraped_at in rows:
+            hashes.append(url_hash(url))
+            product_ids.append(product_id)
+            prices.append(NO_PRICE if price is None else round(price * 100))
+            scraped.append(scraped_at or 0)
+
+        index = cls()
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        index.hashes = array("q", (hashes[i] for i in order))
+        index.product_ids = array("i", (product_ids[i] for i in order))
+        index.prices = array("i", (prices[i] for i in order))
+        index.scraped = array("I", (scraped[i] for i in order))
+        del order, hashes, product_ids, prices, scraped
+        index.sorted_count = len(index.hashes)
+        index.slots = array("i", [-1]) * (max(index.product_ids, default=0) + 1)
+        for slot, product_id in enumerate(index.product_ids):
+            index.slots[product_id] = slot
+        return index
+
+    @classmethod
+    def load(cls, cursor) -> "LatestPriceIndex":
+        # Rows are consumed as SQLite produces them: no list of a million tuples
+        return cls.build(cursor.execute(cls.QUERY))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the arrays (the dict of late additions is not counted)."""
+        columns = (self.hashes, self.product_ids, self.prices, self.scraped, self.slots)
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+
+    def _slot(self, url: str) -> int:
+        h = url_hash(url)
+        i = bisect_left(self.hashes, h, 0, self.sorted_count)
+        if i < self.sorted_count and self.hashes[i] == h:
+            return i
+        return self.extra.get(h, -1)
+
+    def _entry(self, slot: int) -> Optional[LatestPrice]:
+        if slot < 0:
+            return None
+        cents = self.prices[slot]
+        return LatestPrice(self.product_ids[slot], None if cents == NO_PRICE else cents / 100,
+                           self.scraped[slot] or None)
+
+    def get(self, url: str) -> Optional[LatestPrice]:
+        """Latest price of the product at ``url``, or ``None`` if the URL is not a known product."""
+        return self._entry(self._slot(url))
+
+    def get_product(self, product_id: int) -> Optional[LatestPrice]:
+        slot = self.slots[product_id] if 0 <= product_id < len(self.slots) else -1
+        return self._entry(slot)
+
+    def price_cents(self, url: str) -> Optional[int]:
+        slot = self._slot(url)
+        if slot < 0 or self.prices[slot] == NO_PRICE:
+            return None
+        return self.prices[slot]
+
+    def is_fresh(self, url: str, max_age: float, now: Optional[float] = None) -> bool:
+        """Whether ``url`` has a price scraped less than ``max_age`` seconds ago."""
+        slot = self._slot(url)
+        if slot < 0 or not self.scraped[slot]:
+            return False
+        return (now or time.time()) - self.scraped[slot] < max_age
+
+    def add_product(self, product_id: int, url: str) -> int:
+        """Slot of ``product_id``, appending one (without a price) if it is new."""
+        with self.lock:
+            if product_id < len(self.slots) and self.slots[product_id] >= 0:
+                return self.slots[product_id]
+            slot = len(self.hashes)
+            h = url_hash(url)
+            self.hashes.append(h)
+            self.product_ids.append(product_id)
+            self.prices.append(NO_PRICE)
+            self.scraped.append(0)
+            self.extra[h] = slot
+            if product_id >= len(self.slots):
+                self.slots.extend(array("i", [-1]) * (product_id + 1 - len(self.slots)))
+            self.slots[product_id] = slot
+            return slot
+
+    def update(self, product_id: int, price: float, scraped_at: Optional[float] = None) -> bool:
+        """Record a new latest price in place. Returns ``False`` for a product the index does not know."""
+        slot = self.slots[product_id] if 0 <= product_id < len(self.slots) else -1
+        if slot < 0:
+            return False
+        with self.lock:
+            self.prices[slot] = round(price * 100)
+            self.scraped[slot] = int(scraped_at or time.time())
+        return True
+
+
+def _populate(db_path: str, products: int, markets: int = 50, batch: int = 50_000) -> None:
+    from database import DatabaseManager
+
+    with DatabaseManager(db_path).connect() as conn:
+        conn.execute("PRAGMA synchronous=OFF")
+        rng = random.Random(0)
+        for start in range(0, products, batch):
+            ids = range(start + 1, min(products, start + batch) + 1)
+            conn.executemany("INSERT INTO products (id, name, url, site_name) VALUES (?, ?, ?, ?)",
+                             ((i, f"Produto {i}", f"https://loja{i % markets}.example/produto-{i}/p",
+                               f"Loja {i % markets}") for i in ids))
+            conn.executemany("INSERT INTO price_history (product_id, price_text, price_numeric) VALUES (?, ?, ?)",
+                             ((i, "", rng.randint(99, 99_999) / 100) for i in ids))
+            conn.commit()
+
+
+def benchmark(products: int = 1_000_000, lookups: int = 200_000, sql_lookups: int = 5_000) -> Dict[str, Any]:
+    """
+    Build the index over ``products`` products in a scratch database and time lookups.
+
+    Returns:
+        Seconds to populate and build, bytes of the arrays, peak allocation
+        during the build and bytes of the same rows as a dict of tuples keyed
+        by URL, and mean nanoseconds per index lookup (hit, miss, by product
+        id) and per equivalent SQL query.
+    """
+    workdir = tempfile.mkdtemp(prefix="mercado-price-index-")
+    db_path = os.path.join(workdir, "bench.db")
+    try:
+        started = time.perf_counter()
+        _populate(db_path, products)
+        populate_seconds = time.perf_counter() - started
+
+        from database import connect
+        conn = connect(db_path)
+        started = time.perf_counter()
+        index = LatestPriceIndex.load(conn.cursor())
+        build_seconds = time.perf_counter() - started
+        # Second build under tracemalloc (which slows it several times) for the peak allocation
+        tracemalloc.start()
+        LatestPriceIndex.load(conn.cursor())
+        build_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        tracemalloc.start()
+        naive = {url: (product_id, price, scraped_at)
+                 for product_id, url, price, scraped_at in conn.execute(LatestPriceIndex.QUERY)}
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del naive
+
+        rng = random.Random(1)
+        ids = [rng.randint(1, products) for _ in range(lookups)]
+        urls = [f"https://loja{i % 50}.example/produto-{i}/p" for i in ids]
+        misses = [f"https://outra.example/produto-{i}/p" for i in ids]
+
+        def per_call(func, args) -> float:
+            started = time.perf_counter()
+            for arg in args:
+                func(arg)
+            return (time.perf_counter() - started) / len(args) * 1e9
+
+        sql = '''
+            SELECT p.id, ph.price_numeric, ph.scraped_at FROM products p
+            LEFT JOIN price_history ph ON ph.id = (
+                SELECT id FROM price_history WHERE product_id = p.id AND price_numeric IS NOT NULL
+                ORDER BY scraped_at DESC, id DESC LIMIT 1
+            )
+            WHERE p.url = ?
+        '''
+        cursor = conn.cursor()
+        result = {
+            "products": len(index),
+            "populate_seconds": round(populate_seconds, 2),
+            "build_seconds": round(build_seconds, 2),
+            "index_bytes": index.memory_bytes(),
+            "bytes_per_product": round(index.memory_bytes() / max(1, len(index)), 1),
+            "build_peak_bytes": build_peak,
+            "dict_bytes": dict_bytes,
+            "lookup_ns": round(per_call(index.get, urls)),
+            "miss_ns": round(per_call(index.get, misses)),
+            "product_lookup_ns": round(per_call(index.get_product, ids)),
+            "sql_lookup_ns": round(per_call(lambda url: cursor.execute(sql, (url,)).fetchone(), urls[:sql_lookups])),
+        }
+        conn.close()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,74 @@
+"""Scraping across processes, with every database write funneled to one writer.
+
+Each pool process builds its own ``SeleniumWebScraper`` (own Chrome, own HTTP
+session) whose database is a :class:`db_writer.QueuedDatabase`: reads hit a
+local connection, writes go through the writer queue. A scraped page is
+reduced to a compact record in the worker, so only a few hundred bytes per
+site cross the process boundary.
+"""
+from __future__ import annotations
+
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+from typing import Any, Dict, Optional
+
+from db_writer import QueuedDatabase, compact_record, slim_price_data
+
+_scraper = None
+_messages = None
+
+
+def _init_worker(db_path: str, messages, scraper_kwargs: Dict[str, Any]) -> None:
+    global _scraper, _messages
+    from selenium_scraper import SeleniumWebScraper
+
+    # Let the in-flight page finish and reach the writer; the parent stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _messages = messages
+    _scraper = SeleniumWebScraper(db=QueuedDatabase(db_path, messages), db_path=db_path, **scraper_kwargs)
+    util.Finalize(_scraper, _scraper.close, exitpriority=10)
+
+
+def _scrape_in_worker(site: Dict[str, Any], run_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    started = time.monotonic()
+    result = _scraper.scrape_site(site)
+    success, reason = _scraper.price_extracted_success(result)
+    record = compact_record(site, result, success, reason, run_id=run_id,
+                            duration_seconds=time.monotonic() - started)
+    # Blocks while the writer is behind (bounded queue = back-pressure)
+    _messages.put(('record', record))
+    return slim_price_data(result) if result else None
+
+
+class ScrapeProcessPool:
+    """``ProcessPoolExecutor`` of scrapers wired to a :class:`db_writer.DatabaseWriter`."""
+
+    def __init__(self, processes: int, writer, db_path: str, scraper_kwargs: Dict[str, Any]):
+        self.processes = processes
+        self.writer = writer
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=writer.context,
+            initializer=_init_worker,
+            initargs=(db_path, writer.queue, scraper_kwargs),
+        )
+
+    def scrape(self, site: Dict[str, Any], run_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Scrape ``site`` in some pool process and wait for its compact result."""
+        from selenium_scraper import DriverSetupError
+
+        try:
+            return self.executor.submit(_scrape_in_worker, site, run_id).result()
+        except DriverSetupError:
+            # No browser in that process: every other site would fail the same way
+            raise
+        except Exception as e:
+            # The worker never sent its record; journal the failure from here
+            print(f"   ❌ Erro no processo de scraping: {e}")
+            self.writer.submit(compact_record(site, None, False, f"Erro no processo: {e}", run_id=run_id))
+            return None
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
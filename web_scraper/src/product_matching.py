@@ -0,0 +1,254 @@
+"""Product name index and cross-market matching (``mercado.py match`` / ``compare``).
+
+Every product saved through ``DatabaseManager`` gets a row in ``product_keys``
+with its normalized name, mirrored into the FTS5 table ``product_search``
+by triggers. Normalization (``normalize_name``):
+
+* lowercase, no accents, punctuation as spaces;
+* sizes in base units: ``1L`` and ``1000 ml`` are both ``1000ml``, ``0,5kg``
+  is ``500g``, ``C/30`` is ``30un``, ``6x1L`` is ``6x1000ml``, and so is
+  ``1L 6 unidades``;
+* known brands become a single token (``3 Corações`` -> ``3coracoes``), so
+  their words are not mistaken for sizes or descriptors; when the name
+  carries the store's own name (``Atacadão Leite 1L``) the store is the brand;
+* filler words (``de``, ``com``, ``pacote``...) are dropped.
+
+``match_products`` groups equivalent products of different markets into
+canonical products: for each unmatched product, the FTS index returns the
+candidates with the same brand and size that share a word with it, and
+those whose words overlap by at least ``threshold`` (Jaccard) are joined.
+Products with exactly the same normalized name get the canonical ID of an
+existing match as soon as they are saved, so the command only has to look
+at genuinely new names.
+
+``compare_prices`` searches the index and returns the latest price of every
+product in the matching canonical groups, one indexed join per query.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+# Multi-word brands first, so "santa amalia" is not cut at "santa"
+KNOWN_BRANDS = sorted((
+    "3 coracoes", "andorinha", "aurora", "bauducco", "camil", "coca cola", "dona benta", "elege",
+    "friolar", "gallo", "italac", "kicaldo", "liza", "melitta", "nestle", "omo", "parmalat",
+    "perdigao", "pilao", "piracanjuba", "qualy", "quero", "renata", "rocha", "sadia",
+    "santa amalia", "seara", "soya", "tio joao", "uniao", "ype",
+), key=lambda brand: -len(brand))
+
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "com", "em", "para", "p",
+    "pct", "pacote", "emb", "embalagem", "tipo", "und", "unidade",
+}
+
+# Words of a store name that do not identify it (kept out of the store brand)
+MARKET_WORDS = {"supermercado", "supermercados", "mercado", "mercados", "atacado", "hiper",
+                "hipermercado", "loja", "lojas"}
+
+UNITS = {
+    "kg": ("g", 1000), "g": ("g", 1), "gr": ("g", 1), "grs": ("g", 1), "grama": ("g", 1),
+    "gramas": ("g", 1), "mg": ("g", 0.001),
+    "l": ("ml", 1000), "lt": ("ml", 1000), "lts": ("ml", 1000), "litro": ("ml", 1000),
+    "litros": ("ml", 1000), "ml": ("ml", 1),
+    "un": ("un", 1), "und": ("un", 1), "unid": ("un", 1), "unidade": ("un", 1), "unidades": ("un", 1),
+}
+
+SIZE_RE = re.compile(
+    r"\b(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(" + "|".join(sorted(UNITS, key=len, reverse=True)) + r")\b"
+)
+COUNT_RE = re.compile(r"\b(?:c/|com)\s*(\d+)\b")
+
+
+def strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _size(match: "re.Match") -> Tuple[int, str, str]:
+    """``(pack, amount, base unit)`` of a size match: ``6x1L`` -> ``(6, '1000ml', 'ml')``."""
+    pack, amount, unit = match.groups()
+    base, factor = UNITS[unit]
+    value = float(amount.replace(",", ".")) * factor
+    size = f"{value:g}{base}" if value < 1e6 else f"{int(value)}{base}"
+    return (int(pack) if pack else 1), size, base
+
+
+def _pack_size(text: str) -> Optional[str]:
+    """
+    Size token of a name: the first weight/volume, times the unit count when there is one.
+
+    ``350ml 6 unidades`` and ``6x350ml`` are both ``6x350ml``; a count alone
+    (``12 unidades``, ``C/30``) is ``12un``/``30un``.
+    """
+    measures, counts = [], []
+    for match in SIZE_RE.finditer(text):
+        pack, size, base = _size(match)
+        if base == "un":
+            counts.append(pack * int(float(match.group(2).replace(",", "."))))
+        else:
+            measures.append((pack, size))
+    counts += [int(match.group(1)) for match in COUNT_RE.finditer(text)]
+    count = next((count for count in counts if count > 1), None)
+
+    if not measures:
+        return f"{counts[0]}un" if counts else None
+    pack, size = measures[0]
+    if pack == 1 and count:
+        pack = count
+    return f"{pack}x{size}" if pack > 1 else size
+
+
+def normalize_name(name: str, market: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Normalized form of a product name.
+
+    Returns:
+        ``{'name', 'brand', 'size', 'key'}``: the remaining words (space
+        separated), brand and size tokens (or ``None``) and the exact-match
+        key used to reuse canonical IDs.
+    """
+    text = strip_accents(name or "").lower()
+
+    size = _pack_size(text)
+    text = COUNT_RE.sub(" ", SIZE_RE.sub(" ", text))
+
+    text = " " + " ".join(re.sub(r"[^\w]+", " ", text).split()) + " "
+    brand = None
+    for known in KNOWN_BRANDS:
+        if f" {known} " in text:
+            brand = known.replace(" ", "")
+            text = text.replace(f" {known} ", " ", 1)
+            break
+
+    words = [word for word in text.split() if word not in STOPWORDS]
+    if brand is None and market:
+        # Store's own label: "Atacadão Leite 1L" is not the same as any other store's 1L milk
+        market_words = set(re.sub(r"[^\w]+", " ", strip_accents(market).lower()).split()) - MARKET_WORDS
+        own = [word for word in words if word in market_words]
+        if own:
+            brand = "".join(own)
+            words = [word for word in words if word not in market_words]
+
+    words = list(dict.fromkeys(words))
+    return {
+        "name": " ".join(words),
+        "brand": brand,
+        "size": size,
+        "key": f"{brand or ''}|{size or ''}|{' '.join(sorted(words))}",
+    }
+
+
+def _phrase(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+
+def fts_query(normalized: Dict[str, Any]) -> Optional[str]:
+    """FTS5 query for the match candidates of a normalized name: any of its words, same brand and size.
+
+    A name that is only brand and size (``Coca Cola 2L``) queries those two.
+    """
+    words = normalized["name"].split()
+    if not words and not (normalized["brand"] and normalized["size"]):
+        return None
+    parts = ["name : (" + " OR ".join(_phrase(word) for word in words) + ")"] if words else []
+    if normalized["brand"]:
+        parts.append("brand : " + _phrase(normalized["brand"]))
+    if normalized["size"]:
+        parts.append("size : " + _phrase(normalized["size"]))
+    return " AND ".join(parts)
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard overlap of the words of two normalized names (two empty names are equal)."""
+    words_a, words_b = set(a.split()), set(b.split())
+    if not words_a and not words_b:
+        return 1.0
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def match_products(db, threshold: float = 0.6, rebuild: bool = False, candidates: int = 50) -> Dict[str, int]:
+    """
+    Group equivalent products of different markets under canonical IDs.
+
+    Args:
+        db: ``DatabaseManager``.
+        threshold: Minimum word overlap (0-1) between two names of the same brand and size.
+        rebuild: Discard every existing canonical ID and match all products again.
+        candidates: Maximum FTS candidates examined per product.
+
+    Returns:
+        ``{'products', 'pending', 'links', 'groups', 'canonical'}``
+    """
+    db.index_products(rebuild=rebuild)
+    keys = db.get_product_keys()
+    pending = [product_id for product_id, key in keys.items() if key["canonical_id"] is None]
+
+    parent: Dict[int, int] = {}
+
+    def find(product_id):
+        root = parent.setdefault(product_id, product_id)
+        while parent[root] != root:
+            root = parent[root]
+        while parent[product_id] != root:
+            parent[product_id], product_id = root, parent[product_id]
+        return root
+
+    queries = {product_id: fts_query(keys[product_id]) for product_id in pending}
+    queries = {product_id: query for product_id, query in queries.items() if query}
+    links = 0
+    for product_id, found in zip(queries, db.search_product_keys(list(queries.values()), candidates)):
+        key = keys[product_id]
+        for candidate_id in found:
+            candidate = keys.get(candidate_id)
+            if (candidate is None or candidate_id == product_id or candidate["market"] == key["market"]
+                    or candidate["brand"] != key["brand"] or candidate["size"] != key["size"]):
+                continue
+            if similarity(key["name"], candidate["name"]) >= threshold and find(product_id) != find(candidate_id):
+                parent[find(product_id)] = find(candidate_id)
+                links += 1
+
+    groups: Dict[int, List[int]] = {}
+    for product_id in set(pending) | set(parent):
+        groups.setdefault(find(product_id), []).append(product_id)
+    created = db.assign_canonical_ids([sorted(members) for members in groups.values()], keys)
+    return {
+        "products": len(keys),
+        "pending": len(pending),
+        "links": links,
+        "groups": sum(1 for members in groups.values() if len(members) > 1),
+        "canonical": created,
+    }
+
+
+def compare_prices(db, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Canonical groups whose names match ``query`` and the latest price of each product in them.
+
+    Returns:
+        ``[{'canonical_id', 'name', 'products': [{'id', 'name', 'market', 'price', 'scraped_at'}]}]``,
+        cheapest product first in each group.
+    """
+    normalized = normalize_name(query)
+    # Free text: every word in any column (the last name word as a prefix, "piracanj" finds the brand)
+    terms = [_phrase(word) for word in normalized["name"].split()]
+    if terms:
+        terms[-1] += "*"
+    terms += [_phrase(normalized[column]) for column in ("brand", "size") if normalized[column]]
+    if not terms:
+        return []
+    search = " AND ".join(terms)
+    rows = db.get_canonical_prices(db.search_product_keys([search], limit * 10)[0], limit)
+
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for canonical_id, canonical_name, product_id, name, market, price, scraped_at in rows:
+        group = groups.setdefault(canonical_id or f"p{product_id}", {
+            "canonical_id": canonical_id, "name": canonical_name or name, "products": [],
+        })
+        group["products"].append({"id": product_id, "name": name, "market": market,
+                                  "price": price, "scraped_at": scraped_at})
+    for group in groups.values():
+        group["products"].sort(key=lambda product: (product["price"] is None, product["price"] or 0))
+    return list(groups.values())[:limit]
@@ -0,0 +1,196 @@
+"""Profiling of a whole scraper run (``scrape --profile``).
+
+Runs the sweep under cProfile, in the main thread and in every thread
+started during the run (browser workers, scheduler), optionally with
+tracemalloc, and writes per-run artifacts:
+
+    <dir>/<timestamp>/profile.prof   merged pstats, for snakeviz/pstats
+    <dir>/<timestamp>/report.txt     time breakdown, top functions, top allocation sites
+
+The breakdown splits profiled time into WebDriver round trips, SQLite,
+HTTP (requests), sleeps, idle threads and what is left: local Python CPU.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+DEFAULT_PROFILE_DIR = "data/profiles"
+
+
+def _is_webdriver_call(key) -> bool:
+    filename, _, funcname = key
+    return funcname == "execute" and filename.replace("\\", "/").endswith("selenium/webdriver/remote/webdriver.py")
+
+
+def _is_http_call(key) -> bool:
+    filename, _, funcname = key
+    return funcname == "request" and filename.replace("\\", "/").endswith("requests/sessions.py")
+
+
+def _is_sqlite_call(key) -> bool:
+    filename, _, funcname = key
+    return filename == "~" and "sqlite3" in funcname
+
+
+def _is_sleep(key) -> bool:
+    return key[0] == "~" and key[2] == "<built-in method time.sleep>"
+
+
+def _is_lock_wait(key) -> bool:
+    return key[0] == "~" and key[2] in (
+        "<method 'acquire' of '_thread.lock' objects>",
+        "<method 'acquire' of '_thread.RLock' objects>",
+    )
+
+
+def time_breakdown(stats: pstats.Stats) -> Dict[str, float]:
+    """Seconds spent per category, summed over all profiled threads.
+
+    WebDriver and HTTP use the cumulative time of their single entry points
+    (``WebDriver.execute``, ``Session.request``); SQLite, sleeps and lock
+    waits (idle workers, queues) are C functions, so their own time is all
+    there is. A lock wait inside a WebDriver/HTTP call is counted twice;
+    ``local_cpu`` is what remains and is clamped at zero.
+    """
+    totals = {"webdriver": 0.0, "http": 0.0, "sqlite": 0.0, "sleep": 0.0, "lock_wait": 0.0}
+    profiled = 0.0
+    for key, (_, _, tottime, cumtime, _) in stats.stats.items():
+        profiled += tottime
+        if _is_webdriver_call(key):
+            totals["webdriver"] += cumtime
+        elif _is_http_call(key):
+            totals["http"] += cumtime
+        elif _is_sqlite_call(key):
+            totals["sqlite"] += tottime
+        elif _is_sleep(key):
+            totals["sleep"] += tottime
+        elif _is_lock_wait(key):
+            totals["lock_wait"] += tottime
+    totals["local_cpu"] = max(0.0, profiled - sum(totals.values()))
+    totals["profiled"] = profiled
+    return totals
+
+
+class ProfileSession:
+    """Context manager that profiles everything run inside it.
+
+    Args:
+        output_dir: Parent directory of the per-run artifact folders.
+        memory: Also trace allocations with tracemalloc (slower).
+        top: Number of functions and allocation sites listed in the report.
+        processes: Scraping processes of the run; only this one is profiled.
+    """
+
+    def __init__(self, output_dir: str = DEFAULT_PROFILE_DIR, memory: bool = False, top: int = 25,
+                 processes: int = 1):
+        self.output_dir = Path(output_dir) / datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.memory = memory
+        self.top = top
+        self.processes = processes
+        self.profile = cProfile.Profile()
+        self.thread_profiles: List[cProfile.Profile] = []
+        self.lock = threading.Lock()
+        self.started = 0.0
+
+    def _profile_new_thread(self, frame, event, arg):
+        # Installed by threading.setprofile: runs once at the start of each new
+        # thread and swaps itself for a cProfile profiler of that thread
+        profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append(profile)
+        sys.setprofile(None)
+        profile.enable()
+
+    def __enter__(self) -> "ProfileSession":
+        if self.memory:
+            tracemalloc.start(10)
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_new_thread)
+        else:
+            # cProfile uses sys.monitoring from 3.12 on: one active profiler only
+            print("⚠️  Python 3.12+: apenas a thread principal será perfilada")
+        if self.processes > 1:
+            # The product pages are loaded in the pool processes, outside this profiler
+            print(f"⚠️  --processes {self.processes}: apenas o processo principal será perfilado "
+                  f"(use --processes 1 para perfilar o scraping)")
+        self.started = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.profile.disable()
+        threading.setprofile(None)
+        wall = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot() if self.memory else None
+        peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+        if self.memory:
+            tracemalloc.stop()
+        self.write_report(wall, snapshot, peak)
+
+    def merged_stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            for profile in self.thread_profiles:
+                try:
+                    stats.add(profile)
+                except TypeError:
+                    # Thread never returned to Python after starting: nothing recorded
+                    continue
+        return stats
+
+    def write_report(self, wall: float, snapshot=None, peak=None) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stats = self.merged_stats()
+        stats.dump_stats(self.output_dir / "profile.prof")
+        breakdown = time_breakdown(stats)
+
+        out = io.StringIO()
+        out.write(f"Tempo total (relógio): {wall:.2f}s\n")
+        out.write(f"Tempo perfilado (soma de {1 + len(self.thread_profiles)} thread(s)): {breakdown['profiled']:.2f}s\n")
+        if self.processes > 1:
+            out.write(f"Apenas o processo principal (de {self.processes} processos de scraping)\n")
+        out.write("\n")
+        out.write("Distribuição do tempo perfilado:\n")
+        labels = [
+            ("webdriver", "WebDriver (ida e volta ao Chrome)"),
+            ("http", "HTTP (requests)"),
+            ("sqlite", "SQLite"),
+            ("sleep", "time.sleep / esperas fixas"),
+            ("lock_wait", "Threads ociosas (locks/filas)"),
+            ("local_cpu", "CPU local (Python)"),
+        ]
+        for key, label in labels:
+            share = breakdown[key] / breakdown["profiled"] * 100 if breakdown["profiled"] else 0
+            out.write(f"  {label:36} {breakdown[key]:9.2f}s  {share:5.1f}%\n")
+
+        out.write(f"\nTop {self.top} funções por tempo próprio:\n")
+        stats.stream = out
+        stats.sort_stats("tottime").print_stats(self.top)
+        out.write(f"\nTop {self.top} funções por tempo acumulado:\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+
+        if snapshot is not None:
+            out.write(f"\nPico de memória rastreada: {peak / 1024 / 1024:.1f} MiB\n")
+            out.write(f"Top {self.top} locais de alocação (memória ainda em uso ao final):\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                out.write(f"  {stat}\n")
+
+        report = out.getvalue()
+        (self.output_dir / "report.txt").write_text(report, encoding="utf-8")
+
+        print("\n" + "=" * 60)
+        print("🔬 PERFIL DA EXECUÇÃO")
+        print("=" * 60)
+        print(report.split("\nTop ")[0].rstrip())
+        if peak is not None:
+            print(f"Pico de memória rastreada: {peak / 1024 / 1024:.1f} MiB")
+        print(f"📁 Artefatos: {self.output_dir}/profile.prof e report.txt")
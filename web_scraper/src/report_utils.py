@@ -1,9 +1,87 @@
 """Console reporting helpers for scraper results and stats."""
 from __future__ import annotations
 
+from collections import Counter
 from typing import Any, Dict, List, Tuple
 
 
+def first_price_text(result: Dict[str, Any] | None) -> str | None:
+    """Text of the first price-like tag of a result, if any."""
+    aside = (result or {}).get("aside_data") or {}
+    p_tags = aside.get("p_tags", [])
+    p = next((p for p in p_tags if p.get("hasPrice")), None) or (p_tags[:1] or [None])[0]
+    if not p:
+        return None
+    return (p.get("textContent") or "").strip().replace("\n", " ")
+
+
+def compact_result(site: Dict[str, Any], result: Dict[str, Any] | None, success: bool, reason: str | None) -> Dict[str, Any]:
+    """Small summary of a scrape result, kept after the heavy fields were persisted and dropped."""
+    if result and result.get("unchanged"):
+        status = "unchanged"
+    else:
+        status = "ok" if success else "failed"
+    regions = (result or {}).get("regions") or []
+    return {
+        "site_name": (result or {}).get("site_name") or site.get("name") or "Desconhecido",
+        "url": site.get("url"),
+        "market": site.get("market") or "Desconhecido",
+        "status": status,
+        "price_text": first_price_text(result) if success else None,
+        "regions": sum(1 for r in regions if any(p.get("hasPrice") for p in r["aside_data"].get("p_tags", []))) if success else 0,
+        "items": sum(1 for i in (result or {}).get("items") or [] if i["price_tag"].get("hasPrice")) if success else 0,
+        "reason": reason,
+    }
+
+
+class RunSummary:
+    """Counters for the final report of a streaming run (no per-result payloads kept)."""
+
+    def __init__(self):
+        self.status = Counter()
+        self.by_market: Dict[str, Counter] = {}
+        self.failed: List[Dict[str, Any]] = []
+
+    @property
+    def processed(self) -> int:
+        return sum(self.status.values())
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        self.status[entry["status"]] += 1
+        self.by_market.setdefault(entry["market"], Counter())[entry["status"]] += 1
+        if entry["status"] == "failed":
+            self.failed.append({"site_name": entry["site_name"], "url": entry["url"], "reason": entry["reason"]})
+
+
+def display_result_line(index: int, entry: Dict[str, Any]) -> None:
+    """Print one compact result as soon as it is processed."""
+    icon = {"ok": "✅", "unchanged": "💤", "failed": "❌"}[entry["status"]]
+    if entry["status"] == "ok" and entry.get("items"):
+        detail = f"Listagem: {entry['items']} produto(s) com preço"
+    elif entry["status"] == "ok":
+        detail = f"Preço: {entry['price_text']}"
+        if entry.get("regions", 0) > 1:
+            detail += f" (+{entry['regions'] - 1} CEP(s))"
+    elif entry["status"] == "unchanged":
+        detail = "Preço inalterado desde a última coleta"
+    else:
+        detail = f"Motivo: {entry['reason'] or 'Preço não identificado'}"
+    print(f"   📌 {index:02d}. {icon} {entry['site_name']} | {detail}")
+
+
+def display_run_summary(summary: RunSummary) -> None:
+    print("\n" + "=" * 80)
+    print("📊 RESUMO DO WEB SCRAPING")
+    print("=" * 80)
+    if not summary.processed:
+        print("❌ Nenhum resultado encontrado.")
+        return
+    print(f"Processados: {summary.processed} | ✅ Com preço: {summary.status['ok']} | "
+          f"💤 Inalterados: {summary.status['unchanged']} | ❌ Falhas: {summary.status['failed']}")
+    for market, counts in sorted(summary.by_market.items()):
+        print(f"   {market}: {counts['ok']} ok, {counts['unchanged']} inalterado(s), {counts['failed']} falha(s)")
+
+
 def display_results(results: List[Dict[str, Any]]) -> None:
     print("\n" + "=" * 80)
     print("📊 RESULTADOS DO WEB SCRAPING - ASIDE EXTRACTION")
@@ -19,6 +97,11 @@ def display_results(results: List[Dict[str, Any]]) -> None:
         name = result.get("site_name") or result.get("name") or "Desconhecido"
         url = result.get("url") or "-"
         aside = result.get("aside_data") or {}
+        if result.get("unchanged"):
+            print(f"{i:02d}. 💤 {name}")
+            print(f"    URL: {url}")
+            print("    Preço inalterado desde a última coleta")
+            continue
         ok = bool(aside and aside.get("aside_found") and any(p.get("hasPrice") for p in aside.get("p_tags", [])))
         status = "✅" if ok else "❌"
         print(f"{i:02d}. {status} {name}")
@@ -67,6 +150,12 @@ def display_database_stats(db) -> None:
 def price_extracted_success(result: Dict[str, Any]) -> tuple[bool, str | None]:
     if not result:
         return False, "Erro durante scraping"
+    if result.get("unchanged"):
+        return True, None
+    if result.get("items") is not None:
+        if not any(item["price_tag"].get("hasPrice") for item in result["items"]):
+            return False, "Nenhum item com preço na listagem"
+        return True, None
     aside_data = result.get("aside_data") or {}
     if not aside_data.get("aside_found"):
         return False, aside_data.get("error") or "Bloco de informações (aside) não encontrado"
@@ -0,0 +1,225 @@
+"""Daily price rollups and retention for ``price_history``.
+
+``price_daily`` keeps open/close/min/max/count per product and day. It is
+updated incrementally: ``rollup_state`` stores the last ``price_history.id``
+already folded in, so each run only reads rows inserted since then (ids are
+AUTOINCREMENT, so rows merged from other nodes also land above the mark).
+Rows rewritten below the mark (snapshot replay) get their days recomputed
+with ``refresh_daily_rollups``.
+
+Retention deletes raw rows older than N days once they are covered by the
+rollup, in small batches so the scraper is never blocked for long.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Set
+
+from database import DatabaseManager, connect
+
+ROLLUP_NAME = "price_daily"
+
+
+def _high_water_mark(cursor) -> int:
+    cursor.execute("SELECT last_price_id FROM rollup_state WHERE name = ?", (ROLLUP_NAME,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _fold_rows(rows) -> Dict[tuple, dict]:
+    """Aggregate ``(id, product_id, day, scraped_at, price)`` rows per product/day."""
+    days: Dict[tuple, dict] = {}
+    for _, product_id, day, scraped_at, price in rows:
+        agg = days.get((product_id, day))
+        if agg is None:
+            days[(product_id, day)] = {
+                "open_price": price, "open_at": scraped_at,
+                "close_price": price, "close_at": scraped_at,
+                "min_price": price, "max_price": price, "samples": 1,
+            }
+            continue
+        if scraped_at < agg["open_at"]:
+            agg["open_price"], agg["open_at"] = price, scraped_at
+        if scraped_at >= agg["close_at"]:
+            agg["close_price"], agg["close_at"] = price, scraped_at
+        agg["min_price"] = min(agg["min_price"], price)
+        agg["max_price"] = max(agg["max_price"], price)
+        agg["samples"] += 1
+    return days
+
+
+def rolled_up_days(cursor, price_ids: Iterable[int]) -> Set[tuple]:
+    """The ``(product_id, day)`` entries of ``price_daily`` that fold in these rows.
+
+    Call before rewriting the rows, then ``refresh_daily_rollups`` with the
+    result. Rows above the high-water mark are left to the next
+    ``update_daily_rollups``; days whose raw rows were partly pruned can no
+    longer be recomputed and keep their aggregate.
+    """
+    last_id = _high_water_mark(cursor)
+    keys = set()
+    for price_id in price_ids:
+        if price_id > last_id:
+            continue
+        cursor.execute("SELECT product_id, date(scraped_at) FROM price_history WHERE id = ?", (price_id,))
+        row = cursor.fetchone()
+        if row:
+            keys.add(tuple(row))
+
+    complete = set()
+    for product_id, day in keys:
+        cursor.execute('''
+            SELECT COUNT(price_numeric) FROM price_history
+            WHERE product_id = ? AND date(scraped_at) = ? AND id <= ?
+        ''', (product_id, day, last_id))
+        raw = cursor.fetchone()[0]
+        cursor.execute("SELECT samples FROM price_daily WHERE product_id = ? AND day = ?", (product_id, day))
+        row = cursor.fetchone()
+        if raw == (row[0] if row else 0):
+            complete.add((product_id, day))
+    return complete
+
+
+def refresh_daily_rollups(cursor, keys: Iterable[tuple]) -> int:
+    """Recompute the ``price_daily`` entries ``keys`` from ``price_history``.
+
+    Runs on the caller's cursor, so the rollup changes in the same
+    transaction as the rewritten rows. Returns the entries recomputed.
+    """
+    last_id = _high_water_mark(cursor)
+    refreshed = 0
+    for product_id, day in keys:
+        cursor.execute('''
+            SELECT id, product_id, date(scraped_at), scraped_at, price_numeric
+            FROM price_history
+            WHERE product_id = ? AND date(scraped_at) = ? AND id <= ? AND price_numeric IS NOT NULL
+        ''', (product_id, day, last_id))
+        agg = _fold_rows(cursor.fetchall()).get((product_id, day))
+        if agg is None:
+            cursor.execute("DELETE FROM price_daily WHERE product_id = ? AND day = ?", (product_id, day))
+        else:
+            cursor.execute('''
+                INSERT OR REPLACE INTO price_daily (
+                    product_id, day, open_price, close_price, min_price, max_price,
+                    samples, open_at, close_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (product_id, day, agg["open_price"], agg["close_price"], agg["min_price"],
+                  agg["max_price"], agg["samples"], agg["open_at"], agg["close_at"]))
+        refreshed += 1
+    return refreshed
+
+
+def update_daily_rollups(db_path: str, batch_size: int = 5000) -> Dict[str, int]:
+    """Fold every ``price_history`` row above the high-water mark into ``price_daily``.
+
+    Each batch is one transaction that upserts the touched days and advances
+    the mark, so an interrupted run resumes where it stopped without counting
+    any row twice. Rows without ``price_numeric`` only advance the mark.
+
+    Returns:
+        ``{'rows': raw rows read, 'days': product/day entries upserted}``.
+    """
+    DatabaseManager(db_path)
+    totals = {"rows": 0, "days": 0}
+
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        last_id = _high_water_mark(cursor)
+        while True:
+            cursor.execute('''
+                SELECT id, product_id, date(scraped_at), scraped_at, price_numeric
+                FROM price_history
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            days = _fold_rows(row for row in rows if row[4] is not None)
+            # Column references in DO UPDATE see the row as it was before the upsert
+            cursor.executemany('''
+                INSERT INTO price_daily (
+                    product_id, day, open_price, close_price, min_price, max_price,
+                    samples, open_at, close_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(product_id, day) DO UPDATE SET
+                    open_price = CASE WHEN excluded.open_at < open_at THEN excluded.open_price ELSE open_price END,
+                    open_at = MIN(open_at, excluded.open_at),
+                    close_price = CASE WHEN excluded.close_at >= close_at THEN excluded.close_price ELSE close_price END,
+                    close_at = MAX(close_at, excluded.close_at),
+                    min_price = MIN(min_price, excluded.min_price),
+                    max_price = MAX(max_price, excluded.max_price),
+                    samples = samples + excluded.samples
+            ''', [
+                (product_id, day, agg["open_price"], agg["close_price"], agg["min_price"],
+                 agg["max_price"], agg["samples"], agg["open_at"], agg["close_at"])
+                for (product_id, day), agg in days.items()
+            ])
+
+            last_id = rows[-1][0]
+            cursor.execute('''
+                INSERT INTO rollup_state (name, last_price_id) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    last_price_id = excluded.last_price_id,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (ROLLUP_NAME, last_id))
+            conn.commit()
+            totals["rows"] += len(rows)
+            totals["days"] += len(days)
+
+    return totals
+
+
+def prune_price_history(db_path: str, keep_days: int, batch_size: int = 5000,
+                        vacuum: bool = False) -> Dict[str, int]:
+    """Delete raw price rows older than ``keep_days`` that are already in ``price_daily``.
+
+    The rollup is brought up to date first, and the newest row of each
+    product is always kept, as is its newest row with a price (when the
+    newest one is "indisponível"), so its current price (and ``raw_data``)
+    stays available even for products no longer scraped.
+
+    Returns:
+        ``{'rows': rows rolled up first, 'days': ..., 'deleted': raw rows removed}``.
+    """
+    if keep_days < 1:
+        raise ValueError("keep_days deve ser pelo menos 1")
+    totals = update_daily_rollups(db_path, batch_size=batch_size)
+    totals["deleted"] = 0
+
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        last_id = _high_water_mark(cursor)
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS keep_latest AS
+            SELECT MAX(id) AS id FROM price_history GROUP BY product_id
+            UNION
+            SELECT MAX(id) FROM price_history WHERE price_numeric IS NOT NULL GROUP BY product_id
+        ''')
+        while True:
+            cursor.execute('''
+                DELETE FROM price_history
+                WHERE id IN (
+                    SELECT id FROM price_history
+                    WHERE scraped_at < datetime('now', ?)
+                      AND id <= ?
+                      AND id NOT IN (SELECT id FROM keep_latest)
+                    LIMIT ?
+                )
+            ''', (f"-{int(keep_days)} days", last_id, batch_size))
+            deleted = cursor.rowcount
+            conn.commit()
+            totals["deleted"] += deleted
+            if deleted < batch_size:
+                break
+        cursor.execute("DROP TABLE keep_latest")
+        # Snapshots only referenced by the deleted rows go with them
+        cursor.execute("DELETE FROM price_snapshots WHERE price_id NOT IN (SELECT id FROM price_history)")
+        cursor.execute("DELETE FROM dom_snapshots WHERE hash NOT IN (SELECT snapshot_hash FROM price_snapshots)")
+        conn.commit()
+
+    if vacuum and totals["deleted"]:
+        with connect(db_path) as conn:
+            conn.execute("VACUUM")
+    return totals
@@ -0,0 +1,287 @@
+"""Per-market scheduling in front of ``scrape_site``.
+
+Each market gets its own token bucket (request rate) and an adaptive
+concurrency limit driven by AIMD (additive increase, multiplicative decrease)
+on observed latency and error rate. Workers pick the next site from whichever
+market currently has room, so a slow or throttling store only slows itself.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from circuit_breaker import ALLOW, HOLD
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``burst`` stored."""
+
+    def __init__(self, rate: float, burst: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError(f"rate deve ser maior que zero (recebido {rate})")
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """Take a token if available.
+
+        Returns:
+            0.0 when a token was taken, otherwise the seconds until one is due.
+        """
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class AIMDController:
+    """Adaptive concurrency limit for one market.
+
+    Every healthy response (fast and without error) grows the limit by
+    ``increase / limit`` (about +1 per round of ``limit`` requests); a slow
+    response, or an error rate above ``max_error_rate``, multiplies it by
+    ``decrease``.
+    """
+
+    def __init__(
+        self,
+        initial: float = 1.0,
+        minimum: float = 1.0,
+        maximum: float = 4.0,
+        latency_target: float = 20.0,
+        max_error_rate: float = 0.2,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        smoothing: float = 0.2,
+    ):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = min(max(initial, minimum), self.maximum)
+        self.latency_target = latency_target
+        self.max_error_rate = max_error_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.smoothing = smoothing
+        self.error_rate = 0.0
+        self.latency = None
+
+    def record(self, latency: float, ok: bool) -> None:
+        a = self.smoothing
+        self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+        self.latency = latency if self.latency is None else (1 - a) * self.latency + a * latency
+
+        if (not ok and self.error_rate > self.max_error_rate) or latency > self.latency_target:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+        elif ok:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+
+    @property
+    def slots(self) -> int:
+        return max(1, int(self.limit))
+
+
+class MarketScheduler:
+    """Dispatch sites to a pool of workers respecting per-market limits.
+
+    Args:
+        rate: Requests per second allowed per market (``None`` = unlimited).
+        burst: Token bucket capacity per market.
+        max_per_market: Upper bound for the adaptive concurrency of a market.
+        latency_target: Latency (s) above which a market's concurrency shrinks.
+        is_success: Decides whether a task result counts as healthy for AIMD.
+        breakers: Optional CircuitBreakerRegistry consulted before dispatching
+            to a market; rejected products are yielded immediately.
+        fatal_errors: Exception types that abort the whole ``map`` (re-raised
+            to the consumer) instead of counting as a failed site.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: float = 1.0,
+        max_per_market: int = 4,
+        latency_target: float = 20.0,
+        is_success: Callable[[Any], bool] = lambda result: result is not None,
+        breakers=None,
+        fatal_errors: Tuple[type, ...] = (),
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_per_market = max_per_market
+        self.latency_target = latency_target
+        self.is_success = is_success
+        self.breakers = breakers
+        self.fatal_errors = fatal_errors
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.controllers: Dict[str, AIMDController] = {}
+
+    @staticmethod
+    def market_of(site: Dict[str, Any]) -> str:
+        return site.get("market") or "Desconhecido"
+
+    def _controller(self, market: str) -> AIMDController:
+        if market not in self.controllers:
+            self.controllers[market] = AIMDController(
+                maximum=self.max_per_market, latency_target=self.latency_target
+            )
+        return self.controllers[market]
+
+    def _bucket(self, market: str) -> Optional[TokenBucket]:
+        if self.rate is None:
+            return None
+        if market not in self.buckets:
+            self.buckets[market] = TokenBucket(self.rate, self.burst)
+        return self.buckets[market]
+
+    def map(
+        self,
+        sites: List[Dict[str, Any]],
+        task: Callable[[Any, Dict[str, Any]], Any],
+        workers: List[Any],
+    ) -> Iterator[Tuple[Dict[str, Any], Any, float]]:
+        """Run ``task(worker, site)`` for every site, yielding results as they finish.
+
+        Yields:
+            ``(site, result, elapsed_seconds)`` in completion order.
+        """
+        pending: Dict[str, deque] = {}
+        for site in sites:
+            pending.setdefault(self.market_of(site), deque()).append(site)
+        markets = deque(pending)
+        inflight = {market: 0 for market in pending}
+        remaining = [len(sites)]
+        cond = threading.Condition()
+        stop = threading.Event()
+        failure: List[BaseException] = []
+        # Bounded so results are handed to the consumer as they finish instead
+        # of piling up in memory when persistence is slower than scraping
+        done: Queue = Queue(maxsize=2 * max(1, len(workers)))
+
+        def put(item: Tuple[Dict[str, Any], Any, float]) -> bool:
+            # Never blocks for good: once the consumer stops reading, the item is dropped
+            while not stop.is_set():
+                try:
+                    done.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def next_site(rejected: List[Tuple[Dict[str, Any], Any, float]]) -> Optional[Tuple[str, Dict[str, Any]]]:
+            # Must be called with cond held (results fast-failed by a breaker go
+            # to ``rejected``, handed over after releasing it). Round-robin
+            # across markets so an idle store is never starved by a busy one.
+            while not stop.is_set():
+                if not markets:
+                    return None
+                wait = None
+                for _ in range(len(markets)):
+                    market = markets[0]
+                    markets.rotate(-1)
+                    if inflight[market] >= self._controller(market).slots:
+                        continue
+                    bucket = self._bucket(market)
+                    delay = bucket.try_acquire() if bucket else 0.0
+                    if delay:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    if self.breakers:
+                        verdict = self.breakers.admit(market)
+                        if verdict == HOLD:
+                            continue
+                        if verdict != ALLOW:
+                            # Fast-fail everything still queued for this market
+                            rejected.extend((site, self.breakers.rejected_result(site, verdict), 0.0)
+                                            for site in pending.pop(market))
+                            markets.remove(market)
+                            break
+                    site = pending[market].popleft()
+                    if not pending[market]:
+                        markets.remove(market)
+                    inflight[market] += 1
+                    return market, site
+                else:
+                    cond.wait(timeout=wait)
+            return None
+
+        def worker_loop(worker: Any) -> None:
+            while True:
+                rejected: List[Tuple[Dict[str, Any], Any, float]] = []
+                with cond:
+                    picked = next_site(rejected)
+                for item in rejected:
+                    if not put(item):
+                        return
+                if picked is None:
+                    return
+                market, site = picked
+                started = time.monotonic()
+                try:
+                    result = task(worker, site)
+                except self.fatal_errors as e:
+                    failure.append(e)
+                    stop.set()
+                    with cond:
+                        cond.notify_all()
+                    return
+                except Exception as e:
+                    print(f"   ❌ Erro inesperado no worker: {e}")
+                    result = None
+                elapsed = time.monotonic() - started
+                with cond:
+                    inflight[market] -= 1
+                    self._controller(market).record(elapsed, self.is_success(result))
+                    if self.breakers:
+                        self.breakers.record(market, result)
+                    cond.notify_all()
+                if not put((site, result, elapsed)):
+                    return
+
+        threads = [threading.Thread(target=worker_loop, args=(w,), daemon=True) for w in workers]
+        for thread in threads:
+            thread.start()
+        try:
+            while remaining[0]:
+                try:
+                    item = done.get(timeout=0.5)
+                except Empty:
+                    if failure:
+                        raise failure[0]
+                    continue
+                remaining[0] -= 1
+                yield item
+        finally:
+            stop.set()
+            with cond:
+                cond.notify_all()
+            # Closed early (Ctrl+C, error downstream): keep the queue from filling while workers finish
+            for thread in threads:
+                while thread.is_alive():
+                    try:
+                        done.get_nowait()
+                    except Empty:
+                        pass
+                    thread.join(timeout=0.05)
+
+    def describe(self) -> List[str]:
+        """Human readable state of each market's limits, for the final report."""
+        lines = []
+        for market, ctl in sorted(self.controllers.items()):
+            latency = f"{ctl.latency:.1f}s" if ctl.latency is not None else "-"
+            lines.append(
+                f"{market}: concorrência {ctl.limit:.1f}, latência média {latency}, "
+                f"taxa de erro {ctl.error_rate:.0%}"
+            )
+        return lines
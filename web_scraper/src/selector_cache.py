@@ -0,0 +1,102 @@
+"""Self-healing cache of price selectors per market and page template.
+
+When ``price_js`` from sites.json stops matching and the aside fallback still
+finds a price, the scraper derives a selector for that element and stores it
+here. Next time, cached selectors are tried first (in one round trip, ranked
+by hit rate), so the slow fallback is only paid when every known selector
+misses.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+# Maximum number of selectors tried per page before falling back to the aside scan
+MAX_CANDIDATES = 5
+
+_VARIABLE_SEGMENT = re.compile(r"[\d-]")
+
+
+def page_template(url: str) -> str:
+    """Reduce a product URL to its page template.
+
+    Path segments that look like slugs or ids (contain digits or hyphens) are
+    replaced by ``*``, so every product page of a store shares one template:
+    ``https://www.atacadao.com.br/leite-longa-vida-88650-39196/p`` becomes
+    ``www.atacadao.com.br/*/p``.
+    """
+    parsed = urlparse(url or "")
+    segments = [
+        "*" if _VARIABLE_SEGMENT.search(segment) else segment
+        for segment in parsed.path.split("/")
+        if segment
+    ]
+    return parsed.netloc + "/" + "/".join(segments)
+
+
+def _score(stats: Dict[str, Any]) -> float:
+    # Laplace-smoothed hit rate: unseen selectors start at 0.5
+    return (stats["hits"] + 1) / (stats["hits"] + stats["misses"] + 2)
+
+
+class SelectorCache:
+    """In-memory view of the ``selector_cache`` table with write-through updates."""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.entries: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+
+    @staticmethod
+    def key_for(site: Dict[str, Any]) -> tuple:
+        return site.get("market") or "Desconhecido", page_template(site.get("url"))
+
+    def _load(self, key: tuple) -> Dict[str, Dict[str, Any]]:
+        if key not in self.entries:
+            self.entries[key] = {row["selector"]: row for row in self.db.get_cached_selectors(*key)}
+        return self.entries[key]
+
+    def candidates(self, site: Dict[str, Any]) -> List[str]:
+        """Selectors to try for ``site``, best first; includes its configured ``price_js``."""
+        configured = site.get("price_js")
+        with self.lock:
+            entries = dict(self._load(self.key_for(site)))
+        if configured and configured not in entries:
+            entries[configured] = {"selector": configured, "hits": 0, "misses": 0}
+        ranked = sorted(entries.values(), key=lambda e: (-_score(e), e["selector"] != configured))
+        return [entry["selector"] for entry in ranked[:MAX_CANDIDATES]]
+
+    def record(
+        self,
+        site: Dict[str, Any],
+        tried: List[str],
+        matched_index: Optional[int],
+        learned: Optional[str] = None,
+    ) -> None:
+        """Update hit/miss counters after an extraction.
+
+        Args:
+            tried: Selectors evaluated, in order.
+            matched_index: Position in ``tried`` of the selector that found the
+                price, or ``None`` if all of them missed.
+            learned: Selector derived from the fallback, stored as a hit.
+        """
+        outcomes = []
+        for index, selector in enumerate(tried):
+            if matched_index is not None and index > matched_index:
+                break
+            outcomes.append((selector, index == matched_index))
+        if learned and (learned, True) not in outcomes:
+            outcomes.append((learned, True))
+        if not outcomes:
+            return
+
+        key = self.key_for(site)
+        with self.lock:
+            entries = self._load(key)
+            for selector, hit in outcomes:
+                entry = entries.setdefault(selector, {"selector": selector, "hits": 0, "misses": 0})
+                entry["hits" if hit else "misses"] += 1
+        self.db.record_selector_outcomes(key[0], key[1], outcomes, learned=learned)
@@ -1,76 +1,330 @@
-import json
+import contextlib
+import copy
 import sys
 import time
 from datetime import datetime
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
-from database import DatabaseManager
-from driver_utils import setup_driver as _setup_driver, close_driver as _close_driver
-from config_loader import load_sites_config as _load_sites_config
+from selenium.common.exceptions import TimeoutException
+
+from database import DatabaseManager, DEFAULT_DB_PATH
+from config_loader import load_sites_config as _load_sites_config, site_ceps
+from db_writer import compact_record, price_entries
+from sharding import shard_sites
+from scheduler import MarketScheduler
+from circuit_breaker import CircuitBreakerRegistry
+from selector_cache import SelectorCache
+from adaptive_timeouts import AdaptiveTimeouts
+from browser_tabs import SharedBrowser
 from page_interactions import (
     handle_zipcode_modal as _handle_zipcode_modal,
     wait_for_complete_loading as _wait_for_complete_loading,
     extract_aside_content_with_monitoring as _extract_aside_content_with_monitoring,
     extract_price_via_js_selector as _extract_price_via_js_selector,
+    extract_price_via_js_selectors as _extract_price_via_js_selectors,
+    derive_price_selector as _derive_price_selector,
+    extract_page_data as _extract_page_data,
+    switch_region as _switch_region,
+    wait_for_price_change as _wait_for_price_change,
+    wait_for_listing_items as _wait_for_listing_items,
+    extract_listing_items as _extract_listing_items,
+    scroll_for_more as _scroll_for_more,
+    go_to_next_page as _go_to_next_page,
 )
 from report_utils import (
     display_results as _display_results,
     display_failed_summary as _display_failed_summary,
     display_database_stats as _display_database_stats,
     price_extracted_success as _price_extracted_success,
+    first_price_text as _first_price_text,
+    compact_result as _compact_result,
+    display_result_line as _display_result_line,
+    display_run_summary as _display_run_summary,
+    RunSummary,
 )
 
 
+class DriverSetupError(Exception):
+    """O Chrome não pôde ser iniciado: a execução inteira é interrompida, não só o site atual."""
+
+
 class SeleniumWebScraper:
-    def __init__(self, config_file='data/sites.json', headless=True):
-        """Inicializa o scraper com Selenium para sites com JavaScript."""
+    def __init__(self, config_file='data/sites.json', headless=True, shard=None, shard_key='market',
+                 workers=1, market_rate=None, market_burst=1.0, latency_target=20.0,
+                 breaker_threshold=3, breaker_cooldown=900, db_path=DEFAULT_DB_PATH, db=None,
+                 processes=1, writer_batch=100, writer_queue=256, snapshots=False,
+                 driver_factory=None, page_settle=2.0, adaptive_timeouts=True, timeout_margin=1.5,
+                 skip_fresh=None, tabs=1):
+        """
+        Inicializa o scraper com Selenium para sites com JavaScript.
+        
+        Args:
+            shard (tuple): (i, N) para processar apenas a fatia i de N do catálogo
+            shard_key (str): 'market' mantém cada loja no mesmo nó; 'url' distribui por produto
+            workers (int): Quantidade de navegadores em paralelo
+            market_rate (float): Requisições por segundo permitidas por mercado (None = sem limite)
+            market_burst (float): Rajada máxima de requisições por mercado
+            latency_target (float): Latência (s) acima da qual a concorrência do mercado é reduzida
+            breaker_threshold (int): Falhas consecutivas que abrem o circuito de um mercado
+            breaker_cooldown (float): Segundos até uma nova tentativa em um mercado com circuito aberto
+            db: DatabaseManager (ou compatível) já criado; por padrão abre db_path
+            processes (int): Processos de scraping; acima de 1, um único processo grava no SQLite
+            writer_batch (int): Registros por transação no processo gravador
+            writer_queue (int): Registros pendentes antes de os workers aguardarem o gravador
+            snapshots (bool): Guarda o HTML comprimido de cada página para replay (ou "snapshot": true no site)
+            driver_factory: Função (headless) -> driver; padrão driver_utils.setup_driver (Chrome).
+                Ver simulation.SyntheticDriverFactory para testes de carga sem navegador
+            page_settle (float): Pausa fixa (s) após o carregamento, para conteúdo renderizado tarde
+            adaptive_timeouts (bool): Timeouts de carregamento/CEP/aside pelo p95 das durações
+                registradas de cada site e mercado (ver adaptive_timeouts); False usa os valores fixos
+            timeout_margin (float): Multiplicador aplicado ao p95
+            skip_fresh (float): Pula os sites cujo último preço tem menos de tantas horas
+                (consultado no índice em memória, ver price_index)
+            tabs (int): Abas por navegador; acima de 1, cada worker divide um Chrome com tabs - 1
+                workers extras, e as páginas carregam em paralelo (ver browser_tabs)
+        """
         self.config_file = config_file
         self.headless = headless
+        self.shard = shard
+        self.shard_key = shard_key
+        self.workers = max(1, workers)
+        self.processes = max(1, processes)
+        self.writer_batch = writer_batch
+        self.writer_queue = writer_queue
+        self.db_path = db_path
+        self.snapshots = snapshots
+        self.driver_factory = driver_factory
+        self.page_settle = page_settle
+        self.adaptive_timeouts = adaptive_timeouts
+        self.timeout_margin = timeout_margin
+        self.skip_fresh = skip_fresh
+        self.tabs = max(1, tabs)
+        self.page_load_timeout = None  # Último valor enviado ao driver deste worker
         self.sites = []
         self.driver = None
-        self.db = DatabaseManager()
+        self.session_markets = set()  # Mercados já abertos pelo driver atual (ver first_in_session)
+        self.browser = SharedBrowser(self.create_driver, self.quit_driver) if self.tabs > 1 else None
+        self.tab_pool = []
+        self.http_fetcher = None
+        self.vtex_catalog = None
+        self.worker_pool = []
+        self.process_pool = None
+        self.db_writer = None
+        self.db = db or DatabaseManager(db_path)
+        self.selector_cache = SelectorCache(self.db)
+        self.timeouts = AdaptiveTimeouts(self.db, margin=timeout_margin, enabled=adaptive_timeouts)
+        self.breakers = CircuitBreakerRegistry(
+            self.db,
+            threshold=breaker_threshold,
+            cooldown=breaker_cooldown,
+            is_success=lambda result: self.price_extracted_success(result)[0],
+        )
+        self.scheduler = MarketScheduler(
+            rate=market_rate,
+            burst=market_burst,
+            max_per_market=max(self.workers * self.tabs, self.processes),
+            latency_target=latency_target,
+            breakers=self.breakers,
+            fatal_errors=(DriverSetupError,),
+        )
         
-        # Configurar e inicializar o driver
-        self.setup_driver()
+        # O driver do Chrome é criado sob demanda (ensure_driver), só se algum site precisar do navegador
         
         # Carregar configuração
         self.load_config()
     
-    def setup_driver(self):
-        """Configura o driver do Chrome com otimizações."""
+    def create_driver(self):
+        """Novo driver do Chrome com otimizações (ou o do driver_factory)."""
         try:
-            self.driver = _setup_driver(self.headless)
+            if self.driver_factory:
+                return self.driver_factory(self.headless)
+            # Importado sob demanda: webdriver_manager e o Chrome só são carregados quando necessários
+            from driver_utils import setup_driver as _setup_driver
+            # Abas: com a estratégia 'normal' o ChromeDriver espera as navegações pendentes
+            # de qualquer aba antes de cada comando, e as abas carregariam uma de cada vez
+            driver = _setup_driver(self.headless, page_load_strategy='none' if self.browser else 'normal')
             print("✅ Driver Chrome configurado com sucesso!")
+            return driver
             
         except Exception as e:
             print(f"❌ Erro ao configurar driver Chrome: {e}")
-            sys.exit(1)
+            raise DriverSetupError(f"Erro ao configurar driver Chrome: {e}") from e
+    
+    def quit_driver(self, driver):
+        """Fecha um driver criado por create_driver."""
+        if self.driver_factory:
+            driver.quit()
+        else:
+            from driver_utils import close_driver as _close_driver
+            _close_driver(driver)
+    
+    def setup_driver(self):
+        """Configura o driver deste worker: um Chrome próprio ou, com tabs > 1, uma aba do navegador compartilhado."""
+        self.page_load_timeout = None
+        self.session_markets = set()
+        self.driver = self.browser.open_tab() if self.browser else self.create_driver()
+    
+    def ensure_driver(self):
+        """Cria o driver do Chrome na primeira vez que um site precisa do navegador."""
+        if self.driver is None:
+            self.setup_driver()
+        return self.driver
+    
+    def first_in_session(self, site_config):
+        """
+        Se é a primeira página do mercado com o driver atual: o modal de CEP costuma aparecer
+        só nela (depois o CEP fica num cookie), então a espera por ele não é reduzida.
+        """
+        self.ensure_driver()
+        market = site_config.get('market') or 'Desconhecido'
+        if market in self.session_markets:
+            return False
+        self.session_markets.add(market)
+        return True
+    
+    def page_focus(self):
+        """
+        Com abas, mantém o navegador compartilhado na aba deste worker durante as esperas e a
+        extração de uma página (as demais abas continuam carregando); sem abas, não faz nada.
+        """
+        return self.driver.focus() if self.browser else contextlib.nullcontext()
+    
+    def get_http_fetcher(self):
+        """Cliente HTTP (com pool de conexões) para sites com "fetch": "http"."""
+        if self.http_fetcher is None:
+            from http_fetcher import HttpFetcher
+            self.http_fetcher = HttpFetcher(self.db)
+        return self.http_fetcher
+    
+    def get_vtex_catalog(self):
+        """Cliente da API de catálogo VTEX para sites com "fetch": "vtex" (compartilhado entre workers)."""
+        if self.vtex_catalog is None:
+            from vtex_catalog import VtexCatalog
+            self.vtex_catalog = VtexCatalog(self.db)
+        return self.vtex_catalog
+    
+    def spawn_worker(self):
+        """
+        Cria um worker que compartilha configuração, banco e catálogo VTEX,
+        mas com driver e cliente HTTP próprios.
+        """
+        worker = self._copy_worker()
+        if self.browser:
+            worker.browser = SharedBrowser(worker.create_driver, worker.quit_driver)
+        return worker
+    
+    def tab_workers(self, count):
+        """Este worker e até count - 1 cópias dele que usam outras abas do mesmo navegador."""
+        while len(self.tab_pool) < count - 1:
+            self.tab_pool.append(self._copy_worker())
+        return [self] + self.tab_pool[:count - 1]
+    
+    def _copy_worker(self):
+        worker = copy.copy(self)
+        worker.driver = None
+        worker.page_load_timeout = None
+        worker.session_markets = set()
+        worker.http_fetcher = None
+        worker.worker_pool = []
+        worker.tab_pool = []
+        worker.process_pool = None
+        worker.db_writer = None
+        return worker
+    
+    def start_process_pool(self, size):
+        """
+        Inicia o processo gravador do SQLite e o pool de processos de scraping.
+        Enquanto o pool existir, também as escritas do circuit breaker e do catálogo VTEX
+        (consultado neste processo) vão pela fila do gravador.
+        """
+        from db_writer import DatabaseWriter, QueuedDatabase
+        from process_pool import ScrapeProcessPool
+        
+        self.db_writer = DatabaseWriter(self.db_path, max_pending=self.writer_queue,
+                                        batch_size=self.writer_batch).start()
+        self.process_pool = ScrapeProcessPool(
+            size, self.db_writer, self.db_path,
+            scraper_kwargs={'config_file': self.config_file, 'headless': self.headless,
+                            'snapshots': self.snapshots, 'driver_factory': self.driver_factory,
+                            'page_settle': self.page_settle, 'adaptive_timeouts': self.adaptive_timeouts,
+                            'timeout_margin': self.timeout_margin},
+        )
+        self.breakers.db = QueuedDatabase(self.db_path, self.db_writer.queue)
+        if self.vtex_catalog:
+            self.vtex_catalog.db = self.breakers.db
+        print(f"⚙️  {size} processo(s) de scraping com um único processo gravador do SQLite")
+        return self.process_pool
+    
+    def stop_process_pool(self):
+        """Encerra o pool e aguarda o gravador confirmar todos os registros pendentes."""
+        if self.process_pool:
+            self.process_pool.close()
+            self.process_pool = None
+        if self.db_writer:
+            self.db_writer.close()
+            self.db_writer = None
+            self.breakers.db = self.db
+            if self.vtex_catalog:
+                self.vtex_catalog.db = self.db
     
     def load_config(self):
         """Carrega a configuração dos sites do arquivo JSON."""
         self.sites = _load_sites_config(self.config_file)
         print(f"✅ Configuração carregada: {len(self.sites)} sites encontrados")
     
-    def handle_zipcode_modal(self, zipcode=None):
+    def handle_zipcode_modal(self, zipcode=None, timeout=10):
         """
         Detecta e preenche o modal de CEP se aparecer.
         
         Args:
             zipcode (str): CEP a ser inserido
+            timeout (float): Espera máxima pelo modal
+        
+        Returns:
+            float: Segundos até o modal aparecer (None se não apareceu)
         """
-        return _handle_zipcode_modal(self.driver, zipcode=zipcode) or False
+        return _handle_zipcode_modal(self.driver, zipcode=zipcode, timeout=timeout)
     
-    def wait_for_complete_loading(self, timeout=30, zipcode=None):
+    def wait_for_complete_loading(self, timeout=30, zipcode=None, limits=None, timings=None, settle=None):
         """
         Aguarda o carregamento completo da página, incluindo JavaScript.
         
         Args:
             timeout (int): Tempo máximo de espera em segundos
+            limits (dict): Timeouts por fase (AdaptiveTimeouts.limits); substituem timeout e os 10s de CEP/aside
+            timings (dict): Recebe as durações medidas de cada fase
+            settle (float): Pausa final; por padrão page_settle
+        
+        Returns:
+            dict: Durações medidas ('ready', 'zipcode', 'aside')
+        """
+        limits = limits or {}
+        return _wait_for_complete_loading(
+            self.driver, timeout=limits.get('ready', timeout), zipcode=zipcode,
+            settle=self.page_settle if settle is None else settle,
+            zipcode_timeout=limits.get('zipcode', 10), aside_timeout=limits.get('aside', 10), timings=timings,
+        )
+    
+    def load_page(self, url, limits, timings):
+        """
+        driver.get com o timeout de carregamento aprendido para o site; a duração vai para timings['load'].
+        Num timeout, registra o próprio limite (a amostra é censurada) e repassa a exceção.
         """
-        _wait_for_complete_loading(self.driver, timeout=timeout, zipcode=zipcode)
+        self.ensure_driver()
+        try:
+            if self.browser:
+                # Aba: a navegação segue em segundo plano enquanto outras abas usam o navegador
+                timings['load'] = self.driver.load(url, timeout=limits['load'])
+                return
+            if limits['load'] != self.page_load_timeout:
+                self.driver.set_page_load_timeout(limits['load'])
+                self.page_load_timeout = limits['load']
+            started = time.monotonic()
+            self.driver.get(url)
+        except TimeoutException:
+            timings['load'] = limits['load']
+            print(f"   ⏱️  Página não carregou em {limits['load']:g}s")
+            raise
+        timings['load'] = time.monotonic() - started
     
     def extract_aside_content_with_monitoring(self):
         """
@@ -90,6 +344,89 @@ class SeleniumWebScraper:
         """
         return _extract_price_via_js_selector(self.driver, price_js_expr)
 
+    def extract_price_via_js_selectors(self, price_js_exprs):
+        """
+        Tenta várias expressões JavaScript de preço em uma única chamada ao navegador.
+        O campo 'matched_index' indica qual expressão encontrou o preço.
+        """
+        return _extract_price_via_js_selectors(self.driver, price_js_exprs)
+
+    def extract_page(self, site_config):
+        """
+        Lê título, preço e detalhes do produto com uma única chamada ao navegador
+        (ver page_interactions.extract_page_data). O preço vem dos seletores conhecidos
+        (cache + price_js do JSON) e, se nenhum funcionar, do fallback do aside. Quando o
+        fallback encontra o preço, um seletor para ele é aprendido e guardado no cache.
+        
+        Returns:
+            dict: {'title', 'aside_data', 'product'} (disponibilidade, preço de lista/oferta, preço unitário)
+        """
+        candidates = self.selector_cache.candidates(site_config)
+        page = _extract_page_data(self.driver, candidates)
+        selector_data, fallback = page['selector_data'], page['aside_data']
+        extracted = {'title': page['title'], 'product': page['product']}
+        if candidates:
+            if selector_data.get('aside_found') and selector_data['p_tags'][0].get('hasPrice'):
+                self.selector_cache.record(site_config, candidates, selector_data.get('matched_index'))
+                return {**extracted, 'aside_data': selector_data}
+            print("   ⚠️  Nenhum seletor conhecido retornou o preço. Usando fallback do aside...")
+            if not fallback.get('aside_found') and selector_data.get('aside_found'):
+                # Mantém o elemento encontrado via JS, mesmo sem preço, como antes
+                self.selector_cache.record(site_config, candidates, None)
+                return {**extracted, 'aside_data': selector_data}
+
+        learned = None
+        if any(p.get('hasPrice') for p in fallback.get('p_tags', [])):
+            learned = _derive_price_selector(self.driver)
+            if learned:
+                print(f"   🧠 Seletor de preço aprendido: {learned}")
+        self.selector_cache.record(site_config, candidates, None, learned=learned)
+        return {**extracted, 'aside_data': fallback}
+
+    def extract_price(self, site_config):
+        """Só o aside_data de extract_page."""
+        return self.extract_page(site_config)['aside_data']
+
+    def scrape_regions(self, site_config, ceps, first_aside):
+        """
+        Modo matriz de CEPs: com a página já carregada no primeiro CEP, troca a região
+        (API da loja, cookie ou modal; ver page_interactions.switch_region) e relê o preço
+        para cada CEP seguinte, sem navegar de novo.
+        
+        Returns:
+            list: [{'cep': ..., 'aside_data': ...}] na ordem de ceps
+        """
+        regions = [{'cep': ceps[0], 'aside_data': first_aside}]
+        candidates = self.selector_cache.candidates(site_config)
+        previous = _first_price_text({'aside_data': first_aside})
+        settle = site_config.get('region_settle', 5)
+        for cep in ceps[1:]:
+            if not _switch_region(self.driver, site_config, cep):
+                continue
+            _wait_for_price_change(self.driver, candidates, previous, timeout=settle)
+            page = _extract_page_data(self.driver, candidates)
+            aside_data = page['selector_data']
+            if not any(p.get('hasPrice') for p in aside_data.get('p_tags', [])):
+                aside_data = page['aside_data']
+            regions.append({'cep': cep, 'aside_data': aside_data})
+            price_text = _first_price_text({'aside_data': aside_data})
+            print(f"   🗺️  CEP {cep}: {price_text or 'preço não encontrado'}")
+            previous = price_text or previous
+        print(f"   🗺️  {len(regions)} de {len(ceps)} CEP(s) lidos com um único carregamento da página")
+        return regions
+
+    def take_snapshot(self, site_config, html=None):
+        """
+        HTML comprimido da página para replay offline, se snapshots estiverem ativos para o site.
+        Sem html, serializa o DOM renderizado do navegador (ou só "snapshot_region").
+        """
+        if not (self.snapshots or site_config.get('snapshot')):
+            return None
+        from snapshots import capture_snapshot, compress_snapshot
+        if html is None:
+            html = capture_snapshot(self.driver, site_config.get('snapshot_region'))
+        return compress_snapshot(html) if html else None
+    
     def scrape_site(self, site_config):
         """
         Realiza scraping aguardando JavaScript carregar e extraindo dados do aside.
@@ -110,64 +447,182 @@ class SeleniumWebScraper:
         print(f"\n🔍 Fazendo scraping de: {name}")
         print(f"   URL: {url}")
         
+        if site_config.get('mode') == 'listing':
+            return self.scrape_listing(site_config)
+        if site_config.get('fetch') == 'http':
+            return self.scrape_site_http(site_config)
+        if site_config.get('fetch') == 'vtex':
+            return self.scrape_site_vtex(site_config)
+        
+        limits = self.timeouts.limits(site_config, first_in_session=self.first_in_session(site_config))
+        timings = {}
         try:
-            # Carregar a página
-            self.driver.get(url)
+            # Carregar a página (timeouts aprendidos com as execuções anteriores deste site/mercado)
+            self.load_page(url, limits, timings)
             
-            # Aguardar carregamento completo (incluindo JavaScript), com CEP do JSON
-            zipcode = site_config.get('cep') or site_config.get('zipcode')
-            self.wait_for_complete_loading(zipcode=zipcode)
+            # Aguardar carregamento completo (incluindo JavaScript), com o (primeiro) CEP do JSON
+            ceps = site_ceps(site_config)
+            with self.page_focus():
+                self.wait_for_complete_loading(zipcode=ceps[0], limits=limits, timings=timings,
+                                               settle=0 if self.browser else None)
+            if self.browser and self.page_settle > 0:
+                # A pausa para conteúdo tardio não prende o navegador: outras abas extraem enquanto isso
+                print(f"   ⏳ Aguardando conteúdo dinâmico ({self.page_settle:g}s)...")
+                time.sleep(self.page_settle)
             
-            # Debug: Capturar screenshot e verificar conteúdo da página
-            try:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                self.driver.save_screenshot(f"debug_screenshot_{timestamp}.png")
-                print(f"   ✅ Screenshot salvo: debug_screenshot_{timestamp}.png")
-            except Exception as e:
-                print(f"   ⚠️  Erro ao salvar screenshot: {e}")
+            with self.page_focus():
+                # Debug: Capturar screenshot e verificar conteúdo da página
+                try:
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    self.driver.save_screenshot(f"debug_screenshot_{timestamp}.png")
+                    print(f"   ✅ Screenshot salvo: debug_screenshot_{timestamp}.png")
+                except Exception as e:
+                    print(f"   ⚠️  Erro ao salvar screenshot: {e}")
             
-            # Debug: Verificar se há JavaScript ativo
-            js_check = self.driver.execute_script("return typeof jQuery !== 'undefined' || typeof $ !== 'undefined' || document.readyState;")
-            if not js_check:
-                print("   ⚠️  JavaScript não está ativo ou carregado corretamente.")
-                raise Exception("JavaScript não carregado")
-
-            # Extrair preço via seletor definido no JSON, com fallback para lógica antiga
-            price_js_expr = site_config.get('price_js')
-            if price_js_expr:
-                aside_data = self.extract_price_via_js_selector(price_js_expr)
-                # Se falhar, tenta fallback
-                if not aside_data.get('aside_found'):
-                    print("   ⚠️  price_js não retornou elemento. Tentando fallback do aside...")
-                    aside_data = self.extract_aside_content_with_monitoring()
-            else:
-                aside_data = self.extract_aside_content_with_monitoring()
+                # Título, preço e detalhes do produto em uma única chamada (extrator pré-instalado via CDP)
+                page = self.extract_page(site_config)
+                aside_data = page['aside_data']
             
-            # Extrair título da página
-            title = ""
-            try:
-                title_element = self.driver.find_element(By.TAG_NAME, "title")
-                title = title_element.get_attribute("text") or ""
-            except:
-                try:
-                    h1_element = self.driver.find_element(By.TAG_NAME, "h1")
-                    title = h1_element.text
-                except:
-                    title = "Título não encontrado"
+                extracted_data = {
+                    'site_name': name,
+                    'url': url,
+                    'title': page['title'],
+                    'scraped_at': datetime.now().isoformat(),
+                    'aside_data': aside_data,
+                    'product': page['product'],
+                }
+                if len(ceps) > 1:
+                    extracted_data['regions'] = self.scrape_regions(site_config, ceps, aside_data)
+                else:
+                    # Na matriz de CEPs o DOM muda a cada região: sem snapshot
+                    extracted_data['snapshot'] = self.take_snapshot(site_config)
+            
+            print(f"   ✅ Scraping concluído!")
+            return extracted_data
             
-            extracted_data = {
+        except DriverSetupError:
+            raise
+        except Exception as e:
+            print(f"   ❌ Erro durante scraping: {e}")
+            return None
+        finally:
+            self.timeouts.record(site_config, timings)
+    
+    def scrape_listing(self, site_config):
+        """
+        Modo listagem ("mode": "listing"): lê todos os produtos de uma página de categoria
+        ou busca com um único execute_script por página, seguindo a paginação ("next")
+        ou a rolagem infinita ("scroll": true) até "max_pages".
+        
+        Returns:
+            dict: Resultado com 'items' = [{'name', 'url', 'price_tag'}], deduplicados por URL
+        """
+        name = site_config.get('name', 'Site Desconhecido')
+        url = site_config.get('url')
+        listing = site_config.get('listing') or {}
+        if not listing.get('item') or not listing.get('price'):
+            print(f"   ❌ Listagem '{name}' sem os seletores 'item' e 'price'")
+            return None
+        max_pages = listing.get('max_pages', 5)
+        
+        limits = self.timeouts.limits(site_config, first_in_session=self.first_in_session(site_config))
+        timings = {}
+        try:
+            self.load_page(url, limits, timings)
+            with self.page_focus():
+                _wait_for_listing_items(self.driver, 'body')  # modal de CEP só aparece com o body pronto
+                zipcode = site_ceps(site_config)[0]
+                if zipcode:
+                    timings['zipcode'] = self.handle_zipcode_modal(zipcode=zipcode, timeout=limits['zipcode'])
+                if not _wait_for_listing_items(self.driver, listing['item']):
+                    print("   ⚠️  Nenhum item da listagem encontrado.")
+            
+                items = {}
+                pages = 1
+                while True:
+                    found = _extract_listing_items(self.driver, listing)
+                    new = 0
+                    for item in found:
+                        if item['url'] not in items:
+                            items[item['url']] = item
+                            new += 1
+                    print(f"   📄 Página {pages}: {len(found)} item(ns), {new} novo(s)")
+                    if pages >= max_pages or (pages > 1 and not new):
+                        break
+                    if listing.get('scroll'):
+                        advanced = _scroll_for_more(self.driver, listing['item'])
+                    elif listing.get('next'):
+                        advanced = _go_to_next_page(self.driver, listing)
+                    else:
+                        advanced = False
+                    if not advanced:
+                        break
+                    pages += 1
+            
+            
+            priced = sum(1 for item in items.values() if item['price_tag']['hasPrice'])
+            print(f"   ✅ Listagem concluída: {priced} preço(s) em {pages} página(s)")
+            return {
                 'site_name': name,
                 'url': url,
-                'title': title.strip(),
+                'title': name,
                 'scraped_at': datetime.now().isoformat(),
-                'aside_data': aside_data
+                'pages': pages,
+                'items': list(items.values()),
             }
+        
+        except DriverSetupError:
+            raise
+        except Exception as e:
+            print(f"   ❌ Erro durante scraping da listagem: {e}")
+            return None
+        finally:
+            self.timeouts.record(site_config, timings)
+    
+    def scrape_site_http(self, site_config):
+        """
+        Scraping sem navegador, para sites com "fetch": "http" no JSON.
+        Usa requisições condicionais (ETag/Last-Modified) e hash do conteúdo: se a página
+        não mudou desde a última coleta bem-sucedida, retorna 'unchanged' sem fazer parsing.
+        """
+        name = site_config.get('name', 'Site Desconhecido')
+        url = site_config.get('url')
+        try:
+            fetched = self.get_http_fetcher().fetch(url)
+            base = {
+                'site_name': name,
+                'url': url,
+                'scraped_at': datetime.now().isoformat(),
+                'fetch': {k: v for k, v in fetched.items() if k != 'html'},
+            }
+            if fetched['state'] == 'unchanged':
+                print(f"   💤 Página inalterada (HTTP {fetched['status_code']}); preço mantido")
+                return {**base, 'title': '', 'unchanged': True, 'aside_data': {}}
             
-            print(f"   ✅ Scraping concluído!")
-            return extracted_data
-            
+            from html_extraction import extract_price_from_html
+            extracted = extract_price_from_html(fetched['html'], site_config)
+            print(f"   ✅ Scraping HTTP concluído!")
+            return {**base, 'title': extracted['title'], 'aside_data': extracted['aside_data'],
+                    'snapshot': self.take_snapshot(site_config, fetched['html'])}
+        
         except Exception as e:
-            print(f"   ❌ Erro durante scraping: {e}")
+            print(f"   ❌ Erro durante scraping HTTP: {e}")
+            return None
+    
+    def scrape_site_vtex(self, site_config):
+        """
+        Scraping sem navegador para lojas VTEX ("fetch": "vtex"): o preço vem da API
+        pública de catálogo, buscada em lote para os produtos da mesma loja.
+        """
+        try:
+            result = self.get_vtex_catalog().lookup(site_config)
+            if result['aside_data'].get('aside_found'):
+                print(f"   ✅ Preço obtido via API VTEX!")
+            else:
+                print(f"   ⚠️  {result['aside_data'].get('error')}")
+            return result
+        except Exception as e:
+            print(f"   ❌ Erro na API VTEX: {e}")
             return None
     
     def save_to_database(self, site_config, result):
@@ -179,6 +634,20 @@ class SeleniumWebScraper:
             result (dict): Dados extraídos do scraping
         """
         try:
+            fetched = result.get('fetch')
+            if result.get('unchanged'):
+                # Nada a inserir: só registra que a página foi verificada
+                self.db.save_fetch_metadata(site_config.get('url'), changed=False,
+                                            status_code=fetched['status_code'], **fetched['metadata'])
+                return
+            
+            if result.get('items') is not None:
+                # Listagem: todos os produtos e preços em uma única transação
+                saved = len(self.db.save_price_entries(price_entries(site_config, result),
+                                                       site_config.get('market') or 'Desconhecido'))
+                print(f"   💾 {saved} preço(s) da listagem salvos no banco")
+                return
+            
             # Salvar produto (usar market do JSON como site_name)
             product_id = self.db.save_product(
                 name=result.get('site_name', site_config.get('name', 'Produto')),
@@ -186,12 +655,23 @@ class SeleniumWebScraper:
                 site_name=site_config.get('market') or 'Desconhecido'
             )
             
-            # Salvar preço
+            # Salvar preço (no modo matriz, um registro por CEP com preço)
             if product_id:
-                cep_value = site_config.get('cep') or site_config.get('zipcode')
-                price_id = self.db.save_price(product_id, result, cep=cep_value or None)
-                if price_id:
-                    print(f"   💾 Dados salvos no banco - Produto ID: {product_id}, Preço ID: {price_id}")
+                price_ids = []
+                _, _, prices = price_entries(site_config, result)[0]
+                for cep_value, price_data in prices:
+                    price_id = self.db.save_price(product_id, price_data, cep=cep_value or None)
+                    if price_id:
+                        price_ids.append(price_id)
+                if price_ids:
+                    print(f"   💾 Dados salvos no banco - Produto ID: {product_id}, "
+                          f"Preço ID: {', '.join(str(i) for i in price_ids)}")
+                    if result.get('snapshot'):
+                        self.db.save_snapshot(result['snapshot'], price_ids, site_config.get('url'))
+                    if fetched:
+                        # Validadores HTTP só são guardados depois de um preço salvo com sucesso
+                        self.db.save_fetch_metadata(site_config.get('url'), changed=True,
+                                                    status_code=fetched['status_code'], **fetched['metadata'])
                 else:
                     print(f"   ⚠️  Produto salvo mas falha ao salvar preço")
             else:
@@ -219,8 +699,45 @@ class SeleniumWebScraper:
         """Exibe um resumo dos produtos cujo preço não pôde ser extraído."""
         _display_failed_summary(failed_items)
 
-    def run(self):
-        """Executa o processo completo de scraping com Selenium."""
+    def _validate_stage(self, scraped):
+        """Etapa de validação: anota cada resultado com (sucesso, motivo da falha)."""
+        for site, result, elapsed in scraped:
+            success, reason = self.price_extracted_success(result)
+            yield site, result, elapsed, success, reason
+
+    def _persist_stage(self, validated, run_id, persist=True):
+        """
+        Etapa de persistência: salva os preços identificados, registra o site no journal
+        e devolve só um resumo compacto (aside_data/innerHTML são descartados aqui).
+        Com persist=False (modo multiprocesso) os workers já enviaram tudo ao processo gravador;
+        só os resultados produzidos neste processo (lojas VTEX e produtos recusados pelo
+        circuit breaker) são enviados daqui.
+        """
+        for site, result, elapsed, success, reason in validated:
+            if persist:
+                if success:
+                    # Salvar no banco de dados apenas quando o preço foi identificado
+                    self.save_to_database(site, result)
+                self.db.record_run_item(run_id, site, success, reason, duration_seconds=elapsed)
+            elif site.get('fetch') == 'vtex' or (result and result.get('circuit_open')):
+                self.db_writer.submit(compact_record(site, result, success, reason, run_id=run_id,
+                                                     duration_seconds=elapsed))
+            yield _compact_result(site, result, success, reason)
+
+    def _report_stage(self, persisted, summary):
+        """Etapa final: exibe cada resultado ao chegar e acumula os contadores do resumo."""
+        for entry in persisted:
+            summary.record(entry)
+            _display_result_line(summary.processed, entry)
+        return summary
+
+    def run(self, resume=False):
+        """
+        Executa o processo completo de scraping com Selenium.
+        
+        Args:
+            resume (bool): Continua a última execução interrompida, pulando os sites já concluídos
+        """
         print("🚀 Iniciando Web Scraper")
         print("-" * 50)
             
@@ -230,56 +747,177 @@ class SeleniumWebScraper:
         if not enabled_sites:
             print("⚠️  Nenhum site habilitado encontrado.")
             return
+        
+        # Restringir à fatia deste nó quando rodando em shards
+        if self.shard:
+            index, total = self.shard
+            enabled_sites = shard_sites(enabled_sites, index, total, key=self.shard_key)
+            print(f"🧩 Shard {index}/{total} (chave: {self.shard_key}): {len(enabled_sites)} site(s) atribuído(s)")
+            if not enabled_sites:
+                print("⚠️  Nenhum site atribuído a este shard.")
+                return
+        
+        # Sites com preço recente: consulta em memória, sem uma query por URL
+        if self.skip_fresh:
+            started = time.perf_counter()
+            index = self.db.latest_prices()
+            max_age = self.skip_fresh * 3600
+            fresh = [site for site in enabled_sites if index.is_fresh(site.get('url'), max_age)]
+            if fresh:
+                fresh_urls = {site.get('url') for site in fresh}
+                enabled_sites = [site for site in enabled_sites if site.get('url') not in fresh_urls]
+            print(f"🗂️  Índice de preços: {len(index)} produto(s) em {index.memory_bytes() / 1024 / 1024:.1f} MiB "
+                  f"({time.perf_counter() - started:.2f}s); {len(fresh)} site(s) com preço de menos de "
+                  f"{self.skip_fresh:g}h pulado(s)")
+            if not enabled_sites:
+                print("✅ Todos os sites têm preço recente.")
+                return
+        
+        # Journal da execução: cada site concluído é registrado na hora, permitindo --resume
+        run_id = None
+        shard_spec = f"{self.shard[0]}/{self.shard[1]}" if self.shard else None
+        if resume:
+            previous = self.db.get_resumable_run(shard=shard_spec)
+            if not previous:
+                print("✅ A última execução foi concluída; não há nada para retomar.")
+                return
+            if previous['done_urls'] is None:
+                scope = lambda spec: f"shard {spec}" if spec else "catálogo inteiro"
+                print(f"❌ A execução #{previous['id']} interrompida foi de {scope(previous['shard'])}, "
+                      f"não de {scope(shard_spec)}: rode com o mesmo --shard ou sem --resume.")
+                return
+            run_id = previous['id']
+            enabled_sites = [site for site in enabled_sites if site.get('url') not in previous['done_urls']]
+            print(f"⏯️  Retomando execução #{run_id}: {len(previous['done_urls'])} site(s) já concluído(s), "
+                  f"{len(enabled_sites)} restante(s)")
+            if not enabled_sites:
+                self.db.finish_run(run_id, 'completed', 0)
+                return
+        else:
+            run_id = self.db.start_run(len(enabled_sites), shard=shard_spec)
+        session_started = time.monotonic()
             
         print(f"🎯 Processando {len(enabled_sites)} site(s) habilitado(s)...")
+        
+        # Produtos de lojas VTEX são buscados em lote por loja na primeira consulta de cada uma
+        vtex_sites = [site for site in enabled_sites if site.get('fetch') == 'vtex']
+        if vtex_sites:
+            self.get_vtex_catalog().register(vtex_sites)
             
-        # Fazer scraping de cada site
-        results = []
-        failed_products = []
-        for site in enabled_sites:
-            result = self.scrape_site(site)
-            results.append(result)
-
-            success, reason = self.price_extracted_success(result)
-            if success:
-                # Salvar no banco de dados apenas quando o preço foi identificado
-                self.save_to_database(site, result)
-            else:
-                failed_products.append({
-                    'site_name': site.get('name', 'Desconhecido'),
-                    'url': site.get('url'),
-                    'reason': reason
-                })
+        # Pipeline em streaming: scraping → validação → persistência → relatório.
+        # Cada resultado é processado assim que chega e só um resumo compacto é mantido.
+        summary = RunSummary()
+        if self.processes > 1:
+            if self.tabs > 1:
+                print("⚠️  --tabs vale para os navegadores de --workers; cada processo de scraping usa uma aba")
+            pool = self.start_process_pool(min(self.processes, len(enabled_sites)))
+            slots = list(range(pool.processes))
+            
+            def scrape(slot, site):
+                # VTEX fica neste processo: o lote por loja depende de um único catálogo com todos os produtos
+                if site.get('fetch') == 'vtex':
+                    return self.scrape_site(site)
+                return pool.scrape(site, run_id)
             
-        # Exibir resultados detalhados
-        self.display_results(results)
+            scraped = self.scheduler.map(enabled_sites, scrape, slots)
+            persisted = self._persist_stage(self._validate_stage(scraped), run_id, persist=False)
+        else:
+            # Navegadores extras para scraping paralelo (o próprio scraper é o primeiro worker)
+            workers_count = min(self.workers, len(enabled_sites))
+            while len(self.worker_pool) < workers_count - 1:
+                self.worker_pool.append(self.spawn_worker())
+            workers = [self] + self.worker_pool[:workers_count - 1]
+            if len(workers) > 1:
+                print(f"⚙️  {len(workers)} navegadores em paralelo, com limite adaptativo por mercado")
+            if self.browser:
+                # Cada navegador recebe até tabs workers, um por aba
+                tabs = min(self.tabs, -(-len(enabled_sites) // len(workers)))
+                workers = [tab for worker in workers for tab in worker.tab_workers(tabs)]
+                print(f"🗂️  {tabs} aba(s) por navegador: {len(workers)} página(s) carregando em paralelo")
+            scraped = self.scheduler.map(enabled_sites, lambda worker, site: worker.scrape_site(site), workers)
+            persisted = self._persist_stage(self._validate_stage(scraped), run_id)
+        try:
+            try:
+                self._report_stage(persisted, summary)
+            finally:
+                scraped.close()
+                # O journal só é fechado depois que o gravador confirmou os registros pendentes
+                self.stop_process_pool()
+        except BaseException:
+            self.db.finish_run(run_id, 'interrupted', time.monotonic() - session_started)
+            print(f"⏸️  Execução #{run_id} interrompida; use --resume para continuar de onde parou.")
+            raise
+        self.db.finish_run(run_id, 'completed', time.monotonic() - session_started)
+            
+        # Exibir resumo da execução
+        _display_run_summary(summary)
         
         # Exibir resumo dos que falharam
-        self.display_failed_summary(failed_products)
+        self.display_failed_summary(summary.failed)
         
         # Exibir estatísticas do banco de dados
         self.display_database_stats()
+        
+        for line in self.scheduler.describe():
+            print(f"📶 {line}")
+        for line in self.breakers.describe():
+            print(f"🔌 {line}")
+        for line in self.timeouts.describe():
+            print(f"⏱️  Timeouts {line}")
             
-        print(f"\n🎉 Scraping finalizado! Processados {len(enabled_sites)} site(s) com sucesso.")
+        print(f"\n🎉 Scraping finalizado! Processados {len(enabled_sites)} site(s) com sucesso (execução #{run_id}).")
     
     def close(self):
-        _close_driver(self.driver)
+        self.timeouts.flush()
+        self.stop_process_pool()
+        for worker in self.worker_pool + self.tab_pool:
+            worker.close()
+        self.worker_pool = []
+        self.tab_pool = []
+        if self.http_fetcher:
+            self.http_fetcher.close()
+            self.http_fetcher = None
+        if self.vtex_catalog:
+            self.vtex_catalog.close()
+            self.vtex_catalog = None
+        if self.browser:
+            self.browser.close()
+        elif self.driver:
+            self.quit_driver(self.driver)
         self.driver = None
 
 
-def main():
-    """Função principal."""
-    # Detectar modo baseado em argumentos ou usar modo visual por padrão
-    import sys
-    headless_mode = '--headless' in sys.argv
+def run_scraper(args):
+    """Executa o scraper com os argumentos já interpretados pelo CLI (ver cli.py)."""
+    # Modo visual por padrão; --headless para modo invisível
+    headless_mode = args.headless
     
     print(f"🔧 Modo: {'Headless (invisível)' if headless_mode else 'Visual (janela do navegador)'}")
     print(f"💡 Dica: Use 'python run_selenium_scraper.py --headless' para modo invisível")
     
-    scraper = SeleniumWebScraper(headless=headless_mode)
+    scraper = SeleniumWebScraper(
+        headless=headless_mode,
+        shard=args.shard,
+        shard_key=args.shard_key,
+        workers=args.workers,
+        market_rate=args.market_rate,
+        market_burst=args.market_burst,
+        latency_target=args.latency_target,
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown=args.breaker_cooldown,
+        db_path=args.db,
+        processes=args.processes,
+        writer_batch=args.writer_batch,
+        writer_queue=args.writer_queue,
+        snapshots=args.snapshots,
+        adaptive_timeouts=not args.fixed_timeouts,
+        timeout_margin=args.timeout_margin,
+        skip_fresh=args.skip_fresh,
+        tabs=args.tabs,
+    )
     
     try:
-        scraper.run()
+        scraper.run(resume=args.resume)
     except KeyboardInterrupt:
         print("\n⚠️  Scraping interrompido pelo usuário.")
     except Exception as e:
@@ -288,5 +926,11 @@ def main():
         scraper.close()
 
 
+def main(argv=None):
+    """Função principal."""
+    from cli import main as cli_main
+    cli_main(['scrape', *(sys.argv[1:] if argv is None else argv)])
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,62 @@
+"""Deterministic partitioning of the site catalog across scraper nodes."""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse
+
+SHARD_KEYS = ("market", "url")
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """Parse a shard spec in the form ``i/N`` (1-based) into ``(i, N)``.
+
+    Raises:
+        ValueError: If the spec is malformed or ``i`` is outside ``1..N``.
+    """
+    try:
+        index_text, total_text = spec.split("/", 1)
+        index, total = int(index_text), int(total_text)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Shard inválido '{spec}': use o formato i/N (ex: 1/4)")
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError(f"Shard inválido '{spec}': i deve estar entre 1 e N")
+    return index, total
+
+
+def stable_hash(value: str) -> int:
+    """Return a hash that is identical across processes and machines.
+
+    Python's built-in ``hash`` is salted per process, so it cannot be used to
+    agree on a partition between nodes.
+    """
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_key(site: Dict[str, Any], key: str = "market") -> str:
+    """Return the value used to place a site in a shard.
+
+    With ``key='market'`` every product of the same store lands on the same
+    node (so the browser session/cookies/CEP are reused); sites without a
+    market fall back to the URL host. With ``key='url'`` each product is
+    placed independently, which balances better but splits stores.
+    """
+    url = site.get("url") or ""
+    if key == "market":
+        return site.get("market") or urlparse(url).netloc or url
+    return url
+
+
+def shard_sites(
+    sites: List[Dict[str, Any]], index: int, total: int, key: str = "market"
+) -> List[Dict[str, Any]]:
+    """Return the subset of ``sites`` owned by shard ``index`` of ``total``.
+
+    The original order of the catalog is preserved inside the shard.
+    """
+    if key not in SHARD_KEYS:
+        raise ValueError(f"Chave de shard inválida '{key}': use {', '.join(SHARD_KEYS)}")
+    if total <= 1:
+        return list(sites)
+    return [site for site in sites if stable_hash(shard_key(site, key)) % total == index - 1]
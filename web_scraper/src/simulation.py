@@ -0,0 +1,389 @@
+"""Load tests of the whole pipeline with a synthetic browser (``mercado.py simulate``).
+
+``SyntheticDriver`` implements the part of the WebDriver API the browser path
+of ``SeleniumWebScraper`` uses, tabs included (``--tabs``: navigations
+started by script finish in the background while other tabs are used).
+Pages take a configurable time to "load",
+fail with a given probability and answer the page extractor
+(``page_interactions.extract_page_data``) with generated prices, so runs of
+100k products go through the real scheduler, circuit breakers, selector
+cache, ``DatabaseManager`` (or the single writer process) and reporting, on
+one machine and without network.
+
+``run_simulation`` generates the catalog, runs the scraper against a
+scratch database and reports scraping and DB write throughput, memory
+growth, and how long the usual reports take on the resulting database.
+"""
+from __future__ import annotations
+
+import contextlib
+import itertools
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from selenium.common.exceptions import NoSuchElementException, NoSuchWindowException, TimeoutException
+from selenium.webdriver.common.by import By
+
+from database import format_brl
+
+PRICE_JS = 'document.querySelector(".price")'
+
+
+def synthetic_sites(products: int, markets: int) -> List[Dict[str, Any]]:
+    """Catalog of ``products`` product pages spread round-robin over ``markets`` stores."""
+    return [
+        {
+            "name": f"Produto simulado {i}",
+            "url": f"https://sim{i % markets}.mercado.test/produto-{i}/p",
+            "market": f"Simulado {i % markets}",
+            "price_js": PRICE_JS,
+            "enabled": True,
+        }
+        for i in range(products)
+    ]
+
+
+class _Element:
+    text = ""
+
+    def get_attribute(self, name):
+        return None
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        pass
+
+
+class _Tab:
+    def __init__(self):
+        self.url = "about:blank"
+        self.page: Dict[str, Any] = {}
+        self.loading = None  # (url, ready at, delay, fails) of a navigation started by script
+
+
+class _SwitchTo:
+    def __init__(self, driver: "SyntheticDriver"):
+        self.driver = driver
+
+    def window(self, handle: str) -> None:
+        if handle not in self.driver.tabs:
+            raise NoSuchWindowException(handle)
+        self.driver.current_window_handle = handle
+
+    def new_window(self, type_hint: Optional[str] = None) -> None:
+        handle = f"tab-{len(self.driver.tabs)}"
+        self.driver.tabs[handle] = _Tab()
+        self.driver.current_window_handle = handle
+
+
+class SyntheticDriver:
+    """Stand-in for ``webdriver.Chrome`` with synthetic pages.
+
+    Args:
+        latency: Mean seconds per page load.
+        jitter: Relative spread of the latency (uniform, ``latency * (1 ± jitter)``).
+        failure_rate: Probability that a page load times out.
+        missing_rate: Probability that a loaded page has no price at all.
+        change_rate: Probability that a product's price differs from its base price.
+        seed: Seed of the random generator (reproducible runs).
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.5, failure_rate: float = 0.0,
+                 missing_rate: float = 0.0, change_rate: float = 0.1, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.missing_rate = missing_rate
+        self.change_rate = change_rate
+        self.rng = random.Random(seed)
+        self.tabs = {"tab-0": _Tab()}
+        self.current_window_handle = "tab-0"
+        self.switch_to = _SwitchTo(self)
+        self.pages_loaded = 0
+        self.page_load_timeout = 45.0
+
+    @property
+    def window_handles(self) -> List[str]:
+        return list(self.tabs)
+
+    @property
+    def tab(self) -> _Tab:
+        return self.tabs[self.current_window_handle]
+
+    @property
+    def current_url(self) -> str:
+        return self.tab.url
+
+    @property
+    def page(self) -> Dict[str, Any]:
+        return self.tab.page
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def _page_for(self, url: str) -> Dict[str, Any]:
+        if self.rng.random() < self.missing_rate:
+            return {"title": "Produto indisponível", "match": None, "aside": [], "available": False,
+                    "list_price": None, "best_price": None, "unit_price": None}
+        # Stable base price per URL, so most runs only repeat the last price
+        cents = 99 + zlib.crc32(url.encode()) % 50000
+        if self.rng.random() < self.change_rate:
+            cents = max(1, int(cents * self.rng.uniform(0.8, 1.2)))
+        text = format_brl(cents / 100)
+        return {
+            "title": url.rsplit("/", 2)[-2],
+            "match": {"text": text, "html": text, "classes": "price", "index": 0},
+            "aside": [{"text": text, "html": text, "classes": "price"}],
+            "available": True,
+            "list_price": round(cents * 1.1) / 100,
+            "best_price": cents / 100,
+            "unit_price": None,
+        }
+
+    def get(self, url: str) -> None:
+        delay = self._delay()
+        # Like Chrome: a page slower than the page load timeout fails after the timeout
+        if delay > self.page_load_timeout:
+            time.sleep(self.page_load_timeout)
+            raise TimeoutException("Simulated page load timeout")
+        time.sleep(delay)
+        if self.rng.random() < self.failure_rate:
+            raise TimeoutException("Simulated page load timeout")
+        self.tab.url = url
+        self.tab.page = self._page_for(url)
+        self.pages_loaded += 1
+
+    def refresh(self) -> None:
+        self.get(self.current_url)
+
+    def _navigation_state(self) -> Optional[Dict[str, Any]]:
+        """``browser_tabs.STATE_JS``: ``None`` until the navigation started in this tab finishes."""
+        tab = self.tab
+        if tab.loading is None:
+            return {"state": "complete", "load": None}
+        url, ready_at, delay, fails = tab.loading
+        if time.monotonic() < ready_at:
+            return None
+        tab.loading = None
+        if fails:
+            raise TimeoutException("Simulated page load timeout")
+        tab.url = url
+        tab.page = self._page_for(url)
+        self.pages_loaded += 1
+        return {"state": "complete", "load": delay}
+
+    def execute_script(self, script: str, *args):
+        if "window.location.href" in script:
+            # browser_tabs.NAVIGATE_JS: returns at once, the page "loads" in the background
+            delay = self._delay()
+            self.tab.loading = (args[0], time.monotonic() + delay, delay, self.rng.random() < self.failure_rate)
+            return None
+        if "__mercadoNavigating" in script:
+            return self._navigation_state()
+        if "window.stop()" in script:
+            self.tab.loading = None
+            return None
+        if "__mercadoExtract(" in script:
+            return self.page
+        if "document.readyState" in script:
+            return "complete"
+        return None
+
+    def execute_cdp_cmd(self, cmd: str, params: Dict[str, Any]):
+        return {}
+
+    def find_element(self, by=By.ID, value=None):
+        # body and the product aside exist; CEP modals never appear
+        if value in ("body",) or (value and "aside" in value):
+            return _Element()
+        raise NoSuchElementException(value)
+
+    def find_elements(self, by=By.ID, value=None):
+        return []
+
+    def save_screenshot(self, filename: str) -> bool:
+        return True
+
+    def set_page_load_timeout(self, seconds: float) -> None:
+        self.page_load_timeout = seconds
+
+    def add_cookie(self, cookie: Dict[str, Any]) -> None:
+        pass
+
+    def quit(self) -> None:
+        pass
+
+
+class SyntheticDriverFactory:
+    """``driver_factory`` for ``SeleniumWebScraper``; picklable, so it also works with ``--processes``.
+
+    Each driver gets its own seed derived from ``seed`` (and, in pool
+    processes, from the process id).
+    """
+
+    def __init__(self, seed: Optional[int] = None, **options):
+        self.seed = seed
+        self.options = options
+        self.counter = itertools.count()
+        self.offset = 0
+
+    def __getstate__(self):
+        return {"seed": self.seed, "options": self.options}
+
+    def __setstate__(self, state):
+        self.__init__(state["seed"], **state["options"])
+        self.offset = os.getpid() * 1000
+
+    def __call__(self, headless: bool = True) -> SyntheticDriver:
+        seed = None if self.seed is None else self.seed * 1_000_000_000 + self.offset + next(self.counter)
+        return SyntheticDriver(seed=seed, **self.options)
+
+
+def _rss_mib() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemorySampler(threading.Thread):
+    """Samples the RSS of this process every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples: List[float] = [_rss_mib()]
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.samples.append(_rss_mib())
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+        self.samples.append(_rss_mib())
+
+
+def _timed(func, *args, **kwargs) -> float:
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        func(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def time_reports(db_path: str) -> Dict[str, float]:
+    """Seconds taken by the usual reports on ``db_path``."""
+    from database import DatabaseManager
+    from db_tools import DatabaseTools
+    from report_utils import display_database_stats
+    from rollups import update_daily_rollups
+
+    db = DatabaseManager(db_path)
+    tools = DatabaseTools(db_path)
+    return {
+        "database_stats": _timed(display_database_stats, db),
+        "count_summary": _timed(tools.count_summary),
+        "recent_prices": _timed(tools.show_recent_prices, 10),
+        "recent_runs": _timed(db.get_recent_runs, 10),
+        "daily_rollup": _timed(update_daily_rollups, db_path),
+        "daily_report": _timed(tools.show_daily_prices, 7),
+    }
+
+
+def run_simulation(
+    products: int = 100_000,
+    markets: int = 20,
+    runs: int = 1,
+    workers: int = 8,
+    processes: int = 1,
+    tabs: int = 1,
+    latency: float = 0.05,
+    jitter: float = 0.5,
+    failure_rate: float = 0.01,
+    missing_rate: float = 0.01,
+    change_rate: float = 0.1,
+    seed: Optional[int] = 42,
+    db_path: Optional[str] = None,
+    verbose: bool = False,
+    scraper_options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Scrape a synthetic catalog ``runs`` times and measure the pipeline.
+
+    Args:
+        db_path: Database to fill; by default a scratch one, deleted at the end.
+        verbose: Keep the scraper's per-site output (by default it is discarded).
+        tabs: Tabs per synthetic browser (``SeleniumWebScraper(tabs=...)``).
+        scraper_options: Extra ``SeleniumWebScraper`` arguments (rates, breakers...).
+
+    Returns:
+        Metrics per run (``runs``) and of the reports on the final database (``reports``).
+    """
+    from database import DatabaseManager
+    from selenium_scraper import SeleniumWebScraper
+
+    workdir = tempfile.mkdtemp(prefix="mercado-sim-")
+    config_file = os.path.join(workdir, "sites.json")
+    with open(config_file, "w", encoding="utf-8") as out:
+        json.dump({"sites": synthetic_sites(products, markets)}, out)
+    db_path = db_path or os.path.join(workdir, "simulation.db")
+    factory = SyntheticDriverFactory(seed=seed, latency=latency, jitter=jitter, failure_rate=failure_rate,
+                                     missing_rate=missing_rate, change_rate=change_rate)
+
+    def price_rows() -> int:
+        with DatabaseManager(db_path).connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+
+    metrics: Dict[str, Any] = {
+        "products": products, "markets": markets, "workers": workers, "processes": processes, "tabs": tabs,
+        "latency": latency, "failure_rate": failure_rate, "runs": [],
+    }
+    try:
+        for _ in range(runs):
+            rows_before = price_rows()
+            sampler = MemorySampler()
+            sampler.start()
+            started = time.perf_counter()
+            with contextlib.ExitStack() as stack:
+                if not verbose:
+                    stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+                scraper = SeleniumWebScraper(
+                    config_file=config_file, db_path=db_path, workers=workers, processes=processes, tabs=tabs,
+                    driver_factory=factory, page_settle=0, **(scraper_options or {}),
+                )
+                try:
+                    scraper.run()
+                finally:
+                    scraper.close()
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            rows = price_rows() - rows_before
+            metrics["runs"].append({
+                "seconds": round(elapsed, 2),
+                "sites_per_second": round(products / elapsed, 1),
+                "price_rows": rows,
+                "rows_per_second": round(rows / elapsed, 1),
+                "rss_start_mib": round(sampler.samples[0], 1),
+                "rss_peak_mib": round(max(sampler.samples), 1),
+                "rss_end_mib": round(sampler.samples[-1], 1),
+                "children_peak_mib": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            })
+        metrics["reports"] = {name: round(seconds, 5) for name, seconds in time_reports(db_path).items()}
+        metrics["db_size_mib"] = round(os.path.getsize(db_path) / 1024 / 1024, 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return metrics
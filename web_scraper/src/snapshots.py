@@ -0,0 +1,170 @@
+"""Compressed DOM snapshots and offline replay of the extractors.
+
+With ``scrape --snapshots`` (or ``"snapshot": true`` on a site) the HTML the
+price was read from is stored next to it: the browser path serializes the
+rendered DOM without scripts, styles and SVGs (or only ``snapshot_region``),
+the HTTP path keeps the fetched page. Snapshots are compressed with zstd and
+deduplicated by the SHA-256 of the HTML, so an unchanged page costs one row
+in ``price_snapshots`` and nothing else.
+
+``mercado.py replay`` re-runs the HTML extractors over the stored snapshots,
+in parallel across processes and without a browser or network, and rewrites
+the ``price_history`` rows whose extracted price changed: useful after fixing
+a selector or the price parser.
+
+``zstandard`` is optional; without it snapshots are written with zlib and
+the codec is recorded per snapshot.
+"""
+from __future__ import annotations
+
+import hashlib
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+CODEC = "zstd" if zstandard else "zlib"
+ZSTD_LEVEL = 10
+
+# Rendered DOM without the parts that never hold a price; only ``region`` if given
+SNAPSHOT_JS = """
+const region = arguments[0] ? document.querySelector(arguments[0]) : null;
+const root = (region || document.documentElement).cloneNode(true);
+root.querySelectorAll('script, style, noscript, svg, iframe, link, template').forEach(el => el.remove());
+if (region) {
+    return '<html><head><title>' + document.title.replace(/</g, '&lt;') + '</title></head><body>'
+        + root.outerHTML + '</body></html>';
+}
+return '<!DOCTYPE html>' + root.outerHTML;
+"""
+
+
+def capture_snapshot(driver, region: Optional[str] = None) -> Optional[str]:
+    """HTML of the current page as rendered, or ``None`` if it cannot be read."""
+    try:
+        return driver.execute_script(SNAPSHOT_JS, region)
+    except Exception:
+        return None
+
+
+def compress_snapshot(html: str) -> Dict[str, Any]:
+    """``{'hash', 'codec', 'size', 'data'}`` ready for ``DatabaseManager`` (see ``dom_snapshots``)."""
+    raw = html.encode("utf-8")
+    if zstandard:
+        data = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        data = zlib.compress(raw, 9)
+    return {"hash": hashlib.sha256(raw).hexdigest(), "codec": CODEC, "size": len(raw), "data": data}
+
+
+def decompress_snapshot(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Snapshot comprimido com zstd: instale o pacote zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def replay_selectors(site: Dict[str, Any], cached: List[str]) -> List[str]:
+    """CSS selectors for a site: configured ones first, then the learned ``querySelector`` ones."""
+    from html_extraction import css_from_price_js, price_selectors
+
+    selectors = price_selectors(site)
+    for price_js in cached:
+        css = css_from_price_js(price_js)
+        if css and css not in selectors:
+            selectors.append(css)
+    return selectors
+
+
+def _replay_one(job: Tuple[str, bytes, List[str]]) -> Dict[str, Any]:
+    # Runs in the worker processes: top-level so it can be pickled
+    from bs4 import BeautifulSoup
+    from html_extraction import extract_price_from_soup, extract_title
+
+    codec, data, selectors = job
+    soup = BeautifulSoup(decompress_snapshot(codec, data), "html.parser")
+    return {"title": extract_title(soup), "aside_data": extract_price_from_soup(soup, selectors)}
+
+
+def _price_text(aside_data: Dict[str, Any]) -> Optional[str]:
+    for tag in aside_data.get("p_tags", []):
+        if tag.get("hasPrice"):
+            return tag.get("textContent", "").strip()
+    return None
+
+
+def replay_snapshots(
+    db_path: str,
+    config_file: str = "data/sites.json",
+    since: Optional[str] = None,
+    market: Optional[str] = None,
+    workers: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Re-extract prices from the stored snapshots and rewrite the rows that changed.
+
+    Each distinct (snapshot, URL) pair is decompressed and parsed once, and
+    the result is applied to every price row linked to it.
+
+    Returns:
+        ``{'rows', 'snapshots', 'changed', 'updated', 'skipped'}``
+    """
+    from config_loader import load_sites_config
+    from database import DatabaseManager
+    from selector_cache import SelectorCache
+
+    db = DatabaseManager(db_path)
+    sites = {site.get("url"): site for site in load_sites_config(config_file)}
+    cache = SelectorCache(db)
+    tasks = db.get_snapshot_tasks(since=since, market=market)
+
+    groups: Dict[Tuple[str, str], List[Tuple[int, Optional[str]]]] = {}
+    skipped = 0
+    markets = {}
+    for price_id, url, site_market, snapshot_hash, price_text in tasks:
+        markets[url] = site_market
+        if sites.get(url, {}).get("mode") == "listing":
+            skipped += 1
+            continue
+        groups.setdefault((snapshot_hash, url), []).append((price_id, price_text))
+
+    jobs, keys = [], []
+    for snapshot_hash, url in groups:
+        # URL removed from sites.json: the learned selectors of its market still apply
+        site = sites.get(url) or {"url": url, "market": markets[url]}
+        row = db.get_snapshot(snapshot_hash)
+        if row is None:
+            skipped += len(groups[(snapshot_hash, url)])
+            continue
+        selectors = replay_selectors(site, cache.candidates(site))
+        jobs.append((row[0], row[1], selectors))
+        keys.append((snapshot_hash, url))
+
+    updates = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for key, extracted in zip(keys, pool.map(_replay_one, jobs, chunksize=8)):
+            new_text = _price_text(extracted["aside_data"])
+            site = sites.get(key[1]) or {}
+            for price_id, old_text in groups[key]:
+                if new_text and new_text != (old_text or "").strip():
+                    updates.append((price_id, {
+                        "site_name": site.get("name"),
+                        "url": key[1],
+                        "title": extracted["title"],
+                        "replayed_from": key[0],
+                        "aside_data": extracted["aside_data"],
+                    }))
+
+    updated = 0 if dry_run or not updates else db.update_prices(updates)
+    return {
+        "rows": len(tasks),
+        "snapshots": len(jobs),
+        "changed": len(updates),
+        "updated": updated,
+        "skipped": skipped,
+    }
@@ -0,0 +1,195 @@
+"""Batch price lookup for VTEX stores through the public catalog search API.
+
+Sites with ``"fetch": "vtex"`` in sites.json skip Chrome entirely. Products
+are grouped by store host and requested up to ``batch_size`` at a time with
+``/api/catalog_system/pub/products/search?fq=productId:..&fq=productId:..``;
+each product of the JSON response is mapped into the ``aside_data`` structure
+that ``DatabaseManager.save_price`` consumes.
+
+A product URL (``https://loja/<linkText>/p``) is resolved to its productId
+once, through ``/api/catalog_system/pub/products/search/<linkText>/p``, and
+the id is kept in the ``vtex_products`` table so later runs go straight to
+the batched call.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import format_brl
+from http_fetcher import DEFAULT_HEADERS
+
+SEARCH_PATH = "/api/catalog_system/pub/products/search"
+
+# Maximum page size accepted by the legacy catalog search (_from/_to)
+MAX_BATCH = 50
+
+
+def store_base(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def link_text(url: str) -> Optional[str]:
+    """``leite-integral-1l`` for ``https://loja.com.br/leite-integral-1l/p``."""
+    segments = [s for s in urlsplit(url).path.split("/") if s]
+    if len(segments) >= 2 and segments[-1] == "p":
+        return segments[-2]
+    return None
+
+
+def store_key(site: Dict[str, Any]) -> tuple:
+    """Products are batched per store and sales channel (``vtex_sc``)."""
+    return store_base(site["url"]), site.get("vtex_sc")
+
+
+def _commercial_offer(product: Dict[str, Any], sku_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Offer of the configured SKU (or the first one), preferring an available seller."""
+    items = product.get("items") or []
+    if sku_id:
+        items = [i for i in items if str(i.get("itemId")) == str(sku_id)] or items
+    for item in items:
+        offers = [s.get("commertialOffer") or {} for s in item.get("sellers") or []]
+        available = [o for o in offers if o.get("IsAvailable", (o.get("AvailableQuantity") or 0) > 0)]
+        if available or offers:
+            return (available or offers)[0]
+    return None
+
+
+def product_to_result(site: Dict[str, Any], product: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Map one catalog product into the result shape produced by ``scrape_site``."""
+    result = {
+        "site_name": site.get("name", "Site Desconhecido"),
+        "url": site.get("url"),
+        "title": "",
+        "scraped_at": datetime.now().isoformat(),
+    }
+    if not product:
+        return {**result, "aside_data": {
+            "aside_found": False, "p_tags": [], "total_p_tags": 0,
+            "error": "Produto não encontrado na API VTEX",
+        }}
+
+    offer = _commercial_offer(product, site.get("vtex_sku_id")) or {}
+    price = offer.get("Price") or 0
+    list_price = offer.get("ListPrice") or 0
+    available = bool(offer.get("IsAvailable", (offer.get("AvailableQuantity") or 0) > 0)) and price > 0
+    result["title"] = product.get("productName") or ""
+    result["vtex"] = {"product_id": product.get("productId"), "list_price": list_price, "available": available}
+    if not available:
+        return {**result, "aside_data": {
+            "aside_found": False, "p_tags": [], "total_p_tags": 0,
+            "error": "Produto indisponível na API VTEX",
+        }}
+
+    text = format_brl(price)
+    return {**result, "aside_data": {
+        "aside_found": True,
+        "p_tags": [{
+            "index": 1,
+            "textContent": text,
+            "innerHTML": text,
+            "classes": "vtex-commertial-offer",
+            "hasPrice": True,
+        }],
+        "total_p_tags": 1,
+        "monitoring_history": [],
+        "total_captures": 1,
+        "error": None,
+    }}
+
+
+class VtexCatalog:
+    """Fetches VTEX products in per-store batches, on demand.
+
+    ``register`` the sites of a run first; the first ``lookup`` for a store
+    then fetches up to ``batch_size`` of its registered products in one call
+    and the following lookups are answered from memory. A site that was not
+    registered is fetched on its own.
+
+    Args:
+        db: DatabaseManager holding the ``vtex_products`` table.
+    """
+
+    def __init__(self, db, batch_size: int = MAX_BATCH, timeout: float = 20.0, pool_size: int = 10):
+        self.db = db
+        self.batch_size = max(1, min(batch_size, MAX_BATCH))
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({**DEFAULT_HEADERS, "Accept": "application/json"})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.pending: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.requests_made = 0
+
+    def register(self, sites: List[Dict[str, Any]]) -> None:
+        for site in sites:
+            if site.get("fetch") == "vtex" and site.get("url"):
+                self.pending.setdefault(store_key(site), {})[site["url"]] = site
+
+    def lookup(self, site: Dict[str, Any]) -> Dict[str, Any]:
+        """Result for ``site``, fetching its store's next batch if needed.
+
+        Raises:
+            requests.RequestException: On network errors or non-2xx status.
+        """
+        url = site["url"]
+        with self.lock:
+            if url not in self.results:
+                key = store_key(site)
+                queue = self.pending.setdefault(key, {})
+                queue.pop(url, None)
+                batch = [site] + [queue.pop(u) for u in list(queue)[:self.batch_size - 1]]
+                try:
+                    self.results.update(self._fetch_batch(key[0], key[1], batch))
+                except Exception:
+                    # Put the others back so they are retried by their own lookups
+                    for other in batch[1:]:
+                        queue[other["url"]] = other
+                    raise
+            return self.results.pop(url)
+
+    def _get(self, url: str, params=None) -> Any:
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        self.requests_made += 1
+        response.raise_for_status()
+        return response.json()
+
+    def _resolve_ids(self, base: str, sites: List[Dict[str, Any]]) -> Dict[str, str]:
+        """productId per URL: configured, cached in the database, or one lookup by linkText."""
+        ids = {s["url"]: str(s["vtex_product_id"]) for s in sites if s.get("vtex_product_id")}
+        ids.update(self.db.get_vtex_product_ids(s["url"] for s in sites if s["url"] not in ids))
+        resolved = {}
+        for site in sites:
+            slug = link_text(site["url"])
+            if site["url"] in ids or not slug:
+                continue
+            products = self._get(f"{base}{SEARCH_PATH}/{slug}/p")
+            if products:
+                resolved[site["url"]] = str(products[0]["productId"])
+        if resolved:
+            self.db.save_vtex_product_ids(urlsplit(base).netloc, resolved)
+        return {**ids, **resolved}
+
+    def _fetch_batch(self, base: str, sales_channel, sites: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        ids = self._resolve_ids(base, sites)
+        params = [("fq", f"productId:{pid}") for pid in dict.fromkeys(ids.values())]
+        # The sales channel (sc) selects the price table, e.g. per region
+        if sales_channel:
+            params.append(("sc", str(sales_channel)))
+        params += [("_from", 0), ("_to", len(set(ids.values())) - 1)]
+        products = self._get(f"{base}{SEARCH_PATH}", params=params) if ids else []
+        by_id = {str(p.get("productId")): p for p in products}
+        print(f"   🛒 VTEX {urlsplit(base).netloc}: {len(by_id)} de {len(sites)} produto(s) em uma requisição")
+        return {site["url"]: product_to_result(site, by_id.get(ids.get(site["url"]))) for site in sites}
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from adaptive_timeouts import DEFAULTS, FLOORS, MARKET_WINDOW, AdaptiveTimeouts
+
+
+class FakeTimingsDB:
+    """Só o que AdaptiveTimeouts usa do DatabaseManager."""
+
+    def __init__(self, timings):
+        self.timings = timings
+
+    def get_load_timings(self, scope):
+        return self.timings.get(scope, {})
+
+    def save_load_timings(self, rows):
+        pass
+
+
+def market_where_modal_showed_once():
+    # ~50 produtos por mercado: o modal aparece só na primeira página da sessão (2%)
+    zipcode = [3.0] + [None] * (MARKET_WINDOW - 1)
+    return FakeTimingsDB({"market:Loja": {"load": [2.0] * MARKET_WINDOW, "zipcode": zipcode}})
+
+
+def test_rare_cep_modal_keeps_default_wait_on_first_page_of_session():
+    timeouts = AdaptiveTimeouts(market_where_modal_showed_once())
+    site = {"url": "https://loja.example/produto/p", "market": "Loja"}
+
+    assert timeouts.limits(site, first_in_session=True)["zipcode"] == DEFAULTS["zipcode"]
+
+
+def test_rare_cep_modal_uses_floor_after_first_page_of_session():
+    timeouts = AdaptiveTimeouts(market_where_modal_showed_once())
+    site = {"url": "https://loja.example/produto/p", "market": "Loja"}
+
+    assert timeouts.limits(site)["zipcode"] == FLOORS["zipcode"]
+
+
+def test_first_page_keeps_longer_learned_cep_wait():
+    zipcode = [15.0] * MARKET_WINDOW
+    timeouts = AdaptiveTimeouts(FakeTimingsDB({"market:Loja": {"zipcode": zipcode}}))
+    site = {"url": "https://loja.example/produto/p", "market": "Loja"}
+
+    assert timeouts.limits(site, first_in_session=True)["zipcode"] > DEFAULTS["zipcode"]
@@ -1,22 +1,18 @@
-import sqlite3
+#!/usr/bin/env python3
+"""
+Visualizador simples dos preços salvos
+Atalho para: python mercado.py db view
+"""
+import sys
+import os
+
+# Adicionar o diretório src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from cli import main
 
 def view_database():
-    with sqlite3.connect('data/scraped_prices.db') as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM price_history')
-        total = cursor.fetchone()[0]
-        print(f"Total preços: {total}")
-        
-        cursor.execute('''
-            SELECT p.name, ph.price_text, ph.scraped_at
-            FROM price_history ph
-            JOIN products p ON ph.product_id = p.id
-            ORDER BY ph.scraped_at DESC
-        ''')
-        
-        for row in cursor.fetchall():
-            print(f"{row[1]} - {row[0]} - {row[2]}")
+    main(['db', 'view'])
 
 if __name__ == "__main__":
     view_database()